@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+图片资源下载
+从已保存的接口三原始响应中提取正文图片（picture_page_info_list，含宽高和顺序），
+连同文章封面登记到 article_images，再用线程池并发下载到本地缓存：
+- 文件按内容 SHA-256 存放（assets/ab/abcd....png），不同文章、不同URL的相同图片只存一份
+- 同一URL只下载一次，结果关联到所有引用它的文章
+- 每个下载线程复用自己的 requests.Session（连接池），并发数有上限
+数据库写入都在主线程分批进行，下载线程只做网络和文件IO
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+import config
+import database
+import metrics
+import parsers
+from db_manager import DatabaseManager
+
+EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/gif': 'gif',
+    'image/webp': 'webp',
+    'image/svg+xml': 'svg',
+}
+SAVE_BATCH = 50
+CHUNK_SIZE = 64 * 1024
+
+
+def image_extension(url: str, content_type: Optional[str]) -> str:
+    """按 Content-Type 确定扩展名，其次是微信图片URL的 wx_fmt 参数"""
+    ext = EXTENSIONS.get((content_type or '').split(';')[0].strip().lower())
+    if ext:
+        return ext
+    wx_fmt = parse_qs(urlparse(url).query).get('wx_fmt', [''])[0].lower()
+    return {'jpeg': 'jpg'}.get(wx_fmt, wx_fmt) or 'bin'
+
+
+class AssetFetcher:
+    """登记并下载文章图片"""
+
+    def __init__(self, db: DatabaseManager = None, asset_dir: str = None,
+                 workers: int = None, timeout: float = 30):
+        self.db = db or DatabaseManager()
+        self.asset_dir = asset_dir or config.ASSET_DIR
+        self.workers = max(1, workers or config.ASSET_WORKERS)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    # ==================== 登记图片 ====================
+
+    def register_images(self, batch_size: int = 500) -> int:
+        """为已获取全文的文章登记封面和正文图片，返回新登记的图片数"""
+        total = 0
+        last_id = 0
+        while True:
+            articles = self.db.get_articles_without_images(batch_size, last_id)
+            if not articles:
+                break
+            rows = []
+            for article in articles:
+                rows.extend(self._article_images(article))
+            last_id = articles[-1]['id']
+            # 没有图片的文章同样标记为已登记，不会在下一页或下次运行中重复出现
+            total += self.db.save_article_images(rows, [a['id'] for a in articles])
+        return total
+
+    def _article_images(self, article: Dict) -> List[Tuple]:
+        rows = []
+        if article.get('cover_url'):
+            rows.append((article['id'], 'cover', 0, article['cover_url'], None, None))
+        cached = self.db.get_raw_response('article_detail', article['url'])
+        if cached:
+            for position, info in enumerate(parsers.picture_infos(cached)):
+                rows.append((article['id'], 'inline', position, info['url'],
+                             info['width'], info['height']))
+        else:
+            # 原始响应已归档时退回 article_contents 中的URL（没有宽高）
+            content = self.db.get_article_content(article['url'])
+            urls = json.loads(content['picture_urls'] or '[]') if content else []
+            rows.extend((article['id'], 'inline', position, url, None, None)
+                        for position, url in enumerate(urls))
+        return rows
+
+    # ==================== 下载 ====================
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=4)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers['User-Agent'] = 'Mozilla/5.0'
+            self._local.session = session
+        return session
+
+    def download(self, url: str) -> Dict:
+        """下载一张图片并写入内容寻址缓存（在工作线程中执行）"""
+        try:
+            response = self._session().get(url, timeout=self.timeout, stream=True)
+            response.raise_for_status()
+            content_type = response.headers.get('Content-Type', '')
+            digest = hashlib.sha256()
+            tmp_path = os.path.join(self.asset_dir, f".tmp-{threading.get_ident()}")
+            size = 0
+            with open(tmp_path, 'wb') as f:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+        except (requests.RequestException, OSError) as e:
+            metrics.ASSET_DOWNLOADS.inc(result='failed')
+            return {'url': url, 'error': f"{type(e).__name__}: {e}"}
+
+        sha256 = digest.hexdigest()
+        rel_path = os.path.join(sha256[:2], f"{sha256}.{image_extension(url, content_type)}")
+        full_path = os.path.join(self.asset_dir, rel_path)
+        if os.path.exists(full_path):
+            os.remove(tmp_path)
+            metrics.ASSET_DOWNLOADS.inc(result='duplicate')
+        else:
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            os.replace(tmp_path, full_path)
+            metrics.ASSET_DOWNLOADS.inc(result='new')
+        metrics.ASSET_BYTES.inc(size)
+        return {'url': url, 'sha256': sha256, 'path': rel_path, 'size': size,
+                'content_type': content_type}
+
+    def fetch_pending(self, limit: int = None, retry_failed: bool = False) -> Dict[str, int]:
+        """下载所有待下载的URL，返回 {'done': n, 'failed': n}"""
+        os.makedirs(self.asset_dir, exist_ok=True)
+        urls = iter(self.db.get_pending_image_urls(limit, retry_failed))
+        counts = {'done': 0, 'failed': 0}
+        results = []
+
+        with ThreadPoolExecutor(max_workers=self.workers,
+                                thread_name_prefix='asset') as executor:
+            # 在途任务保持在并发数的两倍以内，避免一次性提交全部URL
+            in_flight = {executor.submit(self.download, url)
+                         for url in itertools.islice(urls, self.workers * 2)}
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    counts['failed' if result.get('error') else 'done'] += 1
+                    results.append(result)
+                in_flight |= {executor.submit(self.download, url)
+                              for url in itertools.islice(urls, len(finished))}
+                if len(results) >= SAVE_BATCH or not in_flight:
+                    self.db.save_image_results(results)
+                    results = []
+        return counts
+
+    def run(self, limit: int = None, retry_failed: bool = False) -> Dict[str, int]:
+        """登记新文章的图片并下载"""
+        registered = self.register_images()
+        counts = self.fetch_pending(limit, retry_failed)
+        counts['registered'] = registered
+        return counts
+
+
+def print_summary(db: DatabaseManager):
+    summary = db.get_image_summary()
+    labels = {'pending': '待下载', 'done': '已下载', 'failed': '失败'}
+    for status in ('pending', 'done', 'failed'):
+        if status in summary:
+            item = summary[status]
+            print(f"  {labels[status]}: {item['images']} 处引用 / {item['urls']} 个URL")
+    assets = summary['assets']
+    print(f"  本地文件: {assets['files']} 个，{assets['bytes'] / 1024 / 1024:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="下载文章封面和正文图片到本地缓存")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--asset-dir', help="图片缓存目录（默认 assets）")
+    parser.add_argument('--workers', type=int, default=None, help="并发下载数")
+    parser.add_argument('--limit', type=int, default=None, help="本次最多下载的URL数")
+    parser.add_argument('--retry-failed', action='store_true', help="重新下载失败的图片")
+    parser.add_argument('--status', action='store_true', help="只查看下载统计")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    if not database.check_database_exists():
+        print(f"❌ 数据库不存在: {database.DATABASE_PATH}")
+        return
+
+    db = DatabaseManager()
+    if not args.status:
+        fetcher = AssetFetcher(db, args.asset_dir, args.workers)
+        counts = fetcher.run(args.limit, args.retry_failed)
+        print(f"✅ 新登记 {counts['registered']} 处图片，"
+              f"下载成功 {counts['done']} 个URL，失败 {counts['failed']} 个")
+
+    print("\n📊 图片资源:")
+    print_summary(db)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+采集批次与两阶段采集模式（设计见 UPGRADE_DESIGN.md）
+- 第一阶段：并行获取批次内所有公众号的文章列表（每个公众号内按页顺序）
+- 确认阶段：按历史实际费用（CostModel）估算全部详情的费用，等待确认
+- 第二阶段：所有公众号的待完成文章组成一个全局队列，并发获取统计和全文
+批次状态全部由数据推导（公众号 stop_flag、文章 fetch_status），中断后可从任意阶段继续
+"""
+
+import argparse
+import itertools
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import config
+import database
+import progress
+import registry
+from collector import WechatArticleCollector
+from db_manager import DatabaseManager
+from scheduler import CostModel
+
+MODES = ('standard', 'two_phase')
+PHASES = ('list', 'confirm', 'detail', 'completed')
+
+
+class BatchManager:
+    """批次的创建、切换和进度统计"""
+
+    def __init__(self, db: DatabaseManager = None):
+        self.db = db or DatabaseManager()
+
+    def create_batch(self, name: str, mode: str, accounts: List[Tuple[str, str]],
+                     initial_balance: float = None) -> str:
+        """创建新批次并设为当前批次（其他进行中的批次暂停）"""
+        if mode not in MODES:
+            raise ValueError(f"未知的采集模式: {mode}")
+        batch_id = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        suffix = 1
+        while self.db.get_batch(batch_id):
+            suffix += 1
+            batch_id = f"batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{suffix}"
+        self._pause_running()
+        # 公众号转入新批次前，先固定原批次的快照
+        for batch in self.db.list_batches():
+            self.db.snapshot_batch(batch['batch_id'])
+        self.db.create_batch(batch_id, name or batch_id, mode, initial_balance)
+        self.db.assign_accounts_to_batch(batch_id, accounts)
+        self.refresh_progress(batch_id)
+        return batch_id
+
+    def get_current_batch(self) -> Optional[Dict]:
+        """当前批次：最新的进行中批次，没有则为最新的暂停批次"""
+        batches = self.db.list_batches()
+        for status in ('running', 'paused'):
+            candidates = [b for b in batches if b['status'] == status]
+            if candidates:
+                return candidates[-1]
+        return None
+
+    def switch_batch(self, batch_id: str) -> bool:
+        """暂停当前批次，激活目标批次"""
+        if not self.db.get_batch(batch_id):
+            return False
+        self._pause_running()
+        return self.db.update_batch(batch_id, status='running')
+
+    def _pause_running(self):
+        for batch in self.db.list_batches():
+            if batch['status'] == 'running':
+                self.db.update_batch(batch['batch_id'], status='paused')
+
+    def analyze_batch_status(self, batch_id: str) -> Dict:
+        """
+        分析批次状态
+        Returns:
+            {'accounts_need_list': [...], 'unfetched': 待完成文章数, 'by_status': {...}, ...}
+        """
+        progress = self.db.get_batch_progress(batch_id)
+        progress['accounts_need_list'] = self.db.get_batch_accounts(batch_id, need_list=True)
+        progress['unfetched'] = progress['total_articles'] - progress['fetched_articles']
+        return progress
+
+    def refresh_progress(self, batch_id: str, balance: float = None) -> Dict:
+        """按当前数据更新批次的进度与费用字段，并刷新批次快照"""
+        self.db.snapshot_batch(batch_id)
+        self.db.refresh_article_metrics()
+        status = self.analyze_batch_status(batch_id)
+        fields = {
+            'total_accounts': status['total_accounts'],
+            'completed_accounts': status['completed_accounts'],
+            'total_articles': status['total_articles'],
+            'fetched_articles': status['fetched_articles'],
+            'unfetched_count': status['unfetched'],
+        }
+        if balance is not None:
+            batch = self.db.get_batch(batch_id)
+            fields['current_balance'] = balance
+            if batch['initial_balance'] is not None:
+                fields['actual_cost'] = round(max(0.0, batch['initial_balance'] - balance), 4)
+        self.db.update_batch(batch_id, **fields)
+        return status
+
+    def estimate_detail_cost(self, batch_id: str) -> Dict:
+        """按历史实际单价估算批次剩余详情的费用"""
+        cost_model = CostModel.from_history(self.db)
+        candidates = self.db.get_detail_candidates(batch_id)
+        by_status = {}
+        for item in candidates:
+            by_status[item['fetch_status']] = by_status.get(item['fetch_status'], 0) + 1
+        cost = sum(cost_model.remaining_cost(status) * count
+                   for status, count in by_status.items())
+        return {'articles': len(candidates), 'by_status': by_status,
+                'cost': round(cost, 4), 'cost_model': cost_model}
+
+
+class TwoPhaseRunner:
+    """执行或继续一个两阶段批次"""
+
+    def __init__(self, collector: WechatArticleCollector, manager: BatchManager = None,
+                 list_workers: int = None, detail_workers: int = None):
+        self.collector = collector
+        self.manager = manager or BatchManager(collector.db)
+        self.db = self.manager.db
+        self.list_workers = max(1, list_workers or config.BATCH_LIST_WORKERS)
+        self.detail_workers = max(1, detail_workers or config.BATCH_DETAIL_WORKERS)
+        self._stop = threading.Event()
+
+    def run(self, batch_id: str, confirm: Callable[[Dict], bool]) -> str:
+        """
+        从批次当前阶段继续执行
+        Args:
+            confirm: 确认阶段回调，参数为费用估算，返回是否继续
+        Returns:
+            执行结束时批次所处阶段
+        """
+        batch = self.db.get_batch(batch_id)
+        if batch is None:
+            raise ValueError(f"批次不存在: {batch_id}")
+        self.manager.switch_batch(batch_id)
+        self.db.update_batch(batch_id, last_mode='two_phase')
+        self._stop.clear()
+
+        phase = batch['phase']
+        if phase == 'completed' or phase not in PHASES:
+            phase = 'list'
+        try:
+            if phase == 'list':
+                if not self.list_phase(batch_id):
+                    return self._pause(batch_id, 'list')
+                phase = 'confirm'
+
+            if phase == 'confirm' or not batch['user_confirmed']:
+                estimate = self.manager.estimate_detail_cost(batch_id)
+                self.db.update_batch(batch_id, phase='confirm',
+                                     estimated_cost=estimate['cost'],
+                                     unfetched_count=estimate['articles'])
+                if estimate['articles'] and not confirm(estimate):
+                    return self._pause(batch_id, 'confirm')
+                self.db.update_batch(batch_id, phase='detail', user_confirmed=1,
+                                     confirm_time=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+            if not self.detail_phase(batch_id):
+                return self._pause(batch_id, 'detail')
+        finally:
+            self.manager.refresh_progress(batch_id, self.collector.current_balance)
+
+        self.db.update_batch(batch_id, phase='completed', status='completed')
+        return 'completed'
+
+    def _pause(self, batch_id: str, phase: str) -> str:
+        self.db.update_batch(batch_id, phase=phase, status='paused')
+        return phase
+
+    # ==================== 第一阶段：列表 ====================
+
+    def list_phase(self, batch_id: str) -> bool:
+        """
+        并行获取批次内公众号的列表，全部完成返回 True
+        列表未完成的继续分页获取；列表在之前的批次中已完成的做一次增量同步，获取新发布的文章
+        """
+        accounts = self.db.get_batch_accounts(batch_id, need_list=True)
+        print(f"\n📄 第一阶段：获取 {len(accounts)} 个公众号的文章列表"
+              f"（并行 {self.list_workers}）")
+
+        def list_account(account: Dict) -> bool:
+            if self._stop.is_set():
+                return False
+            if account['stop_flag']:
+                done = self.collector.sync_account_incremental(
+                    account['biz'], account['nick_name'], fetch_details=False) is not None
+            else:
+                done = self.collector.collect_list_only(account['biz'], account['nick_name'])
+            if not self.collector.check_balance():
+                self._stop.set()
+            return done
+
+        with progress.live(self.collector), \
+                ThreadPoolExecutor(max_workers=self.list_workers,
+                                   thread_name_prefix='batch-list') as executor:
+            results = list(executor.map(list_account, accounts))
+        self.db.claim_batch_articles(batch_id)
+        # 增量同步中途失败时不推进同步时间，公众号仍需获取列表
+        return all(results) and not self._stop.is_set() \
+            and not self.db.get_batch_accounts(batch_id, need_list=True)
+
+    # ==================== 第二阶段：详情 ====================
+
+    def detail_phase(self, batch_id: str) -> bool:
+        """所有公众号的待完成文章组成全局队列并发获取，余额不足时返回 False"""
+        articles = self.db.get_detail_candidates(batch_id)
+        total = len(articles)
+        print(f"\n📊 第二阶段：获取 {total} 篇文章详情（并发 {self.detail_workers}）")
+        if not total:
+            return True
+
+        def fetch(article: Dict):
+            if self._stop.is_set():
+                return
+            if not self.collector.fetch_article_detail(article):
+                self._stop.set()
+
+        queue = iter(articles)
+        with progress.live(self.collector), \
+                ThreadPoolExecutor(max_workers=self.detail_workers,
+                                   thread_name_prefix='batch-detail') as executor:
+            # 在途任务保持在并发数的两倍以内，余额不足时尽快停止提交
+            in_flight = {executor.submit(fetch, article)
+                         for article in itertools.islice(queue, self.detail_workers * 2)}
+            while in_flight:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    future.result()
+                if not self._stop.is_set():
+                    in_flight |= {executor.submit(fetch, article)
+                                  for article in itertools.islice(queue, len(finished))}
+
+        if self._stop.is_set():
+            print("\n⚠️ 余额不足，批次已暂停，请充值后继续")
+            return False
+        self.collector.drain_retry_queue()
+        remaining = len(self.db.get_detail_candidates(batch_id))
+        if remaining:
+            print(f"\n⚠️ 仍有 {remaining} 篇文章未完成，批次已暂停，可稍后继续")
+        return not remaining
+
+
+def print_estimate(estimate: Dict, balance: float):
+    cost_model = estimate['cost_model']
+    print(f"\n{'='*60}")
+    print("费用预估")
+    print(f"{'='*60}")
+    for api_type in ('read_zan_pro', 'article_detail'):
+        print(f"  {api_type}: {cost_model.costs[api_type]:.4f}元 "
+              f"({cost_model.sources[api_type]})")
+    by_status = estimate['by_status']
+    print(f"需获取详情: {estimate['articles']} 篇"
+          f"（需统计+全文 {by_status.get('list_only', 0)}，"
+          f"仅差全文 {by_status.get('stats_fetched', 0)}）")
+    print(f"预计费用: {estimate['cost']:.2f}元")
+    print(f"当前余额: {balance:.2f}元")
+    if estimate['cost'] > balance:
+        print("⚠️ 余额不足以完成全部详情，余额耗尽时批次会暂停")
+
+
+def print_batches(db: DatabaseManager):
+    batches = db.list_batches()
+    if not batches:
+        print("暂无批次")
+        return
+    modes = {'standard': '标准', 'two_phase': '两阶段'}
+    statuses = {'running': '进行中', 'paused': '暂停', 'completed': '完成'}
+    print(f"{'批次号':<28}{'名称':<14}{'模式':<8}{'状态':<8}{'阶段':<10}进度")
+    for batch in batches:
+        print(f"{batch['batch_id']:<28}{(batch['name'] or '')[:12]:<14}"
+              f"{modes.get(batch['last_mode'], batch['last_mode'] or ''):<8}"
+              f"{statuses.get(batch['status'], batch['status']):<8}{batch['phase']:<10}"
+              f"{batch['completed_accounts']}/{batch['total_accounts']}, "
+              f"{batch['fetched_articles']}/{batch['total_articles']}")
+
+
+def run_two_phase(collector: WechatArticleCollector, batch_id: str = None,
+                  name: str = None, accounts: List[Tuple[str, str]] = None,
+                  confirm: Callable[[Dict], bool] = None) -> str:
+    """
+    新建（batch_id 为空时）或继续一个两阶段批次
+    confirm 为空时在终端询问
+    """
+    manager = BatchManager(collector.db)
+    if batch_id is None:
+        if accounts is None:
+            accounts = registry.target_accounts(collector.db)
+        batch_id = manager.create_batch(name, 'two_phase', accounts,
+                                        collector.current_balance)
+        print(f"✅ 已创建批次 {batch_id}（{len(accounts)} 个公众号）")
+
+    def ask(estimate: Dict) -> bool:
+        print_estimate(estimate, collector.current_balance)
+        return input("\n确认获取全部详情? (y/n): ").strip().lower() == 'y'
+
+    runner = TwoPhaseRunner(collector, manager)
+    phase = runner.run(batch_id, confirm or ask)
+    batch = collector.db.get_batch(batch_id)
+    print(f"\n批次 {batch_id}: 阶段 {phase}，公众号 {batch['completed_accounts']}/"
+          f"{batch['total_accounts']}，文章 {batch['fetched_articles']}/{batch['total_articles']}，"
+          f"实际消耗 {batch['actual_cost']:.2f}元")
+    return phase
+
+
+def main():
+    parser = argparse.ArgumentParser(description="两阶段批次采集")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--list', action='store_true', help="查看批次列表")
+    parser.add_argument('--new', metavar='NAME', help="新建批次（使用配置的公众号）")
+    parser.add_argument('--resume', metavar='BATCH_ID', help="继续指定批次")
+    parser.add_argument('--yes', action='store_true', help="跳过费用确认")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    db = DatabaseManager()
+
+    if args.new is not None or args.resume:
+        collector = WechatArticleCollector()
+        confirm = (lambda estimate: True) if args.yes else None
+        run_two_phase(collector, args.resume, args.new, confirm=confirm)
+    else:
+        print_batches(db)
+
+
+if __name__ == "__main__":
+    main()
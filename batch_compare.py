@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+批次统计对比
+在 SQL 中基于 batch_articles 快照做集合运算，得到两个批次之间
+新增、消失、数据变化的文章及阅读数差值；Python 端只逐行读取结果，不加载整个批次
+"""
+
+import argparse
+import csv
+import sqlite3
+import sys
+from collections import namedtuple
+from typing import Dict, Iterator, List
+
+import database
+
+DiffRow = namedtuple('DiffRow', ['article_id', 'change', 'old_read', 'new_read',
+                                 'read_delta', 'old_status', 'new_status',
+                                 'title', 'url', 'nick_name'])
+
+CHANGES = ('new', 'removed', 'changed', 'unchanged')
+CHANGE_LABELS = {'new': '新增', 'removed': '消失', 'changed': '有变化', 'unchanged': '无变化'}
+
+# 两个批次快照的差集/交集（:old / :new 为批次号）
+# 两个分支都按主键 (batch_id, article_id) 做范围扫描和点查，不需要排序或临时表
+_DIFF_SQL = '''
+    SELECT n.article_id,
+           CASE
+               WHEN o.article_id IS NULL THEN 'new'
+               WHEN o.read_num IS NOT n.read_num OR o.zan IS NOT n.zan
+                 OR o.looking IS NOT n.looking OR o.share_num IS NOT n.share_num
+                 OR o.collect_num IS NOT n.collect_num
+                 OR o.comment_count IS NOT n.comment_count
+                 OR o.fetch_status IS NOT n.fetch_status THEN 'changed'
+               ELSE 'unchanged'
+           END AS change,
+           o.read_num AS old_read, n.read_num AS new_read,
+           COALESCE(n.read_num, 0) - COALESCE(o.read_num, 0) AS read_delta,
+           o.fetch_status AS old_status, n.fetch_status AS new_status
+    FROM batch_articles n
+    LEFT JOIN batch_articles o ON o.batch_id = :old AND o.article_id = n.article_id
+    WHERE n.batch_id = :new
+    UNION ALL
+    SELECT o.article_id, 'removed', o.read_num, NULL, -COALESCE(o.read_num, 0),
+           o.fetch_status, NULL
+    FROM batch_articles o
+    WHERE o.batch_id = :old
+      AND NOT EXISTS (SELECT 1 FROM batch_articles n
+                      WHERE n.batch_id = :new AND n.article_id = o.article_id)
+'''
+
+
+def _connect() -> sqlite3.Connection:
+    database.ensure_schema()
+    return database.get_connection()
+
+
+def summarize(old_batch: str, new_batch: str) -> Dict[str, Dict]:
+    """
+    各类变化的文章数和阅读数差值合计（一次聚合查询）
+    Returns:
+        {'new': {'articles': n, 'read_delta': d}, 'removed': ..., 'changed': ..., 'unchanged': ...}
+    """
+    conn = _connect()
+    try:
+        rows = conn.execute(f'''
+            SELECT change, COUNT(*) AS articles, SUM(read_delta) AS read_delta
+            FROM ({_DIFF_SQL}) GROUP BY change
+        ''', {'old': old_batch, 'new': new_batch}).fetchall()
+    finally:
+        conn.close()
+    summary = {change: {'articles': 0, 'read_delta': 0} for change in CHANGES}
+    for row in rows:
+        summary[row['change']] = {'articles': row['articles'], 'read_delta': row['read_delta'] or 0}
+    return summary
+
+
+def iter_diff(old_batch: str, new_batch: str, changes: List[str] = None,
+              order_by_delta: bool = False, limit: int = None) -> Iterator[DiffRow]:
+    """
+    逐行返回差异（附带标题、链接和公众号名）
+    Args:
+        changes: 只返回这些变化类型（默认除 unchanged 外的全部）
+        order_by_delta: 按阅读数差值绝对值从大到小（需要排序，建议配合 limit）
+    """
+    changes = list(changes or ('new', 'removed', 'changed'))
+    placeholders = ','.join(f":c{i}" for i in range(len(changes)))
+    params = {'old': old_batch, 'new': new_batch}
+    params.update({f"c{i}": change for i, change in enumerate(changes)})
+    order = 'ORDER BY ABS(d.read_delta) DESC' if order_by_delta else ''
+    limit_sql = f'LIMIT {int(limit)}' if limit else ''
+
+    conn = _connect()
+    try:
+        cursor = conn.execute(f'''
+            SELECT d.*, art.title, art.url, acc.nick_name
+            FROM ({_DIFF_SQL}) d
+            JOIN articles art ON art.id = d.article_id
+            LEFT JOIN accounts acc ON acc.id = art.account_id
+            WHERE d.change IN ({placeholders})
+            {order} {limit_sql}
+        ''', params)
+        for row in cursor:
+            yield DiffRow(*row)
+    finally:
+        conn.close()
+
+
+def print_summary(old_batch: str, new_batch: str, top: int = 10):
+    summary = summarize(old_batch, new_batch)
+    print(f"\n{'='*60}")
+    print(f"批次对比: {old_batch} → {new_batch}")
+    print(f"{'='*60}")
+    for change in CHANGES:
+        item = summary[change]
+        print(f"  {CHANGE_LABELS[change]}: {item['articles']} 篇，阅读数变化 {item['read_delta']:+,}")
+    total = sum(item['read_delta'] for item in summary.values())
+    print(f"  阅读数总变化: {total:+,}")
+
+    if top:
+        print(f"\n阅读数变化最大的 {top} 篇:")
+        for row in iter_diff(old_batch, new_batch, order_by_delta=True, limit=top):
+            print(f"  [{CHANGE_LABELS[row.change]}] {(row.title or '')[:30]} "
+                  f"({row.nick_name}) {row.old_read} → {row.new_read} ({row.read_delta:+,})")
+
+
+def export_csv(old_batch: str, new_batch: str, output, changes: List[str] = None) -> int:
+    """流式写出差异CSV，返回行数"""
+    writer = csv.writer(output)
+    writer.writerow(DiffRow._fields)
+    count = 0
+    for row in iter_diff(old_batch, new_batch, changes):
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="对比两个采集批次")
+    parser.add_argument('old_batch', help="基准批次号")
+    parser.add_argument('new_batch', help="对比批次号")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--top', type=int, default=10, help="显示阅读数变化最大的文章数")
+    parser.add_argument('--csv', metavar='PATH', help="导出差异明细（- 表示标准输出）")
+    parser.add_argument('--changes', nargs='+', choices=CHANGES,
+                        help="导出的变化类型（默认 new removed changed）")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    if not database.check_database_exists():
+        print(f"❌ 数据库不存在: {database.DATABASE_PATH}")
+        return
+
+    if args.csv:
+        if args.csv == '-':
+            export_csv(args.old_batch, args.new_batch, sys.stdout, args.changes)
+            return
+        with open(args.csv, 'w', newline='', encoding='utf-8-sig') as f:
+            count = export_csv(args.old_batch, args.new_batch, f, args.changes)
+        print(f"✅ 已导出 {count} 行到 {args.csv}")
+    print_summary(args.old_batch, args.new_batch, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+端到端吞吐压测
+使用本地模拟API驱动 WechatArticleCollector，不产生真实费用
+场景：cold（空库）、warm（原始响应缓存已就绪）、resume（余额耗尽后充值恢复）
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Callable
+
+import config
+import database
+import metrics
+from collector import WechatArticleCollector
+from mock_api import MockApiConfig, MockApiServer, synthetic_accounts, DEFAULT_COSTS
+
+ENDPOINT_METHODS = {
+    'post_history': 'call_api_1_post_history',
+    'read_zan_pro': 'call_api_2_read_zan',
+    'article_detail': 'call_api_3_article_detail',
+}
+
+DB_WRITE_METHODS = [
+    'save_raw_response', 'save_account', 'update_account_progress',
+    'save_article_from_list', 'save_article_stats', 'save_article_content',
+    'save_progress',
+]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """最近秩百分位数"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+class Timings:
+    """收集接口和数据库写入耗时"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, name: str, seconds: float):
+        self.samples.setdefault(name, []).append(seconds)
+
+    def wrap(self, obj, method_name: str, label: str):
+        original = getattr(obj, method_name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.add(label, time.perf_counter() - start)
+
+        setattr(obj, method_name, timed)
+
+
+def instrument(collector: WechatArticleCollector, timings: Timings):
+    """给采集器实例挂上计时包装"""
+    for endpoint, method_name in ENDPOINT_METHODS.items():
+        timings.wrap(collector, method_name, f"api:{endpoint}")
+    for method_name in DB_WRITE_METHODS:
+        timings.wrap(collector.db, method_name, f"db:{method_name}")
+
+
+def new_collector(server: MockApiServer, timings: Timings,
+                  min_balance: float, keep_sleeps: bool) -> WechatArticleCollector:
+    with contextlib.redirect_stdout(io.StringIO()):
+        collector = WechatArticleCollector("bench-key", min_balance, server.base_url)
+    if not keep_sleeps:
+        collector.PAGE_INTERVAL = 0
+        collector.ARTICLE_INTERVAL = 0
+        collector.ACCOUNT_INTERVAL = 0
+    instrument(collector, timings)
+    return collector
+
+
+def use_database(path: str):
+    """切换到压测专用数据库并建表"""
+    database.set_database_path(path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        database.init_database()
+
+
+def count_completed() -> int:
+    conn = database.get_connection()
+    try:
+        return conn.execute(
+            "SELECT COUNT(*) FROM articles WHERE fetch_status = 'content_fetched'"
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def reset_derived_tables():
+    """清空派生表，保留 api_raw_responses（模拟缓存就绪的重跑）"""
+    conn = database.get_connection()
+    try:
+        for table in ['article_contents', 'article_stats', 'articles',
+                      'accounts', 'fetch_progress']:
+            conn.execute(f'DELETE FROM {table}')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def run_scenario(name: str, server: MockApiServer, body: Callable[[Timings], None],
+                 quiet: bool) -> Dict:
+    """运行一个场景并汇总指标"""
+    timings = Timings()
+    metrics.REGISTRY.reset()
+    before_calls = server.state.summary()
+    before_completed = count_completed()
+
+    start = time.perf_counter()
+    output = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(output) if quiet else contextlib.nullcontext():
+        body(timings)
+    elapsed = time.perf_counter() - start
+
+    after_calls = server.state.summary()
+    completed = count_completed() - before_completed
+
+    endpoints = {}
+    for endpoint in ENDPOINT_METHODS:
+        samples = timings.samples.get(f"api:{endpoint}", [])
+        paid = after_calls['calls'].get(endpoint, 0) - before_calls['calls'].get(endpoint, 0)
+        endpoints[endpoint] = {
+            'calls': len(samples),
+            'network_calls': paid,
+            'cache_hits': metrics.API_CACHE.value(api_type=endpoint, result='hit'),
+            'p50_ms': round(percentile(samples, 50) * 1000, 3),
+            'p99_ms': round(percentile(samples, 99) * 1000, 3),
+            'spent': round(after_calls['spent'].get(endpoint, 0)
+                           - before_calls['spent'].get(endpoint, 0), 4),
+        }
+
+    db_total = 0.0
+    db_ops = {}
+    for method_name in DB_WRITE_METHODS:
+        samples = timings.samples.get(f"db:{method_name}", [])
+        if samples:
+            db_ops[method_name] = {
+                'count': len(samples),
+                'total_ms': round(sum(samples) * 1000, 3),
+                'p99_ms': round(percentile(samples, 99) * 1000, 3),
+            }
+            db_total += sum(samples)
+
+    return {
+        'scenario': name,
+        'elapsed_s': round(elapsed, 3),
+        'articles_completed': completed,
+        'articles_per_s': round(completed / elapsed, 2) if elapsed > 0 else 0.0,
+        'endpoints': endpoints,
+        'db_write_total_ms': round(db_total * 1000, 3),
+        'db_write_ops': db_ops,
+        'spent': round(after_calls['total_spent'] - before_calls['total_spent'], 4),
+    }
+
+
+def print_report(result: Dict):
+    print(f"\n{'='*60}")
+    print(f"场景: {result['scenario']}")
+    print(f"{'='*60}")
+    print(f"耗时: {result['elapsed_s']:.2f}s  完成文章: {result['articles_completed']}  "
+          f"吞吐: {result['articles_per_s']:.2f} 篇/秒  费用: {result['spent']:.2f}元")
+    print(f"{'接口':<16}{'调用':>8}{'网络':>8}{'缓存':>8}{'p50(ms)':>10}{'p99(ms)':>10}{'费用':>8}")
+    for endpoint, row in result['endpoints'].items():
+        print(f"{endpoint:<16}{row['calls']:>8}{row['network_calls']:>8}{row['cache_hits']:>8}"
+              f"{row['p50_ms']:>10.2f}{row['p99_ms']:>10.2f}{row['spent']:>8.2f}")
+    print(f"数据库写入总耗时: {result['db_write_total_ms']:.1f}ms")
+    for method_name, row in result['db_write_ops'].items():
+        print(f"  {method_name:<26}{row['count']:>6}次 {row['total_ms']:>10.1f}ms "
+              f"p99 {row['p99_ms']:.2f}ms")
+
+
+def run_benchmark(accounts: int = 5, articles: int = 40, latency_ms: float = 20,
+                  error_rate: float = 0.0, deleted_rate: float = 0.02,
+                  scenarios: List[str] = None, keep_sleeps: bool = False,
+                  quiet: bool = True) -> List[Dict]:
+    """运行压测，返回各场景结果"""
+    scenarios = scenarios or ['cold', 'warm', 'resume']
+    account_list = synthetic_accounts(accounts)
+    latency = {name: latency_ms for name in DEFAULT_COSTS}
+    min_balance = 0.2
+    results = []
+
+    workdir = tempfile.mkdtemp(prefix="wechat_bench_")
+    original_path = database.DATABASE_PATH
+    original_targets = config.TARGET_ACCOUNTS
+    config.TARGET_ACCOUNTS = account_list
+    try:
+        if 'cold' in scenarios or 'warm' in scenarios:
+            use_database(os.path.join(workdir, "bench_cache.db"))
+            mock_config = MockApiConfig(articles_per_account=articles, latency_ms=latency,
+                                        error_rate=error_rate, deleted_rate=deleted_rate)
+            with MockApiServer(mock_config) as server:
+                def cold(timings):
+                    collector = new_collector(server, timings, min_balance, keep_sleeps)
+                    collector.collect_multiple_accounts(account_list)
+
+                results.append(run_scenario('cold', server, cold, quiet))
+
+                if 'warm' in scenarios:
+                    reset_derived_tables()
+
+                    def warm(timings):
+                        collector = new_collector(server, timings, min_balance, keep_sleeps)
+                        collector.collect_multiple_accounts(account_list)
+
+                    results.append(run_scenario('warm', server, warm, quiet))
+                if 'cold' not in scenarios:
+                    results = [r for r in results if r['scenario'] != 'cold']
+
+        if 'resume' in scenarios:
+            use_database(os.path.join(workdir, "bench_resume.db"))
+            # 余额只够大约一半的工作量，触发余额不足后充值恢复
+            per_article = DEFAULT_COSTS['read_zan_pro'] + DEFAULT_COSTS['article_detail']
+            pages = (articles + 5) // 5 + 1
+            full_cost = accounts * (articles * per_article + pages * DEFAULT_COSTS['post_history'])
+            mock_config = MockApiConfig(articles_per_account=articles, latency_ms=latency,
+                                        error_rate=error_rate, deleted_rate=deleted_rate,
+                                        initial_balance=round(full_cost / 2 + min_balance, 2))
+            with MockApiServer(mock_config) as server:
+                def resume(timings):
+                    collector = new_collector(server, timings, min_balance, keep_sleeps)
+                    collector.collect_multiple_accounts(account_list)
+                    server.state.top_up(full_cost)
+                    collector = new_collector(server, timings, min_balance, keep_sleeps)
+                    collector.resume_collection()
+
+                results.append(run_scenario('resume', server, resume, quiet))
+    finally:
+        database.set_database_path(original_path)
+        config.TARGET_ACCOUNTS = original_targets
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="采集器端到端吞吐压测（本地模拟API）")
+    parser.add_argument('--accounts', type=int, default=5, help="合成公众号数量")
+    parser.add_argument('--articles', type=int, default=40, help="每个公众号2025年文章数")
+    parser.add_argument('--latency-ms', type=float, default=20, help="模拟接口延迟")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="HTTP 500 比例")
+    parser.add_argument('--deleted-rate', type=float, default=0.02, help="code 101 比例")
+    parser.add_argument('--scenario', action='append', choices=['cold', 'warm', 'resume'],
+                        help="可重复指定，默认全部")
+    parser.add_argument('--keep-sleeps', action='store_true', help="保留采集器的请求间隔")
+    parser.add_argument('--verbose', action='store_true', help="显示采集器输出")
+    parser.add_argument('--output', help="结果写入JSON文件")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.accounts, args.articles, args.latency_ms,
+                            args.error_rate, args.deleted_rate, args.scenario,
+                            args.keep_sleeps, quiet=not args.verbose)
+    for result in results:
+        print_report(result)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 结果已写入: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
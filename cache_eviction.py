@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+原始响应缓存的过期归档
+api_raw_responses 按接口区分缓存策略（见 config.RAW_CACHE_TTL）：
+- 文章列表、阅读数：超过有效期后不再作为缓存命中，并归档到冷库
+- 文章正文：永不过期；热库超出行数上限时，只归档已完成解析入库的文章
+- code 101（文章已删除）是永久结果，始终留在热库
+启用分片时主库和每个分片文件都是热库，行数上限按合计计算
+归档按批小事务执行，可在采集过程中后台运行，不会长时间占用写锁
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List
+
+import config
+import database
+import metrics
+import sharding
+from structured_log import get_logger
+
+ARCHIVE_ALIAS = 'archive'
+META_ALIAS = 'meta'
+
+
+class RawCacheEvictor:
+    """把过期或超出行数上限的原始响应分批移动到冷库"""
+
+    def __init__(self, archive_path: str = None, max_rows: int = None,
+                 batch_size: int = None, ttl: Dict[str, float] = None):
+        self.archive_path = archive_path or config.RAW_ARCHIVE_PATH
+        self.max_rows = config.RAW_CACHE_MAX_ROWS if max_rows is None else max_rows
+        self.batch_size = batch_size or config.RAW_EVICT_BATCH
+        self.ttl = config.RAW_CACHE_TTL if ttl is None else ttl
+        self._stop = threading.Event()
+        self._thread = None
+        self.log = get_logger('eviction')
+
+    # ==================== 单批归档 ====================
+
+    def _hot_paths(self) -> List[str]:
+        """热库文件：主库，以及启用分片时的每个分片文件"""
+        paths = [database.DATABASE_PATH]
+        router = sharding.get_router()
+        if router is not None:
+            paths += [router.shard_path(shard) for shard in router.list_shards()]
+        return paths
+
+    def _connect(self, path: str = None) -> sqlite3.Connection:
+        """
+        打开一个热库文件并 ATTACH 冷库；分片文件另外 ATTACH 主库（别名 meta），
+        用于判断文章是否已解析入库
+        """
+        database.ensure_schema()
+        path = path or database.DATABASE_PATH
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        if os.path.abspath(path) != os.path.abspath(database.DATABASE_PATH):
+            conn.execute(f"ATTACH DATABASE ? AS {META_ALIAS}", (database.DATABASE_PATH,))
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS}", (self.archive_path,))
+        conn.execute(f'''
+            CREATE TABLE IF NOT EXISTS {ARCHIVE_ALIAS}.api_raw_responses (
+                id INTEGER PRIMARY KEY,
+                api_type TEXT NOT NULL,
+                request_key TEXT NOT NULL,
+                request_params TEXT NOT NULL,
+                response_data TEXT NOT NULL,
+                response_code INTEGER,
+                cost_money REAL,
+                remain_money REAL,
+                key_id TEXT,
+                created_at TIMESTAMP,
+                archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        columns = [row[1] for row in conn.execute(
+            f'PRAGMA {ARCHIVE_ALIAS}.table_info(api_raw_responses)')]
+        if 'key_id' not in columns:
+            # 旧冷库：补充密钥指纹字段，同时清除已归档记录中的明文密钥
+            conn.execute('BEGIN')
+            conn.execute(f'ALTER TABLE {ARCHIVE_ALIAS}.api_raw_responses ADD COLUMN key_id TEXT')
+            database.scrub_request_keys(conn, ARCHIVE_ALIAS)
+            conn.execute('COMMIT')
+        conn.execute(f'''
+            CREATE INDEX IF NOT EXISTS {ARCHIVE_ALIAS}.idx_archive_type_key
+            ON api_raw_responses(api_type, request_key)
+        ''')
+        return conn
+
+    def _connect_all(self) -> List[sqlite3.Connection]:
+        return [self._connect(path) for path in self._hot_paths()]
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection) -> str:
+        """articles 表所在的库名（主库连接为 main，分片连接为 meta）"""
+        names = [row[1] for row in conn.execute('PRAGMA database_list')]
+        return META_ALIAS if META_ALIAS in names else 'main'
+
+    def _expired_ids(self, conn: sqlite3.Connection) -> List[int]:
+        for api_type, ttl in self.ttl.items():
+            if not ttl:
+                continue
+            # code 101（文章已删除）是永久结果，保留在热库中继续命中缓存
+            rows = conn.execute('''
+                SELECT id FROM main.api_raw_responses
+                WHERE api_type = ? AND created_at < datetime('now', ?)
+                  AND IFNULL(response_code, 0) != 101
+                ORDER BY created_at
+                LIMIT ?
+            ''', (api_type, f'-{int(ttl)} seconds', self.batch_size)).fetchall()
+            if rows:
+                return [row[0] for row in rows]
+        return []
+
+    def _over_budget_ids(self, conn: sqlite3.Connection, excess: int) -> List[int]:
+        # 永久缓存的接口只归档已解析入库的文章，未完成的文章仍需要命中缓存
+        permanent = [api_type for api_type, ttl in self.ttl.items() if not ttl]
+        placeholders = ','.join('?' * len(permanent)) or "''"
+        rows = conn.execute(f'''
+            SELECT r.id FROM main.api_raw_responses r
+            WHERE IFNULL(r.response_code, 0) != 101
+              AND (r.api_type NOT IN ({placeholders})
+                   OR EXISTS (SELECT 1 FROM {self._meta(conn)}.articles a
+                              WHERE a.url = r.request_key AND a.fetch_status = 'content_fetched'))
+            ORDER BY r.created_at
+            LIMIT ?
+        ''', permanent + [min(excess, self.batch_size)]).fetchall()
+        return [row[0] for row in rows]
+
+    def _move(self, conn: sqlite3.Connection, ids: List[int], reason: str) -> int:
+        # 冷库自行分配 id：各分片的 id 互相重叠
+        id_list = ','.join(str(i) for i in ids)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(f'''
+                INSERT INTO {ARCHIVE_ALIAS}.api_raw_responses
+                (api_type, request_key, request_params, response_data,
+                 response_code, cost_money, remain_money, key_id, created_at)
+                SELECT api_type, request_key, request_params, response_data,
+                       response_code, cost_money, remain_money, key_id, created_at
+                FROM main.api_raw_responses WHERE id IN ({id_list})
+            ''')
+            moved = conn.execute(f'''
+                DELETE FROM main.api_raw_responses WHERE id IN ({id_list})
+                RETURNING api_type
+            ''').fetchall()
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        for (api_type,) in moved:
+            metrics.RAW_CACHE_ARCHIVED.inc(api_type=api_type, reason=reason)
+        return len(moved)
+
+    def step(self, conns: List[sqlite3.Connection] = None) -> int:
+        """
+        归档一批（先过期数据，再超出上限的数据），返回移动的行数
+        行数上限按主库与全部分片的合计计算，超出时从行数最多的文件开始归档
+        """
+        own = conns is None
+        conns = conns or self._connect_all()
+        try:
+            for conn in conns:
+                ids = self._expired_ids(conn)
+                if ids:
+                    return self._move(conn, ids, 'expired')
+            if not self.max_rows:
+                return 0
+            counts = [conn.execute('SELECT COUNT(*) FROM main.api_raw_responses').fetchone()[0]
+                      for conn in conns]
+            excess = sum(counts) - self.max_rows
+            if excess <= 0:
+                return 0
+            for idx in sorted(range(len(conns)), key=lambda i: -counts[i]):
+                ids = self._over_budget_ids(conns[idx], excess)
+                if ids:
+                    return self._move(conns[idx], ids, 'over_budget')
+            return 0
+        finally:
+            if own:
+                for conn in conns:
+                    conn.close()
+
+    def run_until_idle(self) -> int:
+        """持续归档直到没有可归档的数据，返回总行数"""
+        total = 0
+        conns = self._connect_all()
+        try:
+            while not self._stop.is_set():
+                moved = self.step(conns)
+                if not moved:
+                    break
+                total += moved
+        finally:
+            for conn in conns:
+                conn.close()
+        return total
+
+    # ==================== 后台运行 ====================
+
+    def _run(self, interval: float):
+        while not self._stop.is_set():
+            try:
+                self.run_until_idle()
+            except sqlite3.Error as e:
+                self.log.error(f"⚠️ 原始响应归档失败: {e}", error=type(e).__name__)
+            self._stop.wait(interval)
+
+    def start(self, interval: float = None):
+        """启动后台归档线程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(interval or config.RAW_EVICT_INTERVAL,),
+            name='raw-cache-evictor', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    # ==================== 统计 ====================
+
+    def stats(self) -> Dict:
+        """热库（主库与各分片合计）与冷库中各接口的行数"""
+        conns = self._connect_all()
+        try:
+            result = {'hot': {}}
+            for conn in conns:
+                for api_type, count in conn.execute('''
+                    SELECT api_type, COUNT(*) FROM main.api_raw_responses GROUP BY api_type
+                '''):
+                    result['hot'][api_type] = result['hot'].get(api_type, 0) + count
+            result['archive'] = dict(conns[0].execute(f'''
+                SELECT api_type, COUNT(*) FROM {ARCHIVE_ALIAS}.api_raw_responses GROUP BY api_type
+            ''').fetchall())
+            return result
+        finally:
+            for conn in conns:
+                conn.close()
+
+
+@contextmanager
+def background_eviction(evictor: RawCacheEvictor = None):
+    """采集期间在后台归档原始响应"""
+    evictor = evictor or RawCacheEvictor()
+    evictor.start()
+    try:
+        yield evictor
+    finally:
+        evictor.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="归档过期或超出上限的原始响应")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--archive', help="冷库文件路径")
+    parser.add_argument('--max-rows', type=int, default=None, help="热库行数上限")
+    parser.add_argument('--stats', action='store_true', help="只查看行数统计")
+    parser.add_argument('--vacuum', action='store_true', help="归档后执行 VACUUM 回收空间")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    if not database.check_database_exists():
+        print(f"❌ 数据库不存在: {database.DATABASE_PATH}")
+        return
+
+    evictor = RawCacheEvictor(args.archive, args.max_rows)
+    if not args.stats:
+        moved = evictor.run_until_idle()
+        print(f"✅ 已归档 {moved} 条原始响应到 {evictor.archive_path}")
+        if args.vacuum and moved:
+            conn = sqlite3.connect(database.DATABASE_PATH)
+            conn.execute('VACUUM')
+            conn.close()
+            print(f"🧹 已回收空间，当前大小 {os.path.getsize(database.DATABASE_PATH) / 1024:.0f}KB")
+
+    for where, counts in evictor.stats().items():
+        label = '热库' if where == 'hot' else '冷库'
+        print(f"  {label}: " + (', '.join(f"{k}={v}" for k, v in counts.items()) or '空'))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,39 @@
 #!/usr/bin/env python3
 """
 清空数据库中的所有数据，但保留表结构
+旧数据库文件整体归档到备份目录（不逐表 DELETE），详见 data_lifecycle.py
 """
 
 import sqlite3
 
-def clear_all_data():
+import data_lifecycle
+
+
+def clear_all_data(keep_backup: bool = True):
     """清空所有表的数据"""
-    conn = sqlite3.connect('wechat_articles.db')
-    cursor = conn.cursor()
-    
+    print("清空数据库中的所有数据...")
     try:
-        # 禁用外键约束（方便删除）
-        cursor.execute('PRAGMA foreign_keys = OFF')
-        
-        # 清空所有表（注意顺序，先清空有外键的表）
-        tables = [
-            'article_contents',   # 依赖 articles
-            'article_stats',      # 依赖 articles  
-            'articles',          # 依赖 accounts
-            'accounts',
-            'api_raw_responses',
-            'fetch_progress'
-        ]
-        
-        print("清空数据库中的所有数据...")
-        for table in tables:
-            cursor.execute(f'DELETE FROM {table}')
-            # 重置自增主键
-            cursor.execute(f"DELETE FROM sqlite_sequence WHERE name='{table}'")
-            print(f"  ✅ 清空表: {table}")
-        
-        # 重新启用外键约束
-        cursor.execute('PRAGMA foreign_keys = ON')
-        
-        conn.commit()
-        print("\n✅ 所有数据已清空，表结构保留")
-        
-        # 验证
-        print("\n验证结果:")
-        for table in tables:
-            cursor.execute(f'SELECT COUNT(*) FROM {table}')
-            count = cursor.fetchone()[0]
-            print(f"  {table}: {count} 条记录")
-            
+        result = data_lifecycle.reset(keep_backup=keep_backup)
+    except sqlite3.OperationalError as e:
+        print(f"❌ 数据库正在被使用，请先停止采集: {e}")
+        return
     except Exception as e:
         print(f"❌ 清空数据失败: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+        return
+
+    print("\n✅ 所有数据已清空，表结构保留")
+    if result['archived']:
+        print(f"  旧数据已归档: {result['archived']}")
+    if result['shards']:
+        print(f"  旧分片已归档: {result['shards']}")
 
 if __name__ == "__main__":
     # 确认操作
     print("⚠️  警告：此操作将清空数据库中的所有数据！")
-    print("表结构将保留，但所有记录将被删除。")
+    print("表结构将保留，旧数据文件会移动到备份目录。")
     confirm = input("\n确认清空? (输入 yes 确认): ").strip().lower()
-    
+
     if confirm == 'yes':
         clear_all_data()
     else:
-        print("取消操作")
\ No newline at end of file
+        print("取消操作")
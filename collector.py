@@ -4,91 +4,199 @@
 核心采集逻辑，确保数据完整性和断点续传
 """
 
-import requests
 import json
+import random
+import threading
 import time
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
 from db_manager import DatabaseManager
+from key_pool import ApiKeyState, KeyPool
+import metrics
+import config
+import parsers
+import registry
+from progress import tracked
+from structured_log import get_logger
+from profiler import staged
+from singleflight import coalesced
 
 
 class WechatArticleCollector:
     """微信公众号文章采集器"""
     
-    def __init__(self, api_key: str = None, min_balance: float = None):
+    # 请求间隔（秒），避免请求过快
+    PAGE_INTERVAL = 0.5
+    ARTICLE_INTERVAL = 0.3
+    ACCOUNT_INTERVAL = 1
+    
+    # 读取余额时等待后台余额查询的总时长上限（秒）；密钥多且接口不可达时逐个超时
+    BALANCE_WAIT = 10
+    
+    # 失败请求重试：指数退避（带随机抖动），超过次数后进入死信状态
+    RETRY_BASE_DELAY = 2
+    RETRY_MAX_DELAY = 120
+    RETRY_MAX_ATTEMPTS = 5
+    RETRY_DRAIN_TIMEOUT = 300
+    
+    def __init__(self, api_key: str = None, min_balance: float = None,
+                 base_url: str = None, api_keys: List[str] = None):
         """
         初始化采集器
         Args:
             api_key: API密钥（如果不提供，从config导入）
             min_balance: 最小余额阈值（如果不提供，从config导入）
+            base_url: API基础URL（如果不提供，从config导入；压测时指向本地模拟服务）
+            api_keys: 多个API密钥，组成密钥池轮换使用（优先于 api_key）
         """
-        if api_key is None:
-            from config import API_KEY
-            api_key = API_KEY
+        if api_keys is None:
+            if api_key is not None:
+                api_keys = [api_key]
+            else:
+                from config import API_KEYS
+                api_keys = API_KEYS
         if min_balance is None:
             from config import MIN_BALANCE
             min_balance = MIN_BALANCE
+        if base_url is None:
+            from config import BASE_URL
+            base_url = BASE_URL
             
-        self.api_key = api_key
-        self.base_url = "https://www.dajiala.com/fbmain/monitor/v3"
+        from config import API_KEY_RATE, API_KEY_BURST
+        self.key_pool = KeyPool(api_keys, min_balance, API_KEY_RATE, API_KEY_BURST)
+        self.api_key = self.key_pool.states[0].key
+        self.base_url = base_url.rstrip('/')
         self.min_balance = min_balance
         self.db = DatabaseManager()
-        self.current_balance = 0
+        self.metrics = metrics.REGISTRY
+        self.log = get_logger('collector')
         self.task_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._local = threading.local()
+        # 停止请求（守护进程收到 SIGTERM 时设置），逐篇/逐页循环在保存当前进度后退出
+        self._stop_requested = threading.Event()
         
-        # 初始化时获取当前余额
-        self.update_balance()
+        # 余额在后台获取，不阻塞初始化；首次需要余额时再等待结果
+        self._balance_thread = threading.Thread(
+            target=self._prefetch_balance, name="balance-prefetch", daemon=True)
+        self._balance_thread.start()
+        self._balance_deadline = time.monotonic() + self.BALANCE_WAIT
+    
+    # ==================== HTTP会话 ====================
+    
+    def _http(self):
+        """每个线程复用一个HTTP会话（连接池），requests 延迟到首次请求时导入"""
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            import requests
+            session = requests.Session()
+            self._local.session = session
+        return session
     
     # ==================== 余额查询 ====================
     
-    def get_remain_money(self) -> float:
+    def get_remain_money(self, key: str = None) -> float:
         """
         调用接口获取当前余额（不消耗费用）
+        Args:
+            key: 要查询的密钥（默认第一个密钥）
         Returns:
             当前余额，失败返回0
         """
+        return self._query_remain_money(key or self.api_key) or 0
+    
+    def _query_remain_money(self, key: str) -> Optional[float]:
+        """查询指定密钥的余额，失败返回 None"""
         url = f"{self.base_url}/get_remain_money"
         payload = {
-            "key": self.api_key,
+            "key": key,
             "verifycode": ""
         }
         headers = {"Content-Type": "application/json"}
         
         try:
-            response = requests.post(url, json=payload, headers=headers, timeout=10)
+            response = self._http().post(url, json=payload, headers=headers, timeout=10)
             response.raise_for_status()
             result = response.json()
             
             if result.get('code') == 0:
                 return result.get('remain_money', 0)
             else:
-                print(f"  ⚠️ 获取余额失败: {result.get('msg', '未知错误')}")
-                return 0
+                self.log.warning(f"  ⚠️ 获取余额失败: {result.get('msg', '未知错误')}",
+                                 api_type='get_remain_money', code=result.get('code'))
+                return None
         except Exception as e:
-            print(f"  ⚠️ 获取余额异常: {e}")
-            return 0
+            self.log.warning(f"  ⚠️ 获取余额异常: {e}", api_type='get_remain_money',
+                             error=type(e).__name__)
+            return None
     
     def update_balance(self):
-        """更新当前余额"""
-        self.current_balance = self.get_remain_money()
+        """更新所有密钥的余额"""
+        self._balance_thread.join()
+        self.key_pool.refresh(self._query_remain_money)
         print(f"  💰 当前余额: {self.current_balance} 元")
     
+    def _prefetch_balance(self):
+        """后台获取各密钥余额；如果期间已有付费调用返回了余额，则以调用结果为准"""
+        self.key_pool.refresh(self._query_remain_money, only_if_unknown=True)
+    
+    @property
+    def balance_known(self) -> bool:
+        """后台余额查询是否已完成"""
+        return not self._balance_thread.is_alive()
+    
+    @property
+    def current_balance(self) -> float:
+        """
+        密钥池中可用密钥的余额合计
+        后台查询未完成时最多等待到 BALANCE_WAIT 秒，之后只合计已知的余额（见 balance_known）
+        """
+        self._balance_thread.join(max(0.0, self._balance_deadline - time.monotonic()))
+        return self.key_pool.total_balance()
+    
+    def _request(self, send: Callable[[str], Dict]) -> Tuple[Optional[Dict], Optional[ApiKeyState]]:
+        """
+        用密钥池中的密钥发送请求，密钥余额不足（code 102）时换下一个密钥重发
+        Args:
+            send: 以密钥为参数发送请求并返回响应JSON
+        Returns:
+            (响应, 使用的密钥)；没有可用密钥时返回 (None, None)
+        """
+        while True:
+            key_state = self.key_pool.acquire()
+            if key_state is None:
+                self.log.error("    ❌ 没有余额充足的API密钥")
+                return None, None
+            try:
+                result = send(key_state.key)
+            except Exception:
+                self.key_pool.report_error(key_state)
+                raise
+            self.key_pool.report(key_state, result)
+            if result.get('code') == 102 and self.key_pool.has_available():
+                continue
+            return result, key_state
+    
     # ==================== API调用方法 ====================
     
-    def call_api_1_post_history(self, biz: str, page: int = 1) -> Optional[Dict]:
+    @coalesced('post_history', lambda biz, page=1, use_cache=True: (f"{biz}_{page}", use_cache))
+    @staged('listing')
+    def call_api_1_post_history(self, biz: str, page: int = 1,
+                                use_cache: bool = True) -> Optional[Dict]:
         """
         调用接口一：获取公众号文章列表
+        Args:
+            use_cache: False 时跳过缓存直接请求（增量同步需要最新列表）
         """
         url = f"{self.base_url}/post_history"
         request_key = f"{biz}_{page}"
         
         # 先检查是否已有缓存
-        cached = self.db.get_raw_response("post_history", request_key)
+        started = time.perf_counter()
+        cached = self.db.get_raw_response("post_history", request_key) if use_cache else None
         if cached:
-            print(f"  📦 使用缓存数据 (biz={biz}, page={page})")
-            # 只有成功的响应才更新余额
-            if cached.get('code') == 0 and cached.get('remain_money') is not None:
-                self.current_balance = cached.get('remain_money', 0)
+            self._record_api_call("post_history", "cache", started, request_key=request_key)
+            if cached.get('code') == 0:
+                metrics.STAGE_ITEMS.inc(stage='pages')
             return cached
         
         # 请求参数
@@ -97,73 +205,95 @@ class WechatArticleCollector:
             "url": "",
             "name": "",
             "page": page,
-            "key": self.api_key,
             "verifycode": ""
         }
         
         headers = {"Content-Type": "application/json"}
         
         try:
-            print(f"  🔄 调用接口一 (biz={biz}, page={page})")
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
-            result = response.json()
+            result, key_state = self._request(
+                lambda key: self._send_json(url, dict(payload, key=key), headers))
+            if result is None:
+                return None
             
-            # 保存原始响应
-            self.db.save_raw_response("post_history", request_key, payload, result)
+            self._record_api_call("post_history", "network", started, result, request_key)
+            if result.get('code') == 0:
+                metrics.STAGE_ITEMS.inc(stage='pages')
             
-            # 更新余额
-            self.current_balance = result.get('remain_money', 0)
+            # 保存原始响应（余额不足的响应不缓存）
+            if result.get('code') != 102:
+                self.db.save_raw_response("post_history", request_key, dict(payload, key_id=key_state.key_id),
+                                          result, key_state.key_id)
             
             return result
         except Exception as e:
-            print(f"  ❌ 接口一调用失败: {e}")
+            metrics.API_ERRORS.inc(api_type="post_history", error=type(e).__name__)
+            self._queue_retry("post_history", request_key, e)
+            self.log.error(f"  ❌ 接口一调用失败: {e}", api_type="post_history",
+                           biz=biz, page=page, error=type(e).__name__)
             return None
     
-    def call_api_2_read_zan(self, article_url: str) -> Optional[Dict]:
+    @coalesced('read_zan_pro', lambda article_url, use_cache=True: (article_url, use_cache))
+    @staged('stats')
+    def call_api_2_read_zan(self, article_url: str, use_cache: bool = True) -> Optional[Dict]:
         """
         调用接口二：获取文章数据
+        Args:
+            use_cache: False 时跳过缓存直接请求（定时刷新阅读数需要最新数据）
         """
         url = f"{self.base_url}/read_zan_pro"
         request_key = article_url
         
         # 先检查是否已有缓存
-        cached = self.db.get_raw_response("read_zan_pro", request_key)
+        started = time.perf_counter()
+        cached = self.db.get_raw_response("read_zan_pro", request_key) if use_cache else None
         if cached:
-            print(f"    📦 使用缓存数据")
-            # 只有成功的响应才更新余额，错误响应（如文章已删除）不更新
-            if cached.get('code') == 0 and cached.get('remain_money') is not None:
-                self.current_balance = cached.get('remain_money', 0)
-            elif cached.get('code') == 101:
+            self._record_api_call("read_zan_pro", "cache", started, request_key=request_key)
+            if cached.get('code') == 101:
                 # 文章已删除或违规，不需要重试
-                print(f"    ⚠️ 文章不可访问: {cached.get('msg', '未知原因')}")
+                self.log.info(f"    ⚠️ 文章不可访问: {cached.get('msg', '未知原因')}",
+                              api_type="read_zan_pro", url=article_url)
             return cached
         
+        # 已确认删除的文章（code 101 死信）不再付费请求
+        deleted = self._known_deleted("read_zan_pro", request_key)
+        if deleted:
+            self._record_api_call("read_zan_pro", "cache", started, request_key=request_key)
+            return deleted
+        
         payload = {
             "url": article_url,
-            "key": self.api_key,
             "verifycode": ""
         }
         
         headers = {"Content-Type": "application/json"}
         
         try:
-            print(f"    🔄 调用接口二")
-            response = requests.post(url, json=payload, headers=headers, timeout=30)
-            response.raise_for_status()
-            result = response.json()
+            result, key_state = self._request(
+                lambda key: self._send_json(url, dict(payload, key=key), headers))
+            if result is None:
+                return None
             
-            # 保存原始响应
-            self.db.save_raw_response("read_zan_pro", request_key, payload, result)
+            self._record_api_call("read_zan_pro", "network", started, result, request_key)
             
-            # 更新余额
-            self.current_balance = result.get('remain_money', 0)
+            # 保存原始响应（余额不足的响应不缓存）
+            if result.get('code') != 102:
+                self.db.save_raw_response("read_zan_pro", request_key, dict(payload, key_id=key_state.key_id),
+                                          result, key_state.key_id)
+            if result.get('code') == 101:
+                # 文章已删除或违规，永久失败
+                self._dead_letter("read_zan_pro", request_key, result)
             
             return result
         except Exception as e:
-            print(f"    ❌ 接口二调用失败: {e}")
+            metrics.API_ERRORS.inc(api_type="read_zan_pro", error=type(e).__name__)
+            self._queue_retry("read_zan_pro", request_key, e)
+            self.log.error(f"    ❌ 接口二调用失败: {e}", api_type="read_zan_pro",
+                           url=article_url, error=type(e).__name__)
             return None
     
+    @coalesced('article_detail', lambda article_url: article_url)
+    @staged('content')
     def call_api_3_article_detail(self, article_url: str) -> Optional[Dict]:
         """
         调用接口三：获取文章全文
@@ -172,47 +302,214 @@ class WechatArticleCollector:
         request_key = article_url
         
         # 先检查是否已有缓存
+        started = time.perf_counter()
         cached = self.db.get_raw_response("article_detail", request_key)
         if cached:
-            print(f"    📦 使用缓存数据")
-            # 只有成功的响应才更新余额，错误响应（如文章已删除）不更新
-            if cached.get('code') == 0 and cached.get('remain_money') is not None:
-                self.current_balance = cached.get('remain_money', 0)
-            elif cached.get('code') == 101:
+            self._record_api_call("article_detail", "cache", started, request_key=request_key)
+            if cached.get('code') == 101:
                 # 文章已删除或违规，不需要重试
-                print(f"    ⚠️ 文章不可访问: {cached.get('msg', '未知原因')}")
+                self.log.info(f"    ⚠️ 文章不可访问: {cached.get('msg', '未知原因')}",
+                              api_type="article_detail", url=article_url)
             return cached
         
+        # 已确认删除的文章（code 101 死信）不再付费请求
+        deleted = self._known_deleted("article_detail", request_key)
+        if deleted:
+            self._record_api_call("article_detail", "cache", started, request_key=request_key)
+            return deleted
+        
         params = {
             "url": article_url,
-            "key": self.api_key,
             "mode": 2
         }
         
         try:
-            print(f"    🔄 调用接口三")
-            response = requests.get(url, params=params, timeout=30)
-            response.raise_for_status()
-            result = response.json()
+            result, key_state = self._request(
+                lambda key: self._send_query(url, dict(params, key=key)))
+            if result is None:
+                return None
             
-            # 保存原始响应
-            self.db.save_raw_response("article_detail", request_key, params, result)
+            self._record_api_call("article_detail", "network", started, result, request_key)
             
-            # 更新余额
-            self.current_balance = result.get('remain_money', 0)
+            # 保存原始响应（余额不足的响应不缓存）
+            if result.get('code') != 102:
+                self.db.save_raw_response("article_detail", request_key, dict(params, key_id=key_state.key_id),
+                                          result, key_state.key_id)
+            if result.get('code') == 101:
+                # 文章已删除或违规，永久失败
+                self._dead_letter("article_detail", request_key, result)
             
             return result
         except Exception as e:
-            print(f"    ❌ 接口三调用失败: {e}")
+            metrics.API_ERRORS.inc(api_type="article_detail", error=type(e).__name__)
+            self._queue_retry("article_detail", request_key, e)
+            self.log.error(f"    ❌ 接口三调用失败: {e}", api_type="article_detail",
+                           url=article_url, error=type(e).__name__)
             return None
     
+    def _send_json(self, url: str, payload: Dict, headers: Dict) -> Dict:
+        response = self._http().post(url, json=payload, headers=headers, timeout=30)
+        response.raise_for_status()
+        return response.json()
+    
+    def _send_query(self, url: str, params: Dict) -> Dict:
+        response = self._http().get(url, params=params, timeout=30)
+        response.raise_for_status()
+        return response.json()
+    
+    # ==================== 重试队列 ====================
+    
+    def _retry_delay(self, attempts: int) -> float:
+        """第 attempts 次失败后的退避时间：指数增长，取上限后在后一半区间随机抖动"""
+        delay = min(self.RETRY_MAX_DELAY, self.RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+    
+    def _queue_retry(self, api_type: str, request_key: str, error: Exception):
+        """把失败的请求写入重试队列"""
+        entry = self.db.get_retry_entry(api_type, request_key)
+        attempts = (entry['attempts'] if entry and entry['status'] == 'pending' else 0) + 1
+        if attempts >= self.RETRY_MAX_ATTEMPTS:
+            status, delay = 'dead', 0
+            self.log.warning(f"    ☠️ 已失败 {attempts} 次，不再重试",
+                             api_type=api_type, request_key=request_key)
+        else:
+            status, delay = 'pending', self._retry_delay(attempts)
+        self.db.save_retry_entry(api_type, request_key, type(error).__name__,
+                                 str(error), attempts, delay, status)
+    
+    def _dead_letter(self, api_type: str, request_key: str, result: Dict):
+        """记录永久失败的请求（如 code 101 文章已删除），不再重试"""
+        entry = self.db.get_retry_entry(api_type, request_key)
+        attempts = (entry['attempts'] if entry else 0) + 1
+        self.db.save_retry_entry(api_type, request_key, f"code_{result.get('code')}",
+                                 result.get('msg'), attempts, 0, 'dead')
+    
+    def _known_deleted(self, api_type: str, request_key: str) -> Optional[Dict]:
+        """重试队列中已记录为 code 101 的请求，返回对应的结果；否则返回 None"""
+        entry = self.db.get_retry_entry(api_type, request_key)
+        if entry and entry['status'] == 'dead' and entry['error_class'] == 'code_101':
+            return {'code': 101, 'msg': entry['last_error']}
+        return None
+    
+    def _retry_resolved(self, api_type: str, request_key: str) -> bool:
+        """重试后请求对应的数据是否已入库"""
+        if api_type == 'post_history':
+            cached = self.db.get_raw_response(api_type, request_key)
+            return bool(cached) and cached.get('code') == 0
+        exists, status = self.db.check_article_exists(request_key)
+        if api_type == 'read_zan_pro':
+            return exists and status != 'list_only'
+        return status == 'content_fetched'
+    
+    def _retry_entry(self, entry: Dict) -> bool:
+        """
+        重试一条请求
+        Returns:
+            False 表示余额不足需要停止
+        """
+        api_type, request_key = entry['api_type'], entry['request_key']
+        self.log.info(f"  🔁 重试 {api_type} (第{entry['attempts'] + 1}次): {request_key[:60]}",
+                      api_type=api_type, request_key=request_key, attempts=entry['attempts'] + 1)
+        
+        if api_type == 'post_history':
+            biz, page = parsers.biz_from_request_key(request_key)
+            # 从中断的页继续采集该公众号（列表和详情）
+            if not self.collect_account_articles(biz):
+                return False
+        else:
+            exists, status = self.db.check_article_exists(request_key)
+            if not exists:
+                self.db.update_retry_status(api_type, request_key, 'dead',
+                                            'missing_article', '文章不在数据库中')
+                return True
+            if not self.fetch_article_detail({'url': request_key, 'fetch_status': status}):
+                return False
+        
+        if self._retry_resolved(api_type, request_key):
+            self.db.update_retry_status(api_type, request_key, 'done')
+            self.log.info("    ✅ 重试成功", api_type=api_type, request_key=request_key)
+            return True
+        
+        latest = self.db.get_retry_entry(api_type, request_key)
+        if latest and latest['status'] == 'pending' and latest['attempts'] == entry['attempts']:
+            # 没有抛出异常但仍未成功（接口返回了错误码），重试无意义
+            self.db.update_retry_status(api_type, request_key, 'dead', 'api_error')
+            self.log.warning("    ☠️ 接口返回错误，不再重试",
+                             api_type=api_type, request_key=request_key)
+        return True
+    
+    @tracked
+    def drain_retry_queue(self, max_wait: float = None) -> bool:
+        """
+        处理重试队列：依次重试到期的请求，等待下一个到期时间，
+        直到队列清空或超过最长等待时间
+        Returns:
+            False 表示余额不足中断
+        """
+        summary = self.db.get_retry_summary()
+        if not summary.get('pending'):
+            return True
+        
+        print(f"\n🔁 处理重试队列: {summary.get('pending')} 个待重试请求")
+        deadline = time.monotonic() + (self.RETRY_DRAIN_TIMEOUT if max_wait is None else max_wait)
+        
+        while True:
+            due = self.db.get_due_retries()
+            if not due:
+                delay = self.db.get_next_retry_delay()
+                if delay is None:
+                    break
+                if time.monotonic() + delay > deadline:
+                    print("  ⏳ 剩余请求未到重试时间，下次运行时继续")
+                    break
+                self._sleep(delay)
+                continue
+            
+            for entry in due:
+                if not self.check_balance():
+                    return False
+                if not self._retry_entry(entry):
+                    return False
+        
+        summary = self.db.get_retry_summary()
+        print(f"  📊 重试队列: 待重试 {summary.get('pending', 0)}，"
+              f"已成功 {summary.get('done', 0)}，永久失败 {summary.get('dead', 0)}")
+        return True
+    
+    def _record_api_call(self, api_type: str, source: str, started: float,
+                         result: Dict = None, request_key: str = None):
+        """记录接口耗时、缓存命中和费用"""
+        self._local.last_source = source
+        latency = time.perf_counter() - started
+        metrics.API_LATENCY.observe(latency, api_type=api_type, source=source)
+        self.log.info(f"    {'📦 使用缓存数据' if source == 'cache' else '🔄 调用接口'} {api_type}",
+                      api_type=api_type, source=source, request_key=request_key,
+                      latency_ms=round(latency * 1000, 1),
+                      cost=result.get('cost_money') if result else None)
+        metrics.API_CACHE.inc(api_type=api_type,
+                              result="hit" if source == "cache" else "miss")
+        if result:
+            metrics.API_COST.inc(result.get('cost_money') or 0, api_type=api_type)
+    
+    def _sleep(self, seconds: float):
+        """请求间隔休眠（计入指标）"""
+        if seconds > 0:
+            time.sleep(seconds)
+            metrics.SLEEP_SECONDS.inc(seconds)
+    
+    def export_metrics(self, path: str):
+        """导出本次运行的指标（.prom为Prometheus文本格式，其余为JSON）"""
+        self.metrics.export(path)
+        print(f"📈 运行指标已导出: {path}")
+    
     # ==================== 余额检查 ====================
     
     def check_balance(self) -> bool:
-        """检查余额是否充足"""
-        if self.current_balance < self.min_balance:
-            print(f"\n⚠️ 余额不足！当前余额: {self.current_balance}元")
-            print("请充值后继续...")
+        """检查是否还有余额充足的密钥"""
+        balance = self.current_balance
+        if not self.key_pool.has_available():
+            self.log.warning(f"\n⚠️ 余额不足！当前余额: {balance}元\n请充值后继续...",
+                             balance=balance)
             # 保存进度
             self.db.save_progress(
                 self.task_id, 
@@ -221,6 +518,16 @@ class WechatArticleCollector:
             return False
         return True
     
+    # ==================== 停止请求 ====================
+    
+    def request_stop(self):
+        """请求停止：正在进行的采集处理完当前文章（或当前页）后返回"""
+        self._stop_requested.set()
+    
+    @property
+    def stop_requested(self) -> bool:
+        return self._stop_requested.is_set()
+    
     # ==================== 核心采集流程 ====================
     
     def collect_account_articles(self, biz: str, nick_name: str = None) -> bool:
@@ -251,7 +558,7 @@ class WechatArticleCollector:
         current_page = last_page + 1 if last_page > 0 else 1
         
         while True:
-            print(f"\n📄 获取第 {current_page} 页文章列表...")
+            self.log.info(f"\n📄 获取第 {current_page} 页文章列表...", biz=biz, page=current_page)
             
             # 保存进度
             self.db.save_progress(self.task_id, biz, current_page, None, "list")
@@ -260,7 +567,8 @@ class WechatArticleCollector:
             result = self.call_api_1_post_history(biz, current_page)
             
             if not result or result.get('code') != 0:
-                print(f"  ❌ 获取文章列表失败")
+                self.log.error("  ❌ 获取文章列表失败", biz=biz, page=current_page,
+                               code=result.get('code') if result else None)
                 break
             
             # 检查余额
@@ -273,25 +581,21 @@ class WechatArticleCollector:
                 self.db.update_account_progress(biz, current_page, True)
                 break
             
-            print(f"  📊 本页获取 {len(articles)} 篇文章")
+            self.log.info(f"  📊 本页获取 {len(articles)} 篇文章", biz=biz, page=current_page,
+                          articles=len(articles))
             
             # 检查是否有2025年之前的文章
-            has_old_article = False
-            articles_2025 = []
-            
-            for article in articles:
-                post_time_str = article.get('post_time_str', '')
-                if post_time_str and post_time_str < '2025-01-01':
-                    has_old_article = True
-                    print(f"  ⏹️ 发现2025年前文章({post_time_str})，停止获取")
-                    break
-                articles_2025.append(article)
+            articles_2025, has_old_article = parsers.split_list_page(articles)
+            if has_old_article:
+                post_time_str = articles[len(articles_2025)].get('post_time_str')
+                print(f"  ⏹️ 发现2025年前文章({post_time_str})，停止获取")
             
             # 保存2025年的文章
             for article in articles_2025:
                 article_id = self.db.save_article_from_list(account_id, article)
                 if article_id > 0:
-                    print(f"  ✅ 保存文章: {article.get('title')[:30]}...")
+                    self.log.info(f"  ✅ 保存文章: {article.get('title')[:30]}...",
+                                  biz=biz, url=article.get('url'))
             
             # 更新公众号进度
             self.db.update_account_progress(biz, current_page, has_old_article)
@@ -300,9 +604,13 @@ class WechatArticleCollector:
                 print(f"  ✅ 已到达2025年前，停止获取列表")
                 break
             
+            # 进度已按页保存，收到停止请求时下次从下一页继续
+            if self.stop_requested:
+                return False
+            
             # 继续下一页
             current_page += 1
-            time.sleep(0.5)  # 避免请求过快
+            self._sleep(self.PAGE_INTERVAL)  # 避免请求过快
         
         # 获取该公众号所有未完成的文章
         print(f"\n📊 开始获取文章详细数据...")
@@ -310,70 +618,279 @@ class WechatArticleCollector:
         
         return True
     
+    def collect_list_page(self, biz: str, page: int, nick_name: str = None) -> Optional[Dict]:
+        """
+        采集一页文章列表（工作队列按页分配时使用）
+        Returns:
+            {'reached_end': 是否已到达最后一页或2025年前, 'urls': 本页保存的文章URL}；
+            请求失败返回 None
+        """
+        account_info = self.db.get_account_info(biz)
+        if account_info:
+            account_id = account_info['id']
+        else:
+            account_id = self.db.save_account(biz, nick_name or "未知", None)
+        
+        result = self.call_api_1_post_history(biz, page)
+        if not result or result.get('code') != 0:
+            return None
+        
+        articles = result.get('data', [])
+        articles_2025, has_old_article = parsers.split_list_page(articles)
+        urls = []
+        for article in articles_2025:
+            if self.db.save_article_from_list(account_id, article) > 0:
+                urls.append(article.get('url'))
+        
+        reached_end = has_old_article or not articles
+        # 进度只向前推进（过期租约被重新领取时可能重复处理旧页）
+        last_page = max(page, account_info['last_page'] if account_info else 0)
+        self.db.update_account_progress(biz, last_page, reached_end)
+        self.log.info(f"  📄 {nick_name or biz} 第 {page} 页: {len(urls)} 篇文章"
+                      f"{'（已到达末页）' if reached_end else ''}",
+                      biz=biz, page=page, articles=len(urls), reached_end=reached_end)
+        return {'reached_end': reached_end, 'urls': urls}
+    
+    def collect_list_only(self, biz: str, nick_name: str = None) -> bool:
+        """
+        只获取公众号的文章列表，不获取详情（两阶段模式第一阶段）
+        Returns:
+            列表已获取完返回 True；请求失败或余额不足返回 False（进度已保存，可继续）
+        """
+        account_info = self.db.get_account_info(biz)
+        if account_info and account_info['stop_flag']:
+            return True
+        page = account_info['last_page'] + 1 if account_info else 1
+        
+        while True:
+            result = self.collect_list_page(biz, page, nick_name)
+            if result is None:
+                self.log.error(f"  ❌ {nick_name or biz} 第 {page} 页获取失败", biz=biz, page=page)
+                return False
+            if result['reached_end']:
+                return True
+            if not self.check_balance():
+                return False
+            page += 1
+            self._sleep(self.PAGE_INTERVAL)
+    
     def fetch_articles_details(self, account_id: int):
         """
         获取文章的统计数据和全文内容
         """
-        # 获取所有未完成的文章
-        unfetched_articles = self.db.get_unfetched_articles(account_id)
+        # 未完成的文章逐页读取，不一次性加载
+        total = self.db.count_unfetched_articles(account_id)
         
-        if not unfetched_articles:
+        if not total:
             print(f"  ✅ 所有文章已完成采集")
             return
         
-        print(f"  📊 需要获取详情的文章数: {len(unfetched_articles)}")
+        print(f"  📊 需要获取详情的文章数: {total}")
         
-        for idx, article in enumerate(unfetched_articles, 1):
-            article_url = article['url']
-            title = article['title']
-            status = article['fetch_status']
+        for idx, article in enumerate(self.db.iter_unfetched_articles(account_id), 1):
+            if self.stop_requested:
+                print(f"  ⏸️ 收到停止请求，已完成 {idx - 1}/{total} 篇")
+                return
+            self.log.info(f"\n  [{idx}/{total}] {article.title[:30]}...", url=article.url)
             
-            print(f"\n  [{idx}/{len(unfetched_articles)}] {title[:30]}...")
+            if not self.fetch_article_detail(article):
+                return
+    
+    def fetch_article_detail(self, article: Dict) -> bool:
+        """
+        获取单篇文章尚缺的统计数据和全文内容
+        Args:
+            article: 至少包含 url 和 fetch_status
+        Returns:
+            False 表示余额不足需要停止，其余情况（包括单篇失败）返回 True
+        """
+        article_url = article['url']
+        status = article['fetch_status']
+        
+        # 保存进度
+        self.db.save_progress(
+            self.task_id, 
+            current_article_url=article_url,
+            current_step="stats" if status == "list_only" else "content"
+        )
+        
+        # 1. 获取统计数据（如果还没获取）
+        if status == 'list_only':
+            result = self.call_api_2_read_zan(article_url)
+            if result and result.get('code') == 0:
+                data = result.get('data', {})
+                self.db.save_article_stats(article_url, data)
+                self.log.info(f"    ✅ 统计数据: 阅读{data.get('read',0)} 点赞{data.get('zan',0)}",
+                              url=article_url, read=data.get('read', 0), zan=data.get('zan', 0))
+                
+                if not self.check_balance():
+                    return False
+                
+                status = 'stats_fetched'
+                self._sleep(self.ARTICLE_INTERVAL)
+            elif result and result.get('code') == 101:
+                # 文章已删除或违规，标记为特殊状态，不再重试
+                self.log.info("    ⏭️ 跳过不可访问的文章", url=article_url)
+                # 可以考虑更新文章状态为'unavailable'或直接跳过
+                return True
+            else:
+                self.log.error("    ❌ 获取统计数据失败", api_type='read_zan_pro', url=article_url,
+                               code=result.get('code') if result else None)
+                return True
+        
+        # 2. 获取文章全文（如果还没获取）
+        if status == 'stats_fetched':
+            result = self.call_api_3_article_detail(article_url)
+            if result and result.get('code') == 0:
+                self.db.save_article_content(article_url, result)
+                content = result.get('content', '')
+                self.log.info(f"    ✅ 文章内容: {len(content)}字符", url=article_url,
+                              chars=len(content))
+                
+                if not self.check_balance():
+                    return False
+                
+                self._sleep(self.ARTICLE_INTERVAL)
+            else:
+                self.log.error("    ❌ 获取文章内容失败", api_type='article_detail', url=article_url,
+                               code=result.get('code') if result else None)
+        
+        return True
+    
+    def sync_account_incremental(self, biz: str, nick_name: str = None,
+                                 fetch_details: bool = True) -> Optional[int]:
+        """
+        增量同步已完成列表采集的公众号：从第1页开始请求最新列表，
+        遇到上次同步完成前已入库的文章即停止，只保存新文章
+        每页的文章立即入库；只有整轮同步到达已知文章或列表末尾后才推进同步边界，
+        中途失败的一轮保存的文章不会被下一轮当作已知文章而提前停止
+        Returns:
+            新增文章数；余额不足中断时返回 None
+        """
+        print(f"\n🔄 增量同步: {nick_name or biz}")
+        
+        account_info = self.db.get_account_info(biz)
+        if not account_info or not account_info['stop_flag']:
+            # 尚未完整采集过列表，增量同步无从比较，走完整采集
+            print("  ℹ️ 列表尚未完整采集，改为完整采集")
+            return 0 if self.collect_account_articles(biz, nick_name) else None
+        
+        account_id = account_info['id']
+        synced_at = account_info.get('list_synced_at')
+        new_count = 0
+        page = 1
+        completed = False
+        
+        while True:
+            result = self.call_api_1_post_history(biz, page, use_cache=False)
+            if not result or result.get('code') != 0:
+                self.log.error("  ❌ 获取文章列表失败，本轮不推进同步边界", biz=biz, page=page,
+                               code=result.get('code') if result else None)
+                break
             
-            # 保存进度
-            self.db.save_progress(
-                self.task_id, 
-                current_article_url=article_url,
-                current_step="stats" if status == "list_only" else "content"
-            )
+            articles = result.get('data', [])
+            if not articles:
+                completed = True
+                break
+            
+            articles_2025, has_old_article = parsers.split_list_page(articles)
+            urls = [a.get('url') for a in articles_2025]
+            known_urls = self.db.get_existing_urls(urls, saved_before=synced_at)
+            saved_urls = self.db.get_existing_urls(urls)
+            
+            reached_known = False
+            for article in articles_2025:
+                if article.get('url') in known_urls:
+                    reached_known = True
+                    break
+                if self.db.save_article_from_list(account_id, article) > 0 \
+                        and article.get('url') not in saved_urls:
+                    new_count += 1
+                    self.log.info(f"  🆕 新文章: {article.get('title')[:30]}...",
+                                  biz=biz, url=article.get('url'))
+            
+            # 本页文章已入库后再检查余额，已付费的列表不会丢失
+            if not self.check_balance():
+                return None
+            
+            if reached_known or has_old_article:
+                completed = True
+                break
             
-            # 1. 获取统计数据（如果还没获取）
-            if status == 'list_only':
-                result = self.call_api_2_read_zan(article_url)
-                if result and result.get('code') == 0:
-                    data = result.get('data', {})
-                    self.db.save_article_stats(article_url, data)
-                    print(f"    ✅ 统计数据: 阅读{data.get('read',0)} 点赞{data.get('zan',0)}")
-                    
-                    if not self.check_balance():
-                        return
-                    
-                    status = 'stats_fetched'
-                    time.sleep(0.3)
-                elif result and result.get('code') == 101:
-                    # 文章已删除或违规，标记为特殊状态，不再重试
-                    print(f"    ⏭️ 跳过不可访问的文章")
-                    # 可以考虑更新文章状态为'unavailable'或直接跳过
-                    continue
-                else:
-                    print(f"    ❌ 获取统计数据失败")
-                    continue
-            
-            # 2. 获取文章全文（如果还没获取）
-            if status == 'stats_fetched':
-                result = self.call_api_3_article_detail(article_url)
-                if result and result.get('code') == 0:
-                    self.db.save_article_content(article_url, result)
-                    content = result.get('content', '')
-                    print(f"    ✅ 文章内容: {len(content)}字符")
-                    
-                    if not self.check_balance():
-                        return
-                    
-                    time.sleep(0.3)
-                else:
-                    print(f"    ❌ 获取文章内容失败")
+            page += 1
+            self._sleep(self.PAGE_INTERVAL)
+        
+        if completed:
+            # 只推进同步边界，保留原有的列表进度
+            self.db.update_account_progress(biz, account_info['last_page'], True)
+            print(f"  ✅ 新增 {new_count} 篇文章（请求 {page} 页）")
+        else:
+            print(f"  ⚠️ 同步未完成，新增 {new_count} 篇文章（请求 {page} 页），下次从第1页重新同步")
+        
+        if fetch_details and new_count:
+            self.fetch_articles_details(account_id)
+        
+        return new_count
     
+    def refresh_recent_stats(self, account_id: int, window_days: int,
+                             max_age: float) -> Optional[int]:
+        """
+        重新获取近期文章的统计数据（阅读数在发布后几天内仍在增长）
+        Args:
+            window_days: 只刷新最近多少天内发布的文章
+            max_age: 统计数据获取时间超过多少秒才刷新
+        Returns:
+            刷新的文章数；余额不足或收到停止请求时返回 None
+        """
+        since = (datetime.now() - timedelta(days=window_days)).strftime('%Y-%m-%d')
+        refreshed = 0
+        for article in self.db.iter_stale_stats_articles(account_id, since, max_age):
+            if self.stop_requested:
+                return None
+            result = self.call_api_2_read_zan(article.url, use_cache=False)
+            if result and result.get('code') == 0:
+                data = result.get('data', {})
+                self.db.save_article_stats(article.url, data)
+                refreshed += 1
+                self.log.info(f"    🔁 刷新统计: 阅读{data.get('read', 0)}", url=article.url,
+                              read=data.get('read', 0), zan=data.get('zan', 0))
+            elif not result or result.get('code') != 101:
+                self.log.error("    ❌ 刷新统计数据失败", api_type='read_zan_pro',
+                               url=article.url, code=result.get('code') if result else None)
+            if not self.check_balance():
+                return None
+            self._sleep(self.ARTICLE_INTERVAL)
+        return refreshed
+
+    @tracked
+    def sync_multiple_accounts(self, accounts: List[Tuple[str, str]]):
+        """
+        批量增量同步多个公众号
+        Args:
+            accounts: [(biz, nick_name), ...]
+        """
+        print(f"\n{'='*60}")
+        print("增量同步任务")
+        print(f"公众号数量: {len(accounts)}")
+        print(f"{'='*60}")
+        
+        total_new = 0
+        for idx, (biz, nick_name) in enumerate(accounts, 1):
+            new_count = self.sync_account_incremental(biz, nick_name)
+            if new_count is None:
+                print("\n⚠️ 同步中断，请充值后继续")
+                break
+            total_new += new_count
+            
+            if idx < len(accounts):
+                self._sleep(self.ACCOUNT_INTERVAL)
+        else:
+            self.drain_retry_queue()
+        
+        print(f"\n✅ 增量同步完成，共新增 {total_new} 篇文章")
+        self.print_statistics()
+    
+    @tracked
     def collect_multiple_accounts(self, accounts: List[Tuple[str, str]]):
         """
         批量采集多个公众号
@@ -396,11 +913,15 @@ class WechatArticleCollector:
                 break
             
             if idx < len(accounts):
-                time.sleep(1)  # 公众号之间的延迟
+                self._sleep(self.ACCOUNT_INTERVAL)  # 公众号之间的延迟
+        else:
+            # 本次运行中失败的请求按退避时间重试
+            self.drain_retry_queue()
         
         # 输出统计信息
         self.print_statistics()
     
+    @tracked
     def resume_collection(self):
         """
         从断点恢复采集
@@ -409,13 +930,16 @@ class WechatArticleCollector:
         print(f"恢复采集任务")
         print(f"{'='*60}")
         
-        # 1. 获取所有公众号的状态
+        # 1. 获取登记表中启用的公众号（按 config.ACCOUNT_TAG 筛选）的状态
+        registry.ensure_seeded(self.db)
+        tag = config.ACCOUNT_TAG
+        tag_join = "JOIN account_tags tg ON tg.biz = r.biz AND tg.tag = ?" if tag else ""
         from database import get_connection
         conn = get_connection()
         cursor = conn.cursor()
         
-        # 获取所有公众号及其文章状态统计
-        cursor.execute("""
+        # 获取公众号及其文章状态统计
+        cursor.execute(f"""
             SELECT 
                 a.id, 
                 a.biz, 
@@ -427,14 +951,19 @@ class WechatArticleCollector:
                 COUNT(CASE WHEN art.fetch_status = 'stats_fetched' THEN 1 END) as stats_fetched_count,
                 COUNT(CASE WHEN art.fetch_status = 'content_fetched' THEN 1 END) as content_fetched_count
             FROM accounts a
+            JOIN account_registry r ON r.biz = a.biz AND r.enabled = 1
+            {tag_join}
             LEFT JOIN articles art ON art.account_id = a.id
             GROUP BY a.id, a.biz, a.nick_name, a.stop_flag, a.last_page
             ORDER BY a.stop_flag, a.updated_at
-        """)
+        """, (tag,) if tag else ())
         all_accounts = cursor.fetchall()
         conn.close()
         
-        if not all_accounts:
+        # 登记表中还没有采集记录的公众号（数据库中反连接，不在内存中逐个比对）
+        not_started = self.db.get_unstarted_accounts(tag)
+        
+        if not all_accounts and not not_started:
             print("没有公众号数据")
             return
         
@@ -470,17 +999,11 @@ class WechatArticleCollector:
                 # 完全完成
                 completed.append(acc['nick_name'])
         
-        # 3. 检查是否有未开始的公众号
-        from config import TARGET_ACCOUNTS
-        collected_biz = [acc['biz'] for acc in all_accounts]
-        not_started = []
-        for biz, nick_name in TARGET_ACCOUNTS:
-            if biz not in collected_biz:
-                not_started.append((biz, nick_name))
+        # 3. 显示采集状态
+        registered = len(registry.load_entries(self.db))
         
-        # 4. 显示采集状态
         print(f"\n📊 采集状态统计:")
-        print(f"  配置的公众号总数: {len(TARGET_ACCOUNTS)}")
+        print(f"  登记的公众号总数: {registered}")
         print(f"  数据库中的公众号: {len(all_accounts)}")
         print(f"  未开始采集: {len(not_started)} 个")
         print(f"  需继续获取列表: {len(need_list)} 个")
@@ -546,7 +1069,7 @@ class WechatArticleCollector:
                     return
                 
                 if idx < len(not_started):
-                    time.sleep(1)  # 公众号之间的延迟
+                    self._sleep(self.ACCOUNT_INTERVAL)  # 公众号之间的延迟
         
         # 7. 显示最终统计
         print("\n" + "="*60)
@@ -554,6 +1077,8 @@ class WechatArticleCollector:
     
     def print_statistics(self):
         """打印统计信息"""
+        # 运行结束时把节流期间积累的待刷新公众号算完
+        self.db.refresh_article_metrics()
         stats = self.db.get_statistics()
         
         print(f"\n{'='*60}")
@@ -564,7 +1089,19 @@ class WechatArticleCollector:
         print(f"文章总数: {stats['total_articles']}")
         print(f"已完成文章: {stats['fetched_articles']}")
         print(f"总消耗金额: {stats['total_cost']:.2f}元")
-        print(f"当前余额: {stats['current_balance']:.2f}元")
+        if len(self.key_pool) > 1:
+            balance = self.current_balance
+            balance_text = f"{balance:.2f}元" if self.balance_known else "未知（余额查询未完成）"
+            print(f"当前余额: {balance_text}（{len(self.key_pool)} 个密钥）")
+            costs = self.db.get_cost_by_key()
+            for state in self.key_pool.summary():
+                status = "已耗尽" if state['exhausted'] else "可用"
+                key_balance = "未知" if state['balance'] is None else f"{state['balance']:.2f}元"
+                print(f"  🔑 {state['key_id']}: 余额 {key_balance}，"
+                      f"本次调用 {state['calls']} 次，累计花费 "
+                      f"{costs.get(state['key_id'], 0):.2f}元（{status}）")
+        else:
+            print(f"当前余额: {stats['current_balance']:.2f}元")
 
 
 if __name__ == "__main__":
@@ -13,13 +13,108 @@ load_dotenv()
 API_KEY = os.getenv('API_KEY', '')
 MIN_BALANCE = float(os.getenv('MIN_BALANCE', '0.2'))
 
+# 多个API密钥（逗号分隔），未配置时只使用 API_KEY
+API_KEYS = [k.strip() for k in os.getenv('API_KEYS', '').split(',') if k.strip()] or [API_KEY]
+# 每个密钥的限速：每秒请求数（0表示不限速）与突发请求数
+API_KEY_RATE = float(os.getenv('API_KEY_RATE', '0'))
+API_KEY_BURST = int(os.getenv('API_KEY_BURST', '1'))
+
 # 数据库配置
 DATABASE_PATH = "wechat_articles.db"
 
 # API基础URL
 BASE_URL = "https://www.dajiala.com/fbmain/monitor/v3"
 
-# 目标公众号列表
+# 各接口单次费用（元），没有历史调用记录时用于费用预估（见 api.md 返回示例）
+DEFAULT_API_COSTS = {
+    'post_history': 0.08,
+    'read_zan_pro': 0.06,
+    'article_detail': 0.03,
+}
+
+# 原始响应缓存有效期（秒），按接口区分；None 表示永不过期
+# 文章列表和阅读数会变化需要过期，文章正文发布后不变可以永久缓存
+RAW_CACHE_TTL = {
+    'post_history': float(os.getenv('RAW_CACHE_TTL_POST_HISTORY', '21600')),
+    'read_zan_pro': float(os.getenv('RAW_CACHE_TTL_READ_ZAN', '86400')),
+    'article_detail': None,
+}
+
+# 热库中原始响应的行数上限，超出后按时间从旧到新归档到冷库（0表示不限制）
+RAW_CACHE_MAX_ROWS = int(os.getenv('RAW_CACHE_MAX_ROWS', '50000'))
+# 归档冷库文件
+RAW_ARCHIVE_PATH = os.getenv('RAW_ARCHIVE_PATH', 'wechat_articles_archive.db')
+# 后台归档每批行数与批次间隔（秒）
+RAW_EVICT_BATCH = int(os.getenv('RAW_EVICT_BATCH', '500'))
+RAW_EVICT_INTERVAL = float(os.getenv('RAW_EVICT_INTERVAL', '30'))
+
+# 分片存储：none 不分片 / account 按公众号哈希分片 / month 按文章发布月份分片
+# 原始响应和文章内容写入分片文件，主库只保存元数据（见 sharding.py）
+SHARD_MODE = os.getenv('SHARD_MODE', 'none')
+# 分片目录（留空则为数据库文件旁的 <数据库名>_shards/）
+SHARD_DIR = os.getenv('SHARD_DIR', '')
+# account 模式的分片数
+SHARD_BUCKETS = int(os.getenv('SHARD_BUCKETS', '8'))
+
+# 两阶段批次采集：第一阶段并行获取列表的公众号数，第二阶段并发获取详情的文章数
+BATCH_LIST_WORKERS = int(os.getenv('BATCH_LIST_WORKERS', '4'))
+BATCH_DETAIL_WORKERS = int(os.getenv('BATCH_DETAIL_WORKERS', '8'))
+
+# 数据库备份与清空归档目录（见 data_lifecycle.py）
+BACKUP_DIR = os.getenv('BACKUP_DIR', 'backups')
+
+# 图片资源缓存目录（按内容SHA-256存放，见 assets.py）与并发下载数
+ASSET_DIR = os.getenv('ASSET_DIR', 'assets')
+ASSET_WORKERS = int(os.getenv('ASSET_WORKERS', '8'))
+
+# 文章派生指标（排名、z分数、互动率）最短重算间隔（秒，0表示每次写入统计数据后都重算）
+METRICS_REFRESH_INTERVAL = float(os.getenv('METRICS_REFRESH_INTERVAL', '30'))
+
+# 采集进度刷新间隔（秒，0表示不显示）；VERBOSE=1 时逐篇输出采集日志
+PROGRESS_INTERVAL = float(os.getenv('PROGRESS_INTERVAL', '2'))
+VERBOSE = os.getenv('VERBOSE', '0') == '1'
+
+# 结构化日志（JSON Lines，留空只输出到控制台）、记录级别，
+# 文件按大小轮转；INFO 及以下每个调用位置每秒最多记录 LOG_SAMPLE_RATE 条（0表示不限速）
+LOG_PATH = os.getenv('LOG_PATH', 'logs/collector.jsonl')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', '5'))
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', '10'))
+
+# 守护进程（python daemon.py）：各任务的默认间隔（秒），可按公众号在 DAEMON_SCHEDULE_FILE 中覆盖
+# sync 增量获取新文章 / stats 刷新近期文章阅读数 / details 获取未完成文章的统计和正文
+DAEMON_SYNC_INTERVAL = float(os.getenv('DAEMON_SYNC_INTERVAL', '21600'))
+DAEMON_STATS_INTERVAL = float(os.getenv('DAEMON_STATS_INTERVAL', '86400'))
+DAEMON_DETAIL_INTERVAL = float(os.getenv('DAEMON_DETAIL_INTERVAL', '3600'))
+# 只刷新最近多少天内发布的文章的阅读数
+DAEMON_STATS_WINDOW_DAYS = int(os.getenv('DAEMON_STATS_WINDOW_DAYS', '7'))
+# 间隔随机浮动比例（0.2 表示 ±20%），避免所有公众号同时请求
+DAEMON_JITTER = float(os.getenv('DAEMON_JITTER', '0.2'))
+# 同时执行的任务数（同一公众号的任务不会并行）
+DAEMON_WORKERS = int(os.getenv('DAEMON_WORKERS', '2'))
+# 余额不足暂停后重新查询余额的间隔（秒）
+DAEMON_BALANCE_INTERVAL = float(os.getenv('DAEMON_BALANCE_INTERVAL', '600'))
+# 状态文件（运行状态、心跳、各任务下次执行时间；重启后据此续排）与按公众号的调度文件（JSON，可选）
+DAEMON_STATUS_FILE = os.getenv('DAEMON_STATUS_FILE', 'daemon_status.json')
+DAEMON_SCHEDULE_FILE = os.getenv('DAEMON_SCHEDULE_FILE', '')
+
+# 运行指标导出路径（.prom为Prometheus文本格式，其余为JSON；留空不导出）
+METRICS_EXPORT_PATH = os.getenv('METRICS_EXPORT_PATH', '')
+
+# 性能剖析输出目录（python main.py --profile）
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+
+# 本地查询服务配置
+QUERY_SERVICE_HOST = os.getenv('QUERY_SERVICE_HOST', '127.0.0.1')
+QUERY_SERVICE_PORT = int(os.getenv('QUERY_SERVICE_PORT', '8765'))
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '512'))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '30'))
+
+# 只采集带该标签的登记公众号（留空为全部，见 registry.py；main.py --tag 可临时指定）
+ACCOUNT_TAG = os.getenv('ACCOUNT_TAG', '')
+
+# 公众号登记表为空时的初始列表（之后在登记表中维护：python registry.py --import accounts.csv）
 TARGET_ACCOUNTS = [
     ("MzIxOTAzOTE4NQ==", "江涌的心理研习堂"),
     ("MzkyNjc0Mjg0NA==", "里小克的心理拓荒笔记"),
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+正文HTML结构化解析
+把 article_contents.content_html（接口三的 content_multi_text）流式解析为有序的块：
+- paragraph: 段落文本（<br> 保留为换行）
+- heading: 标题（h1-h6，或公众号常见的整段加粗/大字号短句）
+- image: 图片（data-src、宽度、宽高比，position 为正文中的顺序）
+结果按HTML内容的 SHA-256 缓存到 parsed_contents，相同正文（转载、重新采集）只解析一次；
+解析逻辑变化时提高 PARSER_VERSION 即可让旧缓存失效
+"""
+
+import argparse
+import hashlib
+import json
+import re
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+
+import database
+from db_manager import DatabaseManager
+
+PARSER_VERSION = 2
+
+BLOCK_TAGS = {'p', 'section', 'div', 'blockquote', 'li', 'ul', 'ol', 'table', 'tr',
+              'figure', 'figcaption', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'}
+BOLD_TAGS = {'strong', 'b'}
+VOID_TAGS = {'br', 'img', 'hr', 'input', 'meta', 'link', 'source', 'wbr'}
+SKIP_TAGS = {'script', 'style', 'mp-common-profile', 'mp-style-type', 'iframe'}
+
+# 整段文字的字号不小于该值（px）且不超过 HEADING_MAX_CHARS 字时视为标题
+HEADING_FONT_SIZE = 18
+HEADING_MAX_CHARS = 40
+
+_FONT_SIZE_RE = re.compile(r'font-size:\s*(\d+(?:\.\d+)?)px')
+_HIDDEN_RE = re.compile(r'display:\s*none')
+_SPACE_RE = re.compile(r'[ \t\r\f\v 　]+')
+
+
+class ArticleHTMLParser(HTMLParser):
+    """增量解析：可多次 feed()，close() 后从 blocks 读取结果"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Dict] = []
+        self._stack: List[Tuple[str, Optional[float]]] = []  # (标签, 该层字号)
+        self._skip_stack: List[str] = []  # 跳过区域内打开的标签，第一个是开始跳过的元素
+        self._bold_depth = 0
+        self._heading_level = 0
+        self._parts: List[str] = []
+        self._chars = 0
+        self._bold_chars = 0
+        self._max_font = 0.0
+        self._images = 0
+
+    # ==================== 文本缓冲 ====================
+
+    def _font_size(self) -> Optional[float]:
+        for _, size in reversed(self._stack):
+            if size is not None:
+                return size
+        return None
+
+    def _flush(self):
+        text = '\n'.join(line.strip() for line in ''.join(self._parts).split('\n'))
+        text = text.strip()
+        if text:
+            if self._heading_level:
+                self.blocks.append({'type': 'heading', 'level': self._heading_level,
+                                    'text': text})
+            elif self._looks_like_heading(text):
+                level = 2 if self._max_font >= HEADING_FONT_SIZE else 3
+                self.blocks.append({'type': 'heading', 'level': level, 'text': text})
+            else:
+                self.blocks.append({'type': 'paragraph', 'text': text})
+        self._parts = []
+        self._chars = 0
+        self._bold_chars = 0
+        self._max_font = 0.0
+
+    def _looks_like_heading(self, text: str) -> bool:
+        if len(text) > HEADING_MAX_CHARS or text[-1] in '。；;，,：:…':
+            return False
+        # 大字号，或整段加粗的短句
+        return self._max_font >= HEADING_FONT_SIZE or (
+            self._chars and self._bold_chars == self._chars and len(text) <= 30)
+
+    # ==================== HTMLParser 回调 ====================
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        style = attrs.get('style') or ''
+        if self._skip_stack or tag in SKIP_TAGS or _HIDDEN_RE.search(style):
+            if tag not in VOID_TAGS:
+                self._skip_stack.append(tag)
+            return
+
+        if tag == 'br':
+            self._parts.append('\n')
+            return
+        if tag == 'img':
+            self._image(attrs)
+            return
+        if tag in VOID_TAGS:
+            return
+
+        if tag in BLOCK_TAGS:
+            self._flush()
+            if tag[0] == 'h' and tag[1:].isdigit():
+                self._heading_level = int(tag[1])
+        if tag in BOLD_TAGS:
+            self._bold_depth += 1
+        match = _FONT_SIZE_RE.search(style)
+        self._stack.append((tag, float(match.group(1)) if match else None))
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS:
+            return
+        if self._skip_stack:
+            # 跳过区域内同样容忍未闭合的标签，开始跳过的元素闭合时结束跳过
+            if tag in self._skip_stack:
+                while self._skip_stack.pop() != tag:
+                    pass
+            return
+        # 容忍未闭合的标签：弹出到匹配的开始标签为止
+        if not any(open_tag == tag for open_tag, _ in self._stack):
+            return
+        while self._stack:
+            open_tag, _ = self._stack.pop()
+            if open_tag in BOLD_TAGS:
+                self._bold_depth -= 1
+            if open_tag == tag:
+                break
+        if tag in BLOCK_TAGS:
+            self._flush()
+            if tag[0] == 'h' and tag[1:].isdigit():
+                self._heading_level = 0
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_data(self, data):
+        if self._skip_stack:
+            return
+        data = _SPACE_RE.sub(' ', data.replace('\n', ' '))
+        if not data.strip():
+            if self._parts:
+                self._parts.append(data)
+            return
+        self._parts.append(data)
+        size = len(data.strip())
+        self._chars += size
+        if self._bold_depth:
+            self._bold_chars += size
+        self._max_font = max(self._max_font, self._font_size() or 0)
+
+    def _image(self, attrs: Dict):
+        src = attrs.get('data-src') or attrs.get('src')
+        if not src:
+            return
+        self._flush()
+        block = {'type': 'image', 'position': self._images, 'src': src}
+        try:
+            width = int(attrs['data-w'])
+            block['width'] = width
+            block['height'] = round(width * float(attrs['data-ratio']))
+        except (KeyError, TypeError, ValueError):
+            pass
+        self.blocks.append(block)
+        self._images += 1
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def parse_html(html: str) -> List[Dict]:
+    """把正文HTML解析为块列表"""
+    parser = ArticleHTMLParser()
+    parser.feed(html or '')
+    parser.close()
+    return parser.blocks
+
+
+def content_hash(html: str) -> str:
+    return hashlib.sha256((html or '').encode('utf-8')).hexdigest()
+
+
+def to_markdown(blocks: List[Dict], image_paths: Dict[str, str] = None,
+                heading_offset: int = 0) -> str:
+    """
+    渲染为Markdown
+    Args:
+        image_paths: 图片URL到本地文件的映射（见 assets.py），有则使用本地路径
+        heading_offset: 标题级别偏移（嵌入报告的某一节时使用）
+    """
+    lines = []
+    for block in blocks:
+        if block['type'] == 'heading':
+            lines.append(f"{'#' * min(block['level'] + heading_offset, 6)} {block['text']}")
+        elif block['type'] == 'image':
+            src = (image_paths or {}).get(block['src'], block['src'])
+            lines.append(f"![图{block['position'] + 1}]({src})")
+        else:
+            # Markdown 段内换行需要行尾两个空格
+            lines.append(block['text'].replace('\n', '  \n'))
+    return '\n\n'.join(lines) + '\n'
+
+
+def _parse_row(item: Tuple[str, str]) -> Tuple:
+    """进程池任务：(content_hash, html) -> parsed_contents 行"""
+    digest, html = item
+    blocks = parse_html(html)
+    counts = {'paragraph': 0, 'heading': 0, 'image': 0}
+    chars = 0
+    for block in blocks:
+        counts[block['type']] += 1
+        chars += len(block.get('text', ''))
+    return (digest, PARSER_VERSION, json.dumps(blocks, ensure_ascii=False),
+            counts['paragraph'], counts['heading'], counts['image'], chars)
+
+
+def parse_corpus(db: DatabaseManager = None, workers: int = None,
+                 batch_size: int = 200) -> Dict[str, int]:
+    """
+    解析所有文章正文（缓存命中的跳过），多进程并行
+    Returns:
+        {'articles': 处理的文章数, 'parsed': 实际解析数, 'cached': 命中缓存数}
+    """
+    db = db or DatabaseManager()
+    stats = {'articles': 0, 'parsed': 0, 'cached': 0}
+    after_id = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            rows = db.get_article_html_batch(after_id, batch_size)
+            if not rows:
+                break
+            after_id = rows[-1]['article_id']
+
+            links = []
+            todo = {}
+            for row in rows:
+                digest = content_hash(row['content_html'])
+                links.append((row['article_id'], digest))
+                todo.setdefault(digest, row['content_html'])
+            cached = db.get_parsed_hashes(list(todo), PARSER_VERSION)
+            items = [(digest, html) for digest, html in todo.items() if digest not in cached]
+            parsed = list(executor.map(_parse_row, items, chunksize=8))
+            db.save_parsed_contents(parsed, links)
+
+            stats['articles'] += len(rows)
+            stats['parsed'] += len(parsed)
+            stats['cached'] += len(rows) - len(parsed)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把文章正文HTML解析为段落、标题和图片")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--workers', type=int, default=None, help="并行进程数（默认CPU核数）")
+    parser.add_argument('--markdown', metavar='URL', help="输出一篇文章的Markdown")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    if not database.check_database_exists():
+        print(f"❌ 数据库不存在: {database.DATABASE_PATH}")
+        return
+
+    db = DatabaseManager()
+    if args.markdown:
+        structure = db.get_article_structure(args.markdown)
+        if structure is None:
+            content = db.get_article_content(args.markdown)
+            if not content:
+                print(f"❌ 没有该文章的正文: {args.markdown}")
+                return
+            print(to_markdown(parse_html(content['content_html'])))
+        else:
+            print(to_markdown(structure['blocks']))
+        return
+
+    stats = parse_corpus(db, args.workers)
+    print(f"✅ 处理 {stats['articles']} 篇文章：解析 {stats['parsed']} 篇，"
+          f"命中缓存 {stats['cached']} 篇")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+无人值守的守护进程
+按公众号分别调度三类任务，保持数据持续更新而不需要人工运行或全量重采：
+- sync: 增量获取新发布的文章列表
+- stats: 刷新近期文章的阅读数（发布后几天内仍在增长）
+- details: 获取尚未完成的文章统计和正文
+公众号及其优先级、调度间隔来自登记表（见 registry.py），运行期间定期重新读取，新登记的公众号自动加入。
+每次执行后按间隔（带随机浮动）排定下次时间；同一公众号的任务不并行，总并发受 workers 限制，
+到期任务多于空闲并发时优先级高的公众号先执行。
+SIGTERM / SIGINT 时不再派发新任务，正在执行的任务处理完当前文章后退出，保存进度后结束。
+运行状态（心跳、正在执行的任务、各任务下次执行时间、最近错误）定时写入状态文件，
+重启后按状态文件中的下次执行时间续排
+"""
+
+import argparse
+import heapq
+import json
+import os
+import queue
+import random
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import cache_eviction
+import config
+import database
+import metrics
+import registry
+from collector import WechatArticleCollector
+
+JOBS = ('sync', 'stats', 'details')
+JOB_LABELS = {'sync': '增量同步', 'stats': '刷新阅读数', 'details': '获取详情'}
+# 登记表中各任务间隔对应的列
+REGISTRY_COLUMNS = {'sync': 'sync_interval', 'stats': 'stats_interval', 'details': 'detail_interval'}
+
+# 状态文件写入间隔（秒），心跳超过 3 倍间隔未更新视为失去响应
+STATUS_INTERVAL = 10
+# 首次启动时各任务在这段时间内错开开始（秒）
+STARTUP_SPREAD = 60
+# 公众号已有任务在执行时，推迟多久再尝试（秒）
+BUSY_RETRY_DELAY = 5
+# 重新读取登记表的间隔（秒）
+REGISTRY_RELOAD_INTERVAL = 300
+MAX_RECENT_ERRORS = 20
+
+
+def default_intervals() -> Dict[str, float]:
+    return {
+        'sync': config.DAEMON_SYNC_INTERVAL,
+        'stats': config.DAEMON_STATS_INTERVAL,
+        'details': config.DAEMON_DETAIL_INTERVAL,
+    }
+
+
+def load_schedules(accounts: List[Dict], path: str = None) -> Dict[str, Dict[str, float]]:
+    """
+    各公众号的任务间隔，后者覆盖前者：配置中的默认间隔、调度文件的 default、
+    登记表的 *_interval 列、调度文件中按 biz 的设置
+    调度文件格式: {"default": {"sync": 3600}, "<biz>": {"stats": 43200, "details": 0}}
+    间隔为 0 或 null 表示不执行该任务
+    """
+    overrides = {}
+    path = config.DAEMON_SCHEDULE_FILE if path is None else path
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            overrides = json.load(f)
+    defaults = dict(default_intervals(), **overrides.get('default', {}))
+    schedules = {}
+    for account in accounts:
+        intervals = dict(defaults)
+        intervals.update({job: account[column] for job, column in REGISTRY_COLUMNS.items()
+                          if account.get(column) is not None})
+        intervals.update(overrides.get(account['biz'], {}))
+        schedules[account['biz']] = {job: float(intervals[job]) for job in JOBS if intervals.get(job)}
+    return schedules
+
+
+def jittered(interval: float, jitter: float) -> float:
+    """按比例随机浮动的间隔"""
+    return interval * (1 + random.uniform(-jitter, jitter))
+
+
+def _format_time(ts: Optional[float]) -> Optional[str]:
+    return datetime.fromtimestamp(ts).isoformat(timespec='seconds') if ts else None
+
+
+def _parse_time(value: Optional[str]) -> Optional[float]:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+def read_status(path: str) -> Optional[Dict]:
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_status(path: str, status: Dict):
+    """先写临时文件再替换，读取方不会读到写了一半的文件"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(status, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class Daemon:
+    """按计划调度各公众号的采集任务"""
+
+    def __init__(self, collector: WechatArticleCollector, accounts: List[Dict],
+                 schedule_path: str = None, workers: int = None, jitter: float = None,
+                 status_path: str = None, stats_window_days: int = None,
+                 loader: Callable[[], List[Dict]] = None):
+        """
+        Args:
+            accounts: 登记表记录（至少包含 biz / nick_name，可选 priority / *_interval）
+            loader: 重新读取登记表的函数（为空时不重新读取）
+        """
+        self.collector = collector
+        self.db = collector.db
+        self.log = collector.log
+        self.schedule_path = schedule_path
+        self.loader = loader
+        self.workers = max(1, workers or config.DAEMON_WORKERS)
+        self.jitter = config.DAEMON_JITTER if jitter is None else jitter
+        self.status_path = status_path or config.DAEMON_STATUS_FILE
+        self.stats_window_days = stats_window_days or config.DAEMON_STATS_WINDOW_DAYS
+
+        self.state = 'starting'
+        self.started_at = time.time()
+        self._queue = []  # (due, seq, biz, job)
+        self._seq = 0
+        self._running: Dict[Future, Dict] = {}
+        self._busy = set()
+        self._finished = queue.SimpleQueue()
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._status_written_at = 0.0
+        self._balance_checked_at = 0.0
+        self._loaded_at = time.time()
+        self.accounts: Dict[str, Dict] = {}
+        self.jobs: Dict[str, Dict[str, Dict]] = {}
+        self._apply_accounts(accounts)
+        self.totals = {job: {'runs': 0, 'failed': 0, 'interrupted': 0} for job in JOBS}
+        self.recent_errors = []
+
+    # ==================== 调度 ====================
+
+    def _apply_accounts(self, accounts: List[Dict], now: float = None):
+        """
+        按登记表更新调度：移除停用的公众号和任务，更新间隔，
+        新增的任务（now 不为空时）在 STARTUP_SPREAD 内错开开始
+        已在队列中的旧条目在出队时按 next_due 识别并丢弃
+        """
+        schedules = load_schedules(accounts, self.schedule_path)
+        self.accounts = {account['biz']: account for account in accounts}
+        for biz in list(self.jobs):
+            if biz not in schedules:
+                del self.jobs[biz]
+        for biz, intervals in schedules.items():
+            states = self.jobs.setdefault(biz, {})
+            for job in list(states):
+                if job not in intervals:
+                    del states[job]
+            for job, interval in intervals.items():
+                if job in states:
+                    states[job]['interval'] = interval
+                    continue
+                states[job] = {'interval': interval, 'next_due': None, 'last_run': None,
+                               'last_duration': None, 'last_result': None}
+                if now is not None:
+                    self._push(self._startup_due(now, interval), biz, job)
+
+    def _reload_accounts(self, now: float):
+        self._loaded_at = now
+        try:
+            accounts = self.loader()
+        except Exception as e:
+            self.log.error(f"⚠️ 读取公众号登记表失败: {e}", error=type(e).__name__)
+            return
+        added = len(set(account['biz'] for account in accounts) - set(self.accounts))
+        removed = len(set(self.accounts) - set(account['biz'] for account in accounts))
+        self._apply_accounts(accounts, now)
+        if added or removed:
+            self.log.warning(f"📋 登记表已更新: 新增 {added} 个，移除 {removed} 个公众号",
+                             added=added, removed=removed)
+
+    def _startup_due(self, now: float, interval: float) -> float:
+        return now + random.uniform(0, min(interval * self.jitter, STARTUP_SPREAD))
+
+    def _name(self, biz: str) -> str:
+        return (self.accounts.get(biz) or {}).get('nick_name') or biz
+
+    def _push(self, due: float, biz: str, job: str):
+        self._seq += 1
+        heapq.heappush(self._queue, (due, self._seq, biz, job))
+        self.jobs[biz][job]['next_due'] = due
+
+    def _initial_schedule(self):
+        """上次运行留下的下次执行时间继续有效；新任务在启动后错开开始"""
+        now = time.time()
+        previous = (read_status(self.status_path) or {}).get('accounts', {})
+        for biz, jobs in self.jobs.items():
+            for job, state in jobs.items():
+                saved = previous.get(biz, {}).get('jobs', {}).get(job, {})
+                state['last_run'] = _parse_time(saved.get('last_run'))
+                state['last_result'] = saved.get('last_result')
+                due = _parse_time(saved.get('next_due'))
+                self._push(self._startup_due(now, state['interval']) if due is None else due,
+                           biz, job)
+
+    def _dispatch(self, now: float):
+        """派发已到期的任务，直到并发数用满；到期任务多于空闲并发时按公众号优先级派发"""
+        due_items = []
+        while self._queue and self._queue[0][0] <= now:
+            due, _, biz, job = heapq.heappop(self._queue)
+            state = self.jobs.get(biz, {}).get(job)
+            if state is not None and state['next_due'] == due:
+                due_items.append((due, biz, job))
+        due_items.sort(key=lambda item: (-(self.accounts[item[1]].get('priority') or 0), item[0]))
+        for due, biz, job in due_items:
+            if biz in self._busy:
+                self._push(now + BUSY_RETRY_DELAY, biz, job)
+            elif len(self._running) >= self.workers:
+                self._push(due, biz, job)
+            else:
+                self._busy.add(biz)
+                interval = self.jobs[biz][job]['interval']
+                future = self._executor.submit(self._run_job, biz, job, interval)
+                self._running[future] = {'biz': biz, 'job': job, 'started_at': time.time()}
+                future.add_done_callback(self._on_done)
+
+    def _on_done(self, future: Future):
+        # 在工作线程中执行，只通知主循环
+        self._finished.put(future)
+        self._wake.set()
+
+    def _collect_finished(self):
+        """处理已结束的任务：记录结果并排定下次执行"""
+        while True:
+            try:
+                future = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            info = self._running.pop(future)
+            biz, job = info['biz'], info['job']
+            self._busy.discard(biz)
+            finished = time.time()
+            self.totals[job]['runs'] += 1
+            # 执行期间从登记表移除的任务不再排期
+            state = self.jobs.get(biz, {}).get(job) or {'interval': 0}
+            state['last_run'] = info['started_at']
+            state['last_duration'] = round(finished - info['started_at'], 1)
+
+            error = future.exception()
+            if error is not None:
+                self.totals[job]['failed'] += 1
+                state['last_result'] = f"error: {type(error).__name__}"
+                self.recent_errors.append({'time': _format_time(finished), 'biz': biz, 'job': job,
+                                           'error': f"{type(error).__name__}: {error}"})
+                del self.recent_errors[:-MAX_RECENT_ERRORS]
+                self.log.error(f"❌ {self._name(biz)} {JOB_LABELS[job]}失败: {error}",
+                               exc_info=error, biz=biz, job=job, error=type(error).__name__)
+                next_due = finished + jittered(state['interval'], self.jitter)
+            else:
+                completed, interrupted = future.result()
+                state['last_result'] = completed
+                if interrupted:
+                    # 余额不足或收到停止请求，恢复后尽快继续
+                    self.totals[job]['interrupted'] += 1
+                    state['last_result'] = 'interrupted' if completed is None else f"interrupted: {completed}"
+                    next_due = finished
+                else:
+                    next_due = finished + jittered(state['interval'], self.jitter)
+            if job in self.jobs.get(biz, {}):
+                self._push(next_due, biz, job)
+
+    # ==================== 任务 ====================
+
+    def _run_job(self, biz: str, job: str, interval: float) -> Tuple[Optional[int], bool]:
+        """执行一个任务，返回 (完成数, 是否被中断)"""
+        if job == 'sync':
+            new_count = self.collector.sync_account_incremental(biz, self._name(biz),
+                                                                fetch_details=False)
+            return new_count, new_count is None
+
+        account_info = self.db.get_account_info(biz)
+        if not account_info:
+            # 还没有同步过列表，等 sync 任务先执行
+            return 0, False
+        account_id = account_info['id']
+
+        if job == 'stats':
+            refreshed = self.collector.refresh_recent_stats(
+                account_id, self.stats_window_days, interval * (1 - self.jitter))
+            return refreshed, refreshed is None
+
+        before = self.db.count_unfetched_articles(account_id)
+        if before:
+            self.collector.fetch_articles_details(account_id)
+        after = self.db.count_unfetched_articles(account_id) if before else 0
+        interrupted = bool(after) and (self.collector.stop_requested
+                                       or not self.collector.key_pool.has_available())
+        return before - after, interrupted
+
+    # ==================== 余额 ====================
+
+    def _balance_ok(self, now: float) -> bool:
+        """余额不足时暂停派发，定期重新查询余额（充值后自动恢复）"""
+        if self.collector.key_pool.has_available():
+            return True
+        if now - self._balance_checked_at >= config.DAEMON_BALANCE_INTERVAL:
+            self._balance_checked_at = now
+            self.collector.update_balance()
+            if self.collector.key_pool.has_available():
+                self.log.warning("💰 余额已恢复，继续调度")
+                return True
+        return False
+
+    # ==================== 状态文件 ====================
+
+    def status(self) -> Dict:
+        return {
+            'pid': os.getpid(),
+            'state': self.state,
+            'started_at': _format_time(self.started_at),
+            'heartbeat': _format_time(time.time()),
+            'workers': self.workers,
+            # 余额查询未完成时为 None，状态文件的写入不等待
+            'balance': self.collector.current_balance if self.collector.balance_known else None,
+            'running': [{'biz': info['biz'], 'nick_name': self._name(info['biz']),
+                         'job': info['job'], 'started_at': _format_time(info['started_at'])}
+                        for info in self._running.values()],
+            'next_due': _format_time(min((state['next_due'] for jobs in self.jobs.values()
+                                          for state in jobs.values() if state['next_due']),
+                                         default=None)),
+            'totals': self.totals,
+            'recent_errors': self.recent_errors,
+            'accounts': {
+                biz: {'nick_name': self._name(biz),
+                      'priority': self.accounts[biz].get('priority'),
+                      'jobs': {job: dict(state, next_due=_format_time(state['next_due']),
+                                         last_run=_format_time(state['last_run']))
+                               for job, state in jobs.items()}}
+                for biz, jobs in self.jobs.items()
+            },
+        }
+
+    def _write_status(self, now: float = None):
+        try:
+            write_status(self.status_path, self.status())
+            self._status_written_at = now or time.time()
+        except OSError as e:
+            self.log.error(f"⚠️ 状态文件写入失败: {e}", path=self.status_path,
+                           error=type(e).__name__)
+
+    # ==================== 运行 ====================
+
+    def request_stop(self, reason: str = None):
+        """停止派发新任务，并让正在执行的任务尽快结束"""
+        if not self._stopping.is_set():
+            print(f"\n⏹️ 收到停止请求{f'（{reason}）' if reason else ''}，等待正在执行的任务保存进度...")
+            self._stopping.set()
+            self.collector.request_stop()
+            self._wake.set()
+
+    def _install_signal_handlers(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        def handle(signum, frame):
+            # 再次收到信号时按默认方式立即退出
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.default_int_handler)
+            self.request_stop(signal.Signals(signum).name)
+
+        signal.signal(signal.SIGTERM, handle)
+        signal.signal(signal.SIGINT, handle)
+
+    def run(self):
+        """运行直到收到停止请求"""
+        scheduled = sum(len(jobs) for jobs in self.jobs.values())
+        print(f"🛰️ 守护进程启动: {len(self.jobs)} 个公众号，{scheduled} 个定时任务，"
+              f"并发 {self.workers}，状态文件 {self.status_path}")
+        self._install_signal_handlers()
+        self._initial_schedule()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='daemon')
+        self.state = 'running'
+        try:
+            while not self._stopping.is_set():
+                self._collect_finished()
+                now = time.time()
+                if self._balance_ok(now):
+                    self.state = 'running'
+                    self._dispatch(now)
+                elif self.state != 'paused':
+                    self.state = 'paused'
+                    self.log.warning("⚠️ 余额不足，暂停派发任务", balance=self.collector.current_balance)
+                if self.loader and now - self._loaded_at >= REGISTRY_RELOAD_INTERVAL:
+                    self._reload_accounts(now)
+                if now - self._status_written_at >= STATUS_INTERVAL:
+                    self._write_status(now)
+
+                timeout = STATUS_INTERVAL
+                if self.state == 'running' and self._queue and len(self._running) < self.workers:
+                    timeout = min(timeout, max(0.0, self._queue[0][0] - time.time()))
+                self._wake.wait(timeout)
+                self._wake.clear()
+        finally:
+            self._shutdown()
+
+    def _shutdown(self):
+        self.state = 'stopping'
+        self.collector.request_stop()
+        self._write_status()
+        self._executor.shutdown(wait=True)
+        self._collect_finished()
+        # 保存断点和派生指标，下次启动从这里继续
+        self.db.save_progress(self.collector.task_id, remain_money=self.collector.current_balance)
+        self.db.refresh_article_metrics()
+        self.state = 'stopped'
+        self._write_status()
+        runs = ', '.join(f"{JOB_LABELS[job]} {self.totals[job]['runs']}" for job in JOBS)
+        print(f"✅ 守护进程已停止（{runs}）")
+
+
+def print_status(path: str) -> bool:
+    """打印状态文件，返回守护进程是否健康（正在运行且心跳及时）"""
+    status = read_status(path)
+    if status is None:
+        print(f"❌ 没有状态文件: {path}")
+        return False
+    heartbeat_age = time.time() - _parse_time(status['heartbeat'])
+    alive = status['state'] in ('running', 'paused') and heartbeat_age < 3 * STATUS_INTERVAL
+    balance = '未知' if status['balance'] is None else f"¥{status['balance']:.2f}"
+    print(f"{'✅' if alive else '❌'} 状态 {status['state']} (pid {status['pid']})，"
+          f"心跳 {heartbeat_age:.0f} 秒前，余额 {balance}")
+    for info in status['running']:
+        print(f"  ▶️ {info['nick_name'] or info['biz']} {JOB_LABELS[info['job']]}"
+              f"（{info['started_at']} 开始）")
+    for job, totals in status['totals'].items():
+        print(f"  {JOB_LABELS[job]}: 执行 {totals['runs']}，失败 {totals['failed']}，"
+              f"中断 {totals['interrupted']}")
+    print(f"  下次任务: {status['next_due'] or '-'}")
+    for error in status['recent_errors'][-5:]:
+        print(f"  ⚠️ {error['time']} {error['biz']} {error['job']}: {error['error']}")
+    return alive
+
+
+def main():
+    parser = argparse.ArgumentParser(description="无人值守的定时采集守护进程")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--workers', type=int, default=None, help="同时执行的任务数")
+    parser.add_argument('--jitter', type=float, default=None, help="间隔随机浮动比例")
+    parser.add_argument('--schedule', default=None, help="按公众号的调度文件（JSON）")
+    parser.add_argument('--status-file', default=None, help="状态文件路径")
+    parser.add_argument('--tag', default=None,
+                        help="只调度登记表中带该标签的公众号（默认 ACCOUNT_TAG）")
+    parser.add_argument('--status', action='store_true',
+                        help="只查看运行状态（守护进程不健康时退出码为1）")
+    args = parser.parse_args()
+
+    status_path = args.status_file or config.DAEMON_STATUS_FILE
+    if args.status:
+        sys.exit(0 if print_status(status_path) else 1)
+
+    if args.database:
+        database.set_database_path(args.database)
+    collector = WechatArticleCollector()
+
+    def loader() -> List[Dict]:
+        return registry.load_entries(collector.db, args.tag)
+
+    daemon = Daemon(collector, loader(), args.schedule, args.workers, args.jitter,
+                    status_path, loader=loader)
+    try:
+        with cache_eviction.background_eviction():
+            daemon.run()
+    finally:
+        metrics.export_if_configured()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+数据库生命周期管理
+- backup: 在线备份（SQLite 增量备份API，每步只复制一部分页，步间释放读锁，采集可同时进行）
+- reset: 快速清空——当前数据库文件整体改名归档，换入新建的空表结构文件，耗时与数据量无关
+- compact: VACUUM 回收删除/归档后留下的空闲页
+主库之外的分片文件（见 sharding.py）和原始响应冷库（config.RAW_ARCHIVE_PATH）一并处理
+"""
+
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import config
+import database
+import sharding
+
+BACKUP_PAGES_PER_STEP = 1024
+BACKUP_STEP_SLEEP = 0.01
+BACKUP_MAX_RESTARTS = 3
+
+
+def _shard_dir() -> Optional[str]:
+    router = sharding.get_router()
+    if router is None or not os.path.isdir(router.shard_dir):
+        return None
+    return router.shard_dir
+
+
+def _archive_path() -> Optional[str]:
+    """原始响应冷库（见 cache_eviction.py），尚未归档过时返回 None"""
+    path = config.RAW_ARCHIVE_PATH
+    return path if path and os.path.exists(path) else None
+
+
+def _size_mb(path: str) -> float:
+    return os.path.getsize(path) / 1024 / 1024 if os.path.exists(path) else 0.0
+
+
+def _backup_name(path: str, stamp: str, dest_dir: str = None) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(dest_dir or config.BACKUP_DIR, f"{stem}_{stamp}.db")
+
+
+# ==================== 在线备份 ====================
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def backup_file(source_path: str, dest_path: str,
+                pages: int = BACKUP_PAGES_PER_STEP, sleep: float = BACKUP_STEP_SLEEP) -> float:
+    """
+    用增量备份API复制一个数据库文件，返回耗时（秒）
+    每步之间释放读锁，采集的写入不受影响；但其他连接每次写入都会让备份从头开始，
+    写入频繁时重来超过 BACKUP_MAX_RESTARTS 次后改为一步复制完
+    （期间写入方在自己的 busy timeout 内等待，整库复制通常不到一秒）
+    """
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+    tmp_path = dest_path + '.partial'
+    restarts = 0
+    last_remaining = None
+
+    def progress(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > BACKUP_MAX_RESTARTS:
+                raise _BackupRestarted()
+        last_remaining = remaining
+
+    source = sqlite3.connect(source_path, timeout=30)
+    target = sqlite3.connect(tmp_path)
+    try:
+        try:
+            source.backup(target, pages=pages, progress=progress, sleep=sleep)
+        except _BackupRestarted:
+            print(f"  ⚠️ 备份期间写入频繁（已重来 {restarts} 次），改为一步复制")
+            source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    os.replace(tmp_path, dest_path)
+    return time.perf_counter() - started
+
+
+def backup(dest_dir: str = None) -> List[str]:
+    """在线备份主库、所有分片和冷库，返回备份文件路径"""
+    if not database.check_database_exists():
+        raise FileNotFoundError(database.DATABASE_PATH)
+    stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    main_dest = _backup_name(database.DATABASE_PATH, stamp, dest_dir)
+    elapsed = backup_file(database.DATABASE_PATH, main_dest)
+    print(f"  💾 {database.DATABASE_PATH} → {main_dest} ({_size_mb(main_dest):.1f}MB, {elapsed:.1f}s)")
+    written = [main_dest]
+
+    shard_dir = _shard_dir()
+    if shard_dir:
+        shard_dest = os.path.splitext(main_dest)[0] + '_shards'
+        for name in sorted(os.listdir(shard_dir)):
+            if name.endswith('.db'):
+                dest = os.path.join(shard_dest, name)
+                backup_file(os.path.join(shard_dir, name), dest)
+                written.append(dest)
+        print(f"  💾 分片 {len(written) - 1} 个 → {shard_dest}")
+
+    archive = _archive_path()
+    if archive:
+        dest = _backup_name(archive, stamp, dest_dir)
+        elapsed = backup_file(archive, dest)
+        print(f"  💾 {archive} → {dest} ({_size_mb(dest):.1f}MB, {elapsed:.1f}s)")
+        written.append(dest)
+    return written
+
+
+# ==================== 快速清空 ====================
+
+def _check_idle(path: str):
+    """确认没有其他连接正在写入（拿不到写锁时抛出 sqlite3.OperationalError）"""
+    conn = sqlite3.connect(path, timeout=5)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        conn.execute('ROLLBACK')
+    finally:
+        conn.close()
+
+
+def _fresh_schema_file(path: str) -> str:
+    """在目标文件同目录下建一个空表结构的新文件（同一文件系统内才能原子替换）"""
+    fd, tmp_path = tempfile.mkstemp(suffix='.db', prefix='.fresh_',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    os.remove(tmp_path)
+    original = database.DATABASE_PATH
+    database.set_database_path(tmp_path)
+    try:
+        database.init_database()
+    finally:
+        database.set_database_path(original)
+    return tmp_path
+
+
+def reset(keep_backup: bool = True) -> Dict[str, Optional[str]]:
+    """
+    清空所有数据，保留表结构
+    当前文件整体改名到备份目录（keep_backup=False 时直接删除），再原子换入新文件，
+    不逐行 DELETE，文件也不会残留空闲页
+    Returns:
+        {'archived': 归档后的主库路径, 'shards': 归档后的分片目录, 'archive': 归档后的冷库路径}
+    """
+    path = database.DATABASE_PATH
+    result = {'archived': None, 'shards': None, 'archive': None}
+    fresh = _fresh_schema_file(path)
+    try:
+        if os.path.exists(path):
+            _check_idle(path)
+            stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            if keep_backup:
+                archived = _backup_name(path, stamp)
+                os.makedirs(os.path.dirname(archived), exist_ok=True)
+                shutil.move(path, archived)
+                result['archived'] = archived
+            else:
+                os.remove(path)
+            for suffix in ('-journal', '-wal', '-shm'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+            shard_dir = _shard_dir()
+            if shard_dir:
+                if keep_backup:
+                    shard_dest = os.path.splitext(result['archived'])[0] + '_shards'
+                    shutil.move(shard_dir, shard_dest)
+                    result['shards'] = shard_dest
+                else:
+                    shutil.rmtree(shard_dir)
+
+            # 冷库中的原始响应同样清空，否则 get_statistics 仍会计入已归档的花费
+            archive = _archive_path()
+            if archive:
+                _check_idle(archive)
+                if keep_backup:
+                    result['archive'] = _backup_name(archive, stamp)
+                    shutil.move(archive, result['archive'])
+                else:
+                    os.remove(archive)
+                if os.path.exists(archive + '-journal'):
+                    os.remove(archive + '-journal')
+        os.replace(fresh, path)
+    except BaseException:
+        if os.path.exists(fresh):
+            os.remove(fresh)
+        raise
+    # 分片路由缓存了文章所在分片和已建表的分片文件
+    sharding._router = None
+    return result
+
+
+# ==================== 压缩 ====================
+
+def compact_file(path: str) -> float:
+    """VACUUM 一个数据库文件，返回释放的空间（MB）"""
+    before = _size_mb(path)
+    conn = sqlite3.connect(path, timeout=30)
+    try:
+        conn.execute('VACUUM')
+    finally:
+        conn.close()
+    return before - _size_mb(path)
+
+
+def compact() -> float:
+    """压缩主库、所有分片和冷库，返回共释放的空间（MB）"""
+    paths = [database.DATABASE_PATH]
+    shard_dir = _shard_dir()
+    if shard_dir:
+        paths += [os.path.join(shard_dir, name) for name in sorted(os.listdir(shard_dir))
+                  if name.endswith('.db')]
+    if _archive_path():
+        paths.append(_archive_path())
+    freed = 0.0
+    for path in paths:
+        freed += compact_file(path)
+    return freed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="数据库备份、清空与压缩")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--backup', action='store_true', help="在线备份（采集运行时也可执行）")
+    group.add_argument('--reset', action='store_true', help="清空所有数据（旧文件归档到备份目录）")
+    group.add_argument('--compact', action='store_true', help="VACUUM 回收空间")
+    parser.add_argument('--no-backup', action='store_true', help="清空时不保留旧文件")
+    parser.add_argument('--backup-dir', help=f"备份目录（默认 {config.BACKUP_DIR}）")
+    parser.add_argument('--yes', action='store_true', help="清空时不再确认")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    if args.backup_dir:
+        config.BACKUP_DIR = args.backup_dir
+
+    if args.backup:
+        print("📦 在线备份...")
+        backup()
+    elif args.reset:
+        if not args.yes:
+            print("⚠️  警告：此操作将清空数据库中的所有数据！")
+            if input("\n确认清空? (输入 yes 确认): ").strip().lower() != 'yes':
+                print("取消操作")
+                return
+        try:
+            result = reset(keep_backup=not args.no_backup)
+        except sqlite3.OperationalError as e:
+            print(f"❌ 数据库正在被使用，请先停止采集: {e}")
+            return
+        print("✅ 所有数据已清空，表结构保留")
+        if result['archived']:
+            print(f"  旧数据已归档: {result['archived']}")
+        if result['archive']:
+            print(f"  旧冷库已归档: {result['archive']}")
+    else:
+        freed = compact()
+        print(f"🧹 压缩完成，释放 {freed:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,18 @@ import os
 
 DATABASE_PATH = "wechat_articles.db"
 
+# 表结构版本，新增表或字段时递增（保存在 PRAGMA user_version）
+SCHEMA_VERSION = 15
+
+# 本进程内已确认结构为最新的数据库文件
+_schema_verified = set()
+
+
+def set_database_path(path: str):
+    """切换数据库文件（压测、离线重放等场景使用独立数据库）"""
+    global DATABASE_PATH
+    DATABASE_PATH = path
+
 
 def get_connection():
     """获取数据库连接"""
@@ -19,6 +31,35 @@ def get_connection():
     return conn
 
 
+def add_column_if_missing(cursor, table: str, column: str, definition: str):
+    """表中没有该字段时添加（用于表结构升级）"""
+    columns = [row[1] for row in cursor.execute(f'PRAGMA table_info({table})')]
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def scrub_request_keys(conn, db: str = 'main') -> int:
+    """
+    清除 api_raw_responses.request_params 中的明文密钥
+    清除前先按明文密钥计算指纹写入 key_id，旧记录的费用仍可按密钥统计
+    Args:
+        db: 表所在的库名（主库、ATTACH 的冷库等）
+    Returns:
+        处理的行数
+    """
+    from key_pool import key_fingerprint
+    conn.create_function('key_fingerprint', 1, lambda key: key_fingerprint(str(key)),
+                         deterministic=True)
+    fingerprint = "COALESCE(key_id, key_fingerprint(json_extract(request_params, '$.key')))"
+    cursor = conn.execute(f'''
+        UPDATE {db}.api_raw_responses
+        SET key_id = {fingerprint},
+            request_params = json_set(json_remove(request_params, '$.key'), '$.key_id', {fingerprint})
+        WHERE json_valid(request_params) AND json_extract(request_params, '$.key') IS NOT NULL
+    ''')
+    return cursor.rowcount
+
+
 def init_database():
     """初始化数据库，创建所有表"""
     conn = get_connection()
@@ -35,16 +76,26 @@ def init_database():
             response_code INTEGER,
             cost_money REAL,
             remain_money REAL,
+            key_id TEXT,  -- 付费密钥指纹（见 key_pool.key_fingerprint）
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             UNIQUE(api_type, request_key)  -- 避免重复存储
         )
     ''')
+    # 旧版本数据库补充字段
+    add_column_if_missing(cursor, 'api_raw_responses', 'key_id', 'TEXT')
+    # 请求参数中只保存密钥指纹，清除旧记录中的明文密钥
+    scrub_request_keys(conn)
     
     # 创建索引
     cursor.execute('''
         CREATE INDEX IF NOT EXISTS idx_api_raw_type_key 
         ON api_raw_responses(api_type, request_key)
     ''')
+    # 缓存过期判断与按时间归档
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_api_raw_type_created
+        ON api_raw_responses(api_type, created_at)
+    ''')
     
     # 2. 公众号表
     cursor.execute('''
@@ -61,10 +112,17 @@ def init_database():
             fetched_articles INTEGER DEFAULT 0,
             stop_flag BOOLEAN DEFAULT 0,  -- 是否已到达2025年前
             last_fetch_time TIMESTAMP,
+            list_synced_at TIMESTAMP,  -- 最近一次完整采集/增量同步完成的时间（增量同步的边界）
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
     ''')
+    # 旧版本数据库补充字段：已完成列表采集的公众号以最后采集时间作为同步边界
+    add_column_if_missing(cursor, 'accounts', 'list_synced_at', 'TIMESTAMP')
+    cursor.execute('''
+        UPDATE accounts SET list_synced_at = IFNULL(last_fetch_time, updated_at)
+        WHERE stop_flag = 1 AND list_synced_at IS NULL
+    ''')
     
     # 3. 文章表（核心信息）
     cursor.execute('''
@@ -151,8 +209,269 @@ def init_database():
         )
     ''')
     
+    # 7. 失败请求重试队列
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS retry_queue (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            api_type TEXT NOT NULL,  -- post_history/read_zan_pro/article_detail
+            request_key TEXT NOT NULL,  -- 与 api_raw_responses 相同
+            error_class TEXT,  -- 异常类型或接口错误码
+            last_error TEXT,
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at TIMESTAMP,
+            status TEXT DEFAULT 'pending',  -- pending/done/dead
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(api_type, request_key)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_retry_queue_due
+        ON retry_queue(status, next_attempt_at)
+    ''')
+    
+    # 8. 多进程共享的工作单元（租约领取）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS work_units (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            unit_type TEXT NOT NULL,  -- list(一页文章列表)/detail(一篇文章的统计和全文)
+            unit_key TEXT NOT NULL,  -- list: biz_page；detail: 文章URL
+            account_biz TEXT,
+            status TEXT DEFAULT 'pending',  -- pending/leased/done/failed
+            lease_owner TEXT,
+            lease_expires_at TIMESTAMP,
+            attempts INTEGER DEFAULT 0,
+            last_error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(unit_type, unit_key)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_work_units_claim
+        ON work_units(status, lease_expires_at)
+    ''')
+    
+    # 9. 图片资源（按内容哈希去重，文件保存在 assets/ 目录）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_assets (
+            sha256 TEXT PRIMARY KEY,
+            path TEXT NOT NULL,  -- 相对 assets 目录的路径
+            size INTEGER,
+            content_type TEXT,
+            source_url TEXT,  -- 首次下载的URL
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # 10. 文章中的图片（封面和正文图片）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS article_images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            article_id INTEGER NOT NULL,
+            role TEXT NOT NULL,  -- cover/inline
+            position INTEGER DEFAULT 0,  -- 正文图片的顺序
+            url TEXT NOT NULL,
+            width INTEGER,
+            height INTEGER,
+            sha256 TEXT,  -- 对应 image_assets
+            status TEXT DEFAULT 'pending',  -- pending/done/failed
+            error TEXT,
+            fetched_at TIMESTAMP,
+            UNIQUE(article_id, url),
+            FOREIGN KEY (article_id) REFERENCES articles(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_article_images_url ON article_images(url)
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_article_images_status ON article_images(status)
+    ''')
+    # 文章图片登记完成的时间（没有图片的文章也标记，避免每次重复扫描）
+    add_column_if_missing(cursor, 'articles', 'images_registered_at', 'TIMESTAMP')
+    cursor.execute('''
+        UPDATE articles SET images_registered_at = CURRENT_TIMESTAMP
+        WHERE images_registered_at IS NULL
+          AND EXISTS (SELECT 1 FROM article_images i WHERE i.article_id = articles.id)
+    ''')
+    
+    # 11. 正文结构化解析缓存（按 content_html 的哈希，见 content_parser.py）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS parsed_contents (
+            content_hash TEXT PRIMARY KEY,  -- content_html 的 SHA-256
+            parser_version INTEGER NOT NULL,
+            blocks TEXT NOT NULL,  -- JSON: [{type: heading/paragraph/image, ...}]
+            paragraph_count INTEGER,
+            heading_count INTEGER,
+            image_count INTEGER,
+            char_count INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # 12. 文章与解析结果的对应关系
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS article_structure (
+            article_id INTEGER PRIMARY KEY,
+            content_hash TEXT NOT NULL,
+            parsed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (article_id) REFERENCES articles(id)
+        )
+    ''')
+    
+    # 13. 采集批次（见 UPGRADE_DESIGN.md 与 batch.py）
+    batches_existed = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'batches'").fetchone()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS batches (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            batch_id TEXT UNIQUE NOT NULL,  -- 批次唯一标识
+            name TEXT,  -- 用户自定义名称
+            initial_mode TEXT,  -- 创建时的模式(仅作记录)
+            last_mode TEXT,  -- 最后使用的模式
+            status TEXT DEFAULT 'running',  -- running/paused/completed
+            
+            -- 进度统计
+            total_accounts INTEGER DEFAULT 0,
+            completed_accounts INTEGER DEFAULT 0,
+            total_articles INTEGER DEFAULT 0,
+            fetched_articles INTEGER DEFAULT 0,
+            
+            -- 费用统计
+            estimated_cost REAL DEFAULT 0,  -- 预估费用(两阶段模式)
+            actual_cost REAL DEFAULT 0,  -- 实际消耗
+            initial_balance REAL,  -- 开始时余额
+            current_balance REAL,  -- 当前余额
+            
+            -- 两阶段模式专用字段
+            phase TEXT DEFAULT 'list',  -- list/confirm/detail/completed
+            user_confirmed BOOLEAN DEFAULT 0,  -- 是否已确认费用
+            confirm_time TIMESTAMP,  -- 确认时间
+            unfetched_count INTEGER DEFAULT 0,  -- 待获取文章数
+            
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_batch_status ON batches(status)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_batch_created ON batches(created_at)')
+    
+    # 公众号与文章的所属批次
+    add_column_if_missing(cursor, 'accounts', 'batch_id', 'TEXT')
+    add_column_if_missing(cursor, 'articles', 'batch_id', 'TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_accounts_batch ON accounts(batch_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_articles_batch ON articles(batch_id)')
+    
+    # 首次引入批次时，已有数据归入默认批次
+    if not batches_existed and cursor.execute('SELECT 1 FROM accounts LIMIT 1').fetchone():
+        cursor.execute('''
+            INSERT OR IGNORE INTO batches (batch_id, name, initial_mode, last_mode, status, phase)
+            VALUES ('batch_default', '历史数据', 'standard', 'standard', 'paused', 'detail')
+        ''')
+        cursor.execute("UPDATE accounts SET batch_id = 'batch_default' WHERE batch_id IS NULL")
+        cursor.execute("UPDATE articles SET batch_id = 'batch_default' WHERE batch_id IS NULL")
+    
+    # 14. 批次快照：每个批次结束时各文章的状态和数据（批次对比用，见 batch_compare.py）
+    # 以 (batch_id, article_id) 为聚簇主键，同一批次的行连续存放，按批次扫描和关联都是范围查找
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS batch_articles (
+            batch_id TEXT NOT NULL,
+            article_id INTEGER NOT NULL,
+            account_id INTEGER,
+            fetch_status TEXT,
+            read_num INTEGER,
+            zan INTEGER,
+            looking INTEGER,
+            share_num INTEGER,
+            collect_num INTEGER,
+            comment_count INTEGER,
+            captured_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (batch_id, article_id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # 按公众号分页遍历文章的键集索引（见 DatabaseManager.iter_articles）
+    # 发布时间为空的文章按空字符串排序，查询中必须使用同一表达式才能命中索引
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_articles_account_time
+        ON articles(account_id, IFNULL(post_time_str, ''), id)
+    ''')
+    
+    # 15. 文章派生指标：公众号内排名/百分位、相对公众号中位数的z分数、互动率
+    # （见 DatabaseManager.refresh_article_metrics）
+    # 由 article_stats 按公众号整体重算；写入统计数据时只把公众号记入 article_metrics_dirty
+    metrics_existed = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'article_metrics'").fetchone()
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS article_metrics (
+            article_id INTEGER PRIMARY KEY,
+            account_id INTEGER NOT NULL,
+            read_num INTEGER,
+            read_rank INTEGER,  -- 公众号内阅读数排名（1为最高）
+            read_percentile REAL,  -- 公众号内百分位（0~1，越大越靠前）
+            account_median REAL,  -- 公众号阅读数中位数
+            read_zscore REAL,  -- (阅读数 - 中位数) / 标准差
+            engagement_rate REAL,  -- (点赞+在看+转发+收藏+评论) / 阅读数
+            zan_rate REAL,
+            looking_rate REAL,
+            share_rate REAL,
+            computed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_article_metrics_account_rank
+        ON article_metrics(account_id, read_rank)
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_article_metrics_zscore ON article_metrics(read_zscore)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS article_metrics_dirty (
+            account_id INTEGER PRIMARY KEY,
+            marked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    if not metrics_existed:
+        # 已有统计数据的公众号等待首次计算
+        cursor.execute('''
+            INSERT OR IGNORE INTO article_metrics_dirty (account_id)
+            SELECT DISTINCT art.account_id
+            FROM article_stats s JOIN articles art ON art.id = s.article_id
+        ''')
+    
+    # 16. 公众号登记表：要监控的公众号及其优先级和守护进程调度间隔（见 registry.py）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS account_registry (
+            biz TEXT PRIMARY KEY,
+            nick_name TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,  -- 越大越优先
+            enabled INTEGER NOT NULL DEFAULT 1,
+            sync_interval REAL,  -- 各任务间隔（秒），NULL 使用默认值，0 不执行
+            stats_interval REAL,
+            detail_interval REAL,
+            added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+    ''')
+    # 按优先级取启用的公众号是索引上的顺序扫描
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_account_registry_schedule
+        ON account_registry(enabled, priority DESC, biz)
+    ''')
+    # 17. 公众号标签（按标签筛选是主键上的范围查找）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS account_tags (
+            tag TEXT NOT NULL,
+            biz TEXT NOT NULL,
+            PRIMARY KEY (tag, biz)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_account_tags_biz ON account_tags(biz)')
+    
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    
     conn.commit()
     conn.close()
+    _schema_verified.add(os.path.abspath(DATABASE_PATH))
     print(f"✅ 数据库初始化完成: {DATABASE_PATH}")
 
 
@@ -161,5 +480,25 @@ def check_database_exists():
     return os.path.exists(DATABASE_PATH)
 
 
+def ensure_schema():
+    """
+    确保表结构为最新版本
+    每个进程每个数据库文件只检查一次，且只读取 user_version，不扫描 sqlite_master
+    """
+    path = os.path.abspath(DATABASE_PATH)
+    if path in _schema_verified:
+        return
+    if check_database_exists():
+        conn = sqlite3.connect(DATABASE_PATH)
+        try:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+        finally:
+            conn.close()
+        if version >= SCHEMA_VERSION:
+            _schema_verified.add(path)
+            return
+    init_database()
+
+
 if __name__ == "__main__":
     init_database()
\ No newline at end of file
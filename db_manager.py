@@ -4,11 +4,110 @@
 处理所有数据库相关操作，确保数据完整性和事务一致性
 """
 
+import os
+import math
 import sqlite3
 import json
+import threading
+import time
 from datetime import datetime
-from typing import Optional, Dict, Any, List, Tuple
-from database import get_connection, init_database, check_database_exists
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+from database import get_connection, ensure_schema
+from sharding import get_router
+from config import RAW_CACHE_TTL, METRICS_REFRESH_INTERVAL
+import config
+import metrics
+import parsers
+from metrics import db_timed
+from structured_log import get_logger
+
+# 迭代接口每次查询的行数（每页一个短连接，不在遍历期间持有读锁）
+ITER_PAGE_SIZE = 500
+
+# 公众号登记表中可批量更新的字段（见 upsert_registry_accounts）
+REGISTRY_FIELDS = ('nick_name', 'priority', 'enabled', 'sync_interval', 'stats_interval',
+                   'detail_interval')
+
+
+class Record:
+    """
+    只含查询所需列的轻量记录（__slots__，不建 dict）
+    同时支持 record.url 和 record['url']，可直接替代原来的行字典
+    """
+    __slots__ = ()
+
+    def __init__(self, row):
+        for name, value in zip(self.__slots__, row):
+            setattr(self, name, value)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __repr__(self):
+        fields = ', '.join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class ArticleRecord(Record):
+    __slots__ = ('id', 'account_id', 'url', 'title', 'fetch_status', 'post_time_str')
+
+
+class AccountRecord(Record):
+    __slots__ = ('id', 'biz', 'nick_name', 'status', 'last_page', 'updated_at')
+
+
+def statistics_sources() -> List[Tuple[str, Optional[str]]]:
+    """query_statistics 读取的库 [(别名, 路径)]：主库（路径为 None）、各分片和已存在的冷库"""
+    router = get_router()
+    sources = [('main', None)]
+    if router is not None:
+        sources += [('shard', router.shard_path(shard)) for shard in router.list_shards()]
+    if os.path.exists(config.RAW_ARCHIVE_PATH):
+        sources.append(('archive', config.RAW_ARCHIVE_PATH))
+    return sources
+
+
+def query_statistics(conn: sqlite3.Connection) -> Dict:
+    """
+    整体统计（DatabaseManager.get_statistics 与查询服务共用）
+    花费包括主库、各分片和冷库中的原始响应；余额取主库和分片中最新的响应
+    分片和冷库逐个 ATTACH 到给定的主库连接，查询后 DETACH
+    """
+    stats = dict(conn.execute('''
+        SELECT
+            (SELECT COUNT(*) FROM accounts) AS total_accounts,
+            (SELECT COUNT(*) FROM accounts WHERE status = 'completed') AS completed_accounts,
+            (SELECT COUNT(*) FROM articles) AS total_articles,
+            (SELECT COUNT(*) FROM articles WHERE fetch_status = 'content_fetched') AS fetched_articles
+    ''').fetchone())
+    
+    total_cost, latest = 0, []
+    for alias, path in statistics_sources():
+        if path:
+            conn.execute(f'ATTACH DATABASE ? AS {alias}', (path,))
+        try:
+            if not conn.execute(f'''
+                SELECT 1 FROM {alias}.sqlite_master WHERE name = 'api_raw_responses'
+            ''').fetchone():
+                continue
+            total_cost += conn.execute(f'''
+                SELECT SUM(cost_money) FROM {alias}.api_raw_responses
+            ''').fetchone()[0] or 0
+            if alias != 'archive':
+                latest += [tuple(row) for row in conn.execute(f'''
+                    SELECT created_at, remain_money FROM {alias}.api_raw_responses
+                    ORDER BY created_at DESC LIMIT 1
+                ''')]
+        finally:
+            if path:
+                conn.execute(f'DETACH DATABASE {alias}')
+    
+    stats['total_cost'] = total_cost
+    stats['current_balance'] = (max(latest)[1] or 0) if latest else 0
+    return stats
 
 
 class DatabaseManager:
@@ -16,38 +115,58 @@ class DatabaseManager:
     
     def __init__(self):
         """初始化数据库管理器"""
-        if not check_database_exists():
-            init_database()
         self.ensure_database_ready()
+        self.metrics = metrics.REGISTRY
+        self.log = get_logger('db')
+        # 文章派生指标的刷新节流（见 refresh_article_metrics）
+        self._metrics_refreshed_at = time.monotonic()
+        self._metrics_lock = threading.Lock()
     
     def ensure_database_ready(self):
-        """确保数据库已准备好"""
-        conn = get_connection()
-        cursor = conn.cursor()
-        # 检查表是否存在
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
-        tables = cursor.fetchall()
-        conn.close()
-        
-        if len(tables) < 6:  # 应该有6个表
-            init_database()
+        """确保数据库已准备好（按表结构版本判断，每个进程只检查一次）"""
+        ensure_schema()
     
     # ==================== 原始数据操作 ====================
     
+    def _raw_connection(self, api_type: str, request_key: str):
+        """原始响应所在库的连接（启用分片时为对应分片文件）"""
+        router = get_router()
+        if router is None:
+            return get_connection()
+        return router.connect(router.shard_for_raw(api_type, request_key))
+    
+    def _query_raw_all(self, sql: str, params: Tuple = ()) -> List:
+        """
+        在所有保存原始响应的库上执行查询（sql 中用 {db} 表示库名）
+        未启用分片时只查询主库
+        """
+        router = get_router()
+        if router is not None:
+            return list(router.query_all(sql, params))
+        conn = get_connection()
+        try:
+            return conn.execute(sql.format(db='main'), params).fetchall()
+        finally:
+            conn.close()
+    
+    @db_timed
     def save_raw_response(self, api_type: str, request_key: str, 
-                          request_params: Dict, response_data: Dict) -> bool:
+                          request_params: Dict, response_data: Dict,
+                          key_id: str = None) -> bool:
         """
         保存API原始响应（最重要！）
+        Args:
+            key_id: 付费密钥的指纹
         """
-        conn = get_connection()
+        conn = self._raw_connection(api_type, request_key)
         cursor = conn.cursor()
         
         try:
             cursor.execute('''
                 INSERT OR REPLACE INTO api_raw_responses 
                 (api_type, request_key, request_params, response_data, 
-                 response_code, cost_money, remain_money)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
+                 response_code, cost_money, remain_money, key_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 api_type,
                 request_key,
@@ -55,26 +174,40 @@ class DatabaseManager:
                 json.dumps(response_data, ensure_ascii=False),
                 response_data.get('code', -1),
                 response_data.get('cost_money', 0),
-                response_data.get('remain_money', 0)
+                response_data.get('remain_money', 0),
+                key_id
             ))
             conn.commit()
             return True
         except Exception as e:
-            print(f"❌ 保存原始响应失败: {e}")
+            self.log.error(f"❌ 保存原始响应失败: {e}", error=type(e).__name__,
+                           api_type=api_type, request_key=request_key)
             conn.rollback()
             return False
         finally:
             conn.close()
     
+    @db_timed
     def get_raw_response(self, api_type: str, request_key: str) -> Optional[Dict]:
-        """获取原始响应数据"""
-        conn = get_connection()
+        """
+        获取原始响应数据（超过该接口缓存有效期的视为未命中）
+        code 101（文章已删除或违规）是永久结果，不受有效期限制
+        """
+        conn = self._raw_connection(api_type, request_key)
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT response_data FROM api_raw_responses
-            WHERE api_type = ? AND request_key = ?
-        ''', (api_type, request_key))
+        ttl = RAW_CACHE_TTL.get(api_type)
+        if ttl:
+            cursor.execute('''
+                SELECT response_data FROM api_raw_responses
+                WHERE api_type = ? AND request_key = ?
+                  AND (created_at >= datetime('now', ?) OR response_code = 101)
+            ''', (api_type, request_key, f'-{int(ttl)} seconds'))
+        else:
+            cursor.execute('''
+                SELECT response_data FROM api_raw_responses
+                WHERE api_type = ? AND request_key = ?
+            ''', (api_type, request_key))
         
         row = cursor.fetchone()
         conn.close()
@@ -85,6 +218,7 @@ class DatabaseManager:
     
     # ==================== 公众号操作 ====================
     
+    @db_timed
     def save_account(self, biz: str, nick_name: str, ghid: str = None) -> int:
         """保存或更新公众号信息"""
         conn = get_connection()
@@ -111,15 +245,17 @@ class DatabaseManager:
             result = cursor.fetchone()
             return result['id']
         except Exception as e:
-            print(f"❌ 保存公众号失败: {e}")
+            self.log.error(f"❌ 保存公众号失败: {e}", error=type(e).__name__,
+                           biz=biz)
             conn.rollback()
             return -1
         finally:
             conn.close()
     
+    @db_timed
     def update_account_progress(self, biz: str, last_page: int, 
                                 stop_flag: bool = False) -> bool:
-        """更新公众号采集进度"""
+        """更新公众号采集进度（列表采集完成时同时推进增量同步边界 list_synced_at）"""
         conn = get_connection()
         cursor = conn.cursor()
         
@@ -128,18 +264,21 @@ class DatabaseManager:
                 UPDATE accounts 
                 SET last_page = ?, stop_flag = ?, 
                     last_fetch_time = CURRENT_TIMESTAMP,
+                    list_synced_at = CASE WHEN ? THEN CURRENT_TIMESTAMP ELSE list_synced_at END,
                     updated_at = CURRENT_TIMESTAMP
                 WHERE biz = ?
-            ''', (last_page, stop_flag, biz))
+            ''', (last_page, stop_flag, stop_flag, biz))
             conn.commit()
             return True
         except Exception as e:
-            print(f"❌ 更新公众号进度失败: {e}")
+            self.log.error(f"❌ 更新公众号进度失败: {e}", error=type(e).__name__,
+                           biz=biz)
             conn.rollback()
             return False
         finally:
             conn.close()
     
+    @db_timed
     def get_account_info(self, biz: str) -> Optional[Dict]:
         """获取公众号信息"""
         conn = get_connection()
@@ -153,23 +292,162 @@ class DatabaseManager:
             return dict(row)
         return None
     
-    def get_pending_accounts(self) -> List[Dict]:
+    @db_timed
+    def _fetch_pending_accounts_page(self, after_id: int, limit: int) -> List[AccountRecord]:
+        conn = get_connection()
+        try:
+            rows = conn.execute(f'''
+                SELECT {', '.join(AccountRecord.__slots__)} FROM accounts
+                WHERE status != 'completed' AND stop_flag = 0 AND id > ?
+                ORDER BY id
+                LIMIT ?
+            ''', (after_id, limit)).fetchall()
+        finally:
+            conn.close()
+        return [AccountRecord(row) for row in rows]
+    
+    def iter_pending_accounts(self, page_size: int = ITER_PAGE_SIZE) -> Iterator[AccountRecord]:
+        """
+        逐个返回待处理的公众号（按 id 分页）
+        updated_at 会在处理过程中被改写，不能作为分页游标，否则已处理的公众号会再次出现
+        """
+        after_id = 0
+        while True:
+            page = self._fetch_pending_accounts_page(after_id, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            after_id = page[-1].id
+    
+    def get_pending_accounts(self) -> List[AccountRecord]:
         """获取待处理的公众号列表"""
+        return list(self.iter_pending_accounts())
+    
+    # ==================== 公众号登记表 ====================
+    
+    @db_timed
+    def upsert_registry_accounts(self, entries: List[Dict]) -> int:
+        """
+        批量登记公众号（一个事务）
+        Args:
+            entries: 每项包含 biz，可选 nick_name/priority/enabled/*_interval/tags；
+                     值为 None 的字段保留原值，tags 不为 None 时整体替换该公众号的标签
+        Returns:
+            登记的条数，失败返回 -1
+        """
+        rows = [dict({field: None for field in REGISTRY_FIELDS}, **entry) for entry in entries]
         conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM accounts 
-            WHERE status != 'completed' AND stop_flag = 0
-            ORDER BY updated_at
-        ''')
-        rows = cursor.fetchall()
-        conn.close()
-        
+        try:
+            conn.executemany('''
+                INSERT INTO account_registry
+                (biz, nick_name, priority, enabled, sync_interval, stats_interval, detail_interval)
+                VALUES (:biz, IFNULL(:nick_name, :biz), IFNULL(:priority, 0), IFNULL(:enabled, 1),
+                        :sync_interval, :stats_interval, :detail_interval)
+                ON CONFLICT(biz) DO UPDATE SET
+                    nick_name = IFNULL(:nick_name, nick_name),
+                    priority = IFNULL(:priority, priority),
+                    enabled = IFNULL(:enabled, enabled),
+                    sync_interval = IFNULL(:sync_interval, sync_interval),
+                    stats_interval = IFNULL(:stats_interval, stats_interval),
+                    detail_interval = IFNULL(:detail_interval, detail_interval),
+                    updated_at = CURRENT_TIMESTAMP
+            ''', [{key: row[key] for key in ('biz',) + REGISTRY_FIELDS} for row in rows])
+            
+            tagged = [row for row in rows if row.get('tags') is not None]
+            conn.executemany('DELETE FROM account_tags WHERE biz = ?',
+                             [(row['biz'],) for row in tagged])
+            conn.executemany('INSERT OR IGNORE INTO account_tags (tag, biz) VALUES (?, ?)',
+                             [(tag, row['biz']) for row in tagged for tag in row['tags']])
+            conn.commit()
+            return len(rows)
+        except Exception as e:
+            self.log.error(f"❌ 登记公众号失败: {e}", error=type(e).__name__, count=len(rows))
+            conn.rollback()
+            return -1
+        finally:
+            conn.close()
+    
+    @db_timed
+    def seed_account_registry(self, accounts: List[Tuple[str, str]]) -> int:
+        """
+        登记表为空时，用给定的公众号和已采集过的公众号初始化
+        Returns:
+            新登记的条数（登记表不为空时为 0）
+        """
+        conn = get_connection()
+        try:
+            if conn.execute('SELECT 1 FROM account_registry LIMIT 1').fetchone():
+                return 0
+            conn.executemany('INSERT OR IGNORE INTO account_registry (biz, nick_name) VALUES (?, ?)',
+                             accounts)
+            conn.execute('''
+                INSERT OR IGNORE INTO account_registry (biz, nick_name)
+                SELECT biz, nick_name FROM accounts
+            ''')
+            count = conn.execute('SELECT COUNT(*) FROM account_registry').fetchone()[0]
+            conn.commit()
+            return count
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_registry_accounts(self, tag: str = None, enabled_only: bool = True) -> List[Dict]:
+        """
+        登记的公众号（按优先级从高到低），附带标签和采集进度
+        未开始采集的公众号 account_id / stop_flag / last_page 为 None
+        """
+        join = 'JOIN account_tags tg ON tg.biz = r.biz AND tg.tag = ?' if tag else ''
+        where = 'WHERE r.enabled = 1' if enabled_only else ''
+        conn = get_connection()
+        try:
+            rows = conn.execute(f'''
+                SELECT r.*, a.id AS account_id, a.stop_flag, a.last_page,
+                       (SELECT group_concat(t.tag, ',') FROM account_tags t
+                        WHERE t.biz = r.biz) AS tags
+                FROM account_registry r
+                {join}
+                LEFT JOIN accounts a ON a.biz = r.biz
+                {where}
+                ORDER BY r.priority DESC, r.biz
+            ''', (tag,) if tag else ()).fetchall()
+        finally:
+            conn.close()
         return [dict(row) for row in rows]
     
+    @db_timed
+    def get_unstarted_accounts(self, tag: str = None) -> List[Tuple[str, str]]:
+        """登记且启用、但还没有采集记录的公众号（按优先级）"""
+        join = 'JOIN account_tags tg ON tg.biz = r.biz AND tg.tag = ?' if tag else ''
+        conn = get_connection()
+        try:
+            rows = conn.execute(f'''
+                SELECT r.biz, r.nick_name FROM account_registry r
+                {join}
+                WHERE r.enabled = 1
+                  AND NOT EXISTS (SELECT 1 FROM accounts a WHERE a.biz = r.biz)
+                ORDER BY r.priority DESC, r.biz
+            ''', (tag,) if tag else ()).fetchall()
+        finally:
+            conn.close()
+        return [(row['biz'], row['nick_name']) for row in rows]
+    
+    @db_timed
+    def set_registry_enabled(self, bizs: List[str], enabled: bool) -> int:
+        """启用或停用公众号，返回更新的条数"""
+        conn = get_connection()
+        try:
+            cursor = conn.executemany('''
+                UPDATE account_registry SET enabled = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE biz = ?
+            ''', [(int(enabled), biz) for biz in bizs])
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+    
     # ==================== 文章操作 ====================
     
+    @db_timed
     def save_article_from_list(self, account_id: int, article_data: Dict) -> int:
         """
         从接口一保存文章基本信息
@@ -179,25 +457,15 @@ class DatabaseManager:
         
         try:
             # 提取核心字段
-            url = article_data.get('url')
-            title = article_data.get('title')
-            digest = article_data.get('digest')
-            post_time_str = article_data.get('post_time_str')
-            post_time = article_data.get('post_time')
-            original = article_data.get('original', 0)
+            row = parsers.article_list_row(article_data)
+            url = row[0]
             
             cursor.execute('''
                 INSERT OR IGNORE INTO articles 
                 (account_id, url, title, digest, post_time_str, post_time, 
                  original, position, cover_url, appmsgid, fetch_status)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'list_only')
-            ''', (
-                account_id, url, title, digest, post_time_str, post_time,
-                original, 
-                article_data.get('position'),
-                article_data.get('cover_url'),
-                article_data.get('appmsgid')
-            ))
+            ''', (account_id,) + row)
             
             if cursor.rowcount == 0:
                 # 文章已存在，获取其ID
@@ -210,12 +478,14 @@ class DatabaseManager:
             conn.commit()
             return article_id
         except Exception as e:
-            print(f"❌ 保存文章失败: {e}")
+            self.log.error(f"❌ 保存文章失败: {e}", error=type(e).__name__,
+                           account_id=account_id)
             conn.rollback()
             return -1
         finally:
             conn.close()
     
+    @db_timed
     def save_article_stats(self, article_url: str, stats_data: Dict) -> bool:
         """
         保存文章统计数据（接口二）
@@ -229,7 +499,7 @@ class DatabaseManager:
             article = cursor.fetchone()
             
             if not article:
-                print(f"⚠️ 文章不存在: {article_url}")
+                self.log.warning(f"⚠️ 文章不存在: {article_url}", url=article_url)
                 return False
             
             article_id = article['id']
@@ -240,33 +510,58 @@ class DatabaseManager:
                 (article_id, read_num, zan, looking, share_num, 
                  collect_num, comment_count)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                article_id,
-                stats_data.get('read', 0),
-                stats_data.get('zan', 0),
-                stats_data.get('looking', 0),
-                stats_data.get('share_num', 0),
-                stats_data.get('collect_num', 0),
-                stats_data.get('comment_count', 0)
-            ))
+            ''', (article_id,) + parsers.stats_row(stats_data))
             
-            # 更新文章状态
+            # 更新文章状态（刷新已采集文章的统计数据时保留原状态）
             cursor.execute('''
                 UPDATE articles 
-                SET fetch_status = 'stats_fetched', 
+                SET fetch_status = CASE WHEN fetch_status = 'list_only'
+                                        THEN 'stats_fetched' ELSE fetch_status END, 
                     updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
             ''', (article_id,))
             
+            # 所属公众号的派生指标需要重算
+            cursor.execute('''
+                INSERT OR IGNORE INTO article_metrics_dirty (account_id)
+                SELECT account_id FROM articles WHERE id = ?
+            ''', (article_id,))
+            
             conn.commit()
+            metrics.STAGE_ITEMS.inc(stage='stats')
+            self._maybe_refresh_metrics()
             return True
         except Exception as e:
-            print(f"❌ 保存文章统计失败: {e}")
+            self.log.error(f"❌ 保存文章统计失败: {e}", error=type(e).__name__,
+                           url=article_url)
             conn.rollback()
             return False
         finally:
             conn.close()
     
+    @db_timed
+    def get_article_content(self, article_url: str) -> Optional[Dict]:
+        """读取文章内容（启用分片时从文章所在分片读取）"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT id FROM articles WHERE url = ?', (article_url,))
+        article = cursor.fetchone()
+        
+        router = get_router()
+        if article and router is not None:
+            conn.close()
+            conn = router.connect(router.shard_for_article(article_url))
+            cursor = conn.cursor()
+        try:
+            if not article:
+                return None
+            cursor.execute('SELECT * FROM article_contents WHERE article_id = ?', (article['id'],))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+    
+    @db_timed
     def save_article_content(self, article_url: str, content_data: Dict) -> bool:
         """
         保存文章内容（接口三）
@@ -280,78 +575,135 @@ class DatabaseManager:
             article = cursor.fetchone()
             
             if not article:
-                print(f"⚠️ 文章不存在: {article_url}")
+                self.log.warning(f"⚠️ 文章不存在: {article_url}", url=article_url)
                 return False
             
             article_id = article['id']
             
-            # 保存内容
-            cursor.execute('''
-                INSERT OR REPLACE INTO article_contents 
-                (article_id, title, content, content_html, 
-                 copyright_stat, source_url, ip_wording)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                article_id,
-                content_data.get('title'),
-                content_data.get('content'),
-                content_data.get('content_multi_text'),
-                content_data.get('copyright_stat'),
-                content_data.get('source_url'),
-                content_data.get('ip_wording')
-            ))
+            # 保存内容（启用分片时写入文章所在分片，先于主库状态提交）
+            router = get_router()
+            if router is None:
+                content_conn = conn
+            else:
+                content_conn = router.connect(router.shard_for_article(article_url))
+            try:
+                content_conn.execute('''
+                    INSERT OR REPLACE INTO article_contents 
+                    (article_id, title, content, content_html, 
+                     copyright_stat, source_url, ip_wording,
+                     picture_urls, video_urls)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (article_id,) + parsers.content_row(content_data))
+                if content_conn is not conn:
+                    content_conn.commit()
+            finally:
+                if content_conn is not conn:
+                    content_conn.close()
             
-            # 更新文章状态
+            # 更新文章状态（作者只在接口三中返回）
             cursor.execute('''
                 UPDATE articles 
                 SET fetch_status = 'content_fetched', 
+                    author = COALESCE(?, author),
                     updated_at = CURRENT_TIMESTAMP
                 WHERE id = ?
-            ''', (article_id,))
+            ''', (parsers.content_author(content_data), article_id))
             
             conn.commit()
+            metrics.STAGE_ITEMS.inc(stage='content')
             return True
         except Exception as e:
-            print(f"❌ 保存文章内容失败: {e}")
+            self.log.error(f"❌ 保存文章内容失败: {e}", error=type(e).__name__,
+                           url=article_url)
             conn.rollback()
             return False
         finally:
             conn.close()
     
-    def get_articles_by_status(self, account_id: int, status: str) -> List[Dict]:
-        """获取指定状态的文章列表"""
+    @db_timed
+    def _fetch_articles_page(self, account_id: int, condition: str, params: tuple,
+                             after: Optional[Tuple[str, int]], limit: int) -> List[ArticleRecord]:
+        """
+        按 (post_time_str, id) 倒序取一页文章，after 为上一页最后一行的键
+        排序表达式与 idx_articles_account_time 一致，翻页是索引上的范围查找
+        """
+        keyset = ''
+        if after is not None:
+            # 展开写法：行值比较 (a, id) < (?, ?) 不会被用作表达式索引的范围条件
+            keyset = ("AND IFNULL(post_time_str, '') <= ? "
+                      "AND (IFNULL(post_time_str, '') < ? OR id < ?)")
+            params = params + (after[0], after[0], after[1])
         conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM articles 
-            WHERE account_id = ? AND fetch_status = ?
-            ORDER BY post_time_str DESC
-        ''', (account_id, status))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in rows]
+        try:
+            rows = conn.execute(f'''
+                SELECT {', '.join(ArticleRecord.__slots__)} FROM articles
+                WHERE account_id = ? AND {condition} {keyset}
+                ORDER BY IFNULL(post_time_str, '') DESC, id DESC
+                LIMIT ?
+            ''', (account_id,) + params + (limit,)).fetchall()
+        finally:
+            conn.close()
+        return [ArticleRecord(row) for row in rows]
     
-    def get_unfetched_articles(self, account_id: int) -> List[Dict]:
-        """获取未完成采集的文章"""
+    def _iter_articles(self, account_id: int, condition: str, params: tuple,
+                       page_size: int) -> Iterator[ArticleRecord]:
+        after = None
+        while True:
+            page = self._fetch_articles_page(account_id, condition, params, after, page_size)
+            yield from page
+            if len(page) < page_size:
+                return
+            last = page[-1]
+            after = (last.post_time_str or '', last.id)
+    
+    def iter_articles_by_status(self, account_id: int, status: str,
+                                page_size: int = ITER_PAGE_SIZE) -> Iterator[ArticleRecord]:
+        """逐篇返回指定状态的文章（按发布时间倒序，分页查询，内存占用与文章数无关）"""
+        return self._iter_articles(account_id, 'fetch_status = ?', (status,), page_size)
+    
+    def iter_unfetched_articles(self, account_id: int,
+                                page_size: int = ITER_PAGE_SIZE) -> Iterator[ArticleRecord]:
+        """
+        逐篇返回未完成采集的文章（按发布时间倒序）
+        遍历期间文章状态被更新也不影响翻页：游标只依赖发布时间和 id
+        """
+        return self._iter_articles(account_id, "fetch_status != 'content_fetched'", (), page_size)
+    
+    def iter_stale_stats_articles(self, account_id: int, since: str, max_age: float,
+                                  page_size: int = ITER_PAGE_SIZE) -> Iterator[ArticleRecord]:
+        """
+        逐篇返回统计数据需要刷新的文章：发布时间不早于 since，
+        且统计数据获取时间已超过 max_age 秒（守护进程定时刷新阅读数用）
+        """
+        return self._iter_articles(account_id, '''
+            fetch_status != 'list_only' AND post_time_str >= ?
+            AND id IN (SELECT article_id FROM article_stats
+                       WHERE fetched_at <= datetime('now', ?))
+        ''', (since, f"-{int(max_age)} seconds"), page_size)
+    
+    @db_timed
+    def count_unfetched_articles(self, account_id: int) -> int:
+        """未完成采集的文章数"""
         conn = get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT * FROM articles 
-            WHERE account_id = ? AND fetch_status != 'content_fetched'
-            ORDER BY post_time_str DESC
-        ''', (account_id,))
-        
-        rows = cursor.fetchall()
-        conn.close()
-        
-        return [dict(row) for row in rows]
+        try:
+            return conn.execute('''
+                SELECT COUNT(*) FROM articles
+                WHERE account_id = ? AND fetch_status != 'content_fetched'
+            ''', (account_id,)).fetchone()[0]
+        finally:
+            conn.close()
+    
+    def get_articles_by_status(self, account_id: int, status: str) -> List[ArticleRecord]:
+        """获取指定状态的文章列表"""
+        return list(self.iter_articles_by_status(account_id, status))
+    
+    def get_unfetched_articles(self, account_id: int) -> List[ArticleRecord]:
+        """获取未完成采集的文章"""
+        return list(self.iter_unfetched_articles(account_id))
     
     # ==================== 进度管理 ====================
     
+    @db_timed
     def save_progress(self, task_id: str, account_biz: str = None, 
                       current_page: int = 0, current_article_url: str = None,
                       current_step: str = None, remain_money: float = None) -> bool:
@@ -371,12 +723,14 @@ class DatabaseManager:
             conn.commit()
             return True
         except Exception as e:
-            print(f"❌ 保存进度失败: {e}")
+            self.log.error(f"❌ 保存进度失败: {e}", error=type(e).__name__,
+                           task_id=task_id)
             conn.rollback()
             return False
         finally:
             conn.close()
     
+    @db_timed
     def get_last_progress(self, task_id: str) -> Optional[Dict]:
         """获取最后的进度"""
         conn = get_connection()
@@ -396,41 +750,957 @@ class DatabaseManager:
             return dict(row)
         return None
     
-    # ==================== 统计查询 ====================
+    # ==================== 重试队列 ====================
     
-    def get_statistics(self) -> Dict:
-        """获取统计信息"""
+    @db_timed
+    def get_retry_entry(self, api_type: str, request_key: str) -> Optional[Dict]:
+        """获取重试队列中的记录"""
         conn = get_connection()
         cursor = conn.cursor()
         
-        stats = {}
+        cursor.execute('''
+            SELECT * FROM retry_queue WHERE api_type = ? AND request_key = ?
+        ''', (api_type, request_key))
         
-        # 公众号统计
-        cursor.execute('SELECT COUNT(*) as total FROM accounts')
-        stats['total_accounts'] = cursor.fetchone()['total']
+        row = cursor.fetchone()
+        conn.close()
         
-        cursor.execute("SELECT COUNT(*) as completed FROM accounts WHERE status = 'completed'")
-        stats['completed_accounts'] = cursor.fetchone()['completed']
+        return dict(row) if row else None
+    
+    @db_timed
+    def save_retry_entry(self, api_type: str, request_key: str, error_class: str,
+                         last_error: str, attempts: int, delay: float,
+                         status: str = 'pending') -> bool:
+        """
+        记录一次失败请求
+        Args:
+            attempts: 累计失败次数
+            delay: 距下次重试的秒数
+            status: pending 等待重试 / dead 永久失败不再重试
+        """
+        conn = get_connection()
+        cursor = conn.cursor()
         
-        # 文章统计
-        cursor.execute('SELECT COUNT(*) as total FROM articles')
-        stats['total_articles'] = cursor.fetchone()['total']
+        try:
+            cursor.execute('''
+                INSERT INTO retry_queue
+                (api_type, request_key, error_class, last_error, attempts,
+                 next_attempt_at, status)
+                VALUES (?, ?, ?, ?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now', ?), ?)
+                ON CONFLICT(api_type, request_key) DO UPDATE SET
+                    error_class = excluded.error_class,
+                    last_error = excluded.last_error,
+                    attempts = excluded.attempts,
+                    next_attempt_at = excluded.next_attempt_at,
+                    status = excluded.status,
+                    updated_at = CURRENT_TIMESTAMP
+            ''', (api_type, request_key, error_class, (last_error or '')[:500], attempts,
+                  f'+{delay:.3f} seconds', status))
+            conn.commit()
+            return True
+        except Exception as e:
+            self.log.error(f"❌ 保存重试记录失败: {e}", error=type(e).__name__,
+                           api_type=api_type, request_key=request_key)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+    
+    @db_timed
+    def update_retry_status(self, api_type: str, request_key: str, status: str,
+                            error_class: str = None, last_error: str = None):
+        """把待重试记录标记为 done 或 dead"""
+        conn = get_connection()
+        cursor = conn.cursor()
         
-        cursor.execute("SELECT COUNT(*) as fetched FROM articles WHERE fetch_status = 'content_fetched'")
-        stats['fetched_articles'] = cursor.fetchone()['fetched']
+        cursor.execute('''
+            UPDATE retry_queue
+            SET status = ?,
+                error_class = COALESCE(?, error_class),
+                last_error = COALESCE(?, last_error),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE api_type = ? AND request_key = ? AND status = 'pending'
+        ''', (status, error_class, last_error, api_type, request_key))
         
-        # API调用统计
-        cursor.execute('SELECT SUM(cost_money) as total_cost FROM api_raw_responses')
-        result = cursor.fetchone()
-        stats['total_cost'] = result['total_cost'] if result['total_cost'] else 0
+        conn.commit()
+        conn.close()
+    
+    @db_timed
+    def get_due_retries(self, limit: int = 100) -> List[Dict]:
+        """获取已到重试时间的请求，按到期时间排序"""
+        conn = get_connection()
+        cursor = conn.cursor()
         
-        cursor.execute('SELECT remain_money FROM api_raw_responses ORDER BY created_at DESC LIMIT 1')
-        result = cursor.fetchone()
-        stats['current_balance'] = result['remain_money'] if result else 0
+        cursor.execute('''
+            SELECT * FROM retry_queue
+            WHERE status = 'pending'
+              AND next_attempt_at <= strftime('%Y-%m-%d %H:%M:%f', 'now')
+            ORDER BY next_attempt_at
+            LIMIT ?
+        ''', (limit,))
         
+        rows = cursor.fetchall()
         conn.close()
-        return stats
+        
+        return [dict(row) for row in rows]
+    
+    @db_timed
+    def get_next_retry_delay(self) -> Optional[float]:
+        """距离最近一个待重试请求到期的秒数；没有待重试请求时返回 None"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT (julianday(MIN(next_attempt_at)) - julianday('now')) * 86400 AS delay
+            FROM retry_queue WHERE status = 'pending'
+        ''')
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        if row['delay'] is None:
+            return None
+        return max(0.0, row['delay'])
+    
+    @db_timed
+    def get_work_remaining(self) -> Dict[str, int]:
+        """剩余工作量：待获取统计、待获取正文的文章数和待重试的请求数（进度显示用）"""
+        conn = get_connection()
+        try:
+            remaining = {'list_only': 0, 'stats_fetched': 0}
+            for row in conn.execute('''
+                SELECT fetch_status, COUNT(*) FROM articles
+                WHERE fetch_status IN ('list_only', 'stats_fetched')
+                GROUP BY fetch_status
+            '''):
+                remaining[row[0]] = row[1]
+            remaining['retry_pending'] = conn.execute(
+                "SELECT COUNT(*) FROM retry_queue WHERE status = 'pending'").fetchone()[0]
+            return remaining
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_retry_summary(self) -> Dict[str, int]:
+        """按状态统计重试队列"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT status, COUNT(*) AS count FROM retry_queue GROUP BY status')
+        summary = {row['status']: row['count'] for row in cursor.fetchall()}
+        
+        conn.close()
+        return summary
+    
+    # ==================== 工作单元（多进程租约） ====================
+    
+    @db_timed
+    def enqueue_work_units(self, units: List[Tuple[str, str, str]]) -> int:
+        """
+        添加工作单元（已存在的忽略）
+        Args:
+            units: [(unit_type, unit_key, account_biz), ...]
+        Returns:
+            新增数量
+        """
+        if not units:
+            return 0
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            before = conn.total_changes
+            cursor.executemany('''
+                INSERT OR IGNORE INTO work_units (unit_type, unit_key, account_biz)
+                VALUES (?, ?, ?)
+            ''', units)
+            conn.commit()
+            return conn.total_changes - before
+        except Exception as e:
+            self.log.error(f"❌ 添加工作单元失败: {e}", error=type(e).__name__)
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    @db_timed
+    def claim_work_unit(self, owner: str, lease_seconds: float) -> Optional[Dict]:
+        """
+        领取一个工作单元：待处理的，或租约已过期的（原持有者已崩溃）
+        列表页优先，保证新文章尽早进入详情队列
+        """
+        conn = get_connection()
+        conn.isolation_level = None
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('''
+                UPDATE work_units
+                SET status = 'leased',
+                    lease_owner = ?,
+                    lease_expires_at = strftime('%Y-%m-%d %H:%M:%f', 'now', ?),
+                    attempts = attempts + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id = (
+                    SELECT id FROM work_units
+                    WHERE status = 'pending'
+                       OR (status = 'leased'
+                           AND lease_expires_at < strftime('%Y-%m-%d %H:%M:%f', 'now'))
+                    ORDER BY unit_type = 'detail', id
+                    LIMIT 1
+                )
+                RETURNING *
+            ''', (owner, f'+{lease_seconds:.3f} seconds'))
+            row = cursor.fetchone()
+            cursor.execute('COMMIT')
+            return dict(row) if row else None
+        except Exception:
+            if conn.in_transaction:
+                cursor.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+    
+    @db_timed
+    def renew_work_lease(self, unit_id: int, owner: str, lease_seconds: float) -> bool:
+        """心跳续租；租约已被他人接管时返回 False"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE work_units
+            SET lease_expires_at = strftime('%Y-%m-%d %H:%M:%f', 'now', ?)
+            WHERE id = ? AND lease_owner = ? AND status = 'leased'
+        ''', (f'+{lease_seconds:.3f} seconds', unit_id, owner))
+        renewed = cursor.rowcount == 1
+        
+        conn.commit()
+        conn.close()
+        return renewed
+    
+    @db_timed
+    def finish_work_unit(self, unit_id: int, owner: str, status: str,
+                         error: str = None) -> bool:
+        """
+        结束租约
+        Args:
+            status: done 完成 / failed 放弃 / pending 释放给其他进程重新领取
+        """
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            UPDATE work_units
+            SET status = ?, last_error = COALESCE(?, last_error),
+                lease_owner = NULL, lease_expires_at = NULL,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND lease_owner = ? AND status = 'leased'
+        ''', (status, error, unit_id, owner))
+        finished = cursor.rowcount == 1
+        
+        conn.commit()
+        conn.close()
+        return finished
+    
+    @db_timed
+    def get_work_summary(self) -> Dict[str, Dict[str, int]]:
+        """按类型和状态统计工作单元（租约过期的单独计为 expired）"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT unit_type,
+                   CASE WHEN status = 'leased'
+                             AND lease_expires_at < strftime('%Y-%m-%d %H:%M:%f', 'now')
+                        THEN 'expired' ELSE status END AS state,
+                   COUNT(*) AS count
+            FROM work_units
+            GROUP BY unit_type, state
+        ''')
+        summary = {}
+        for row in cursor.fetchall():
+            summary.setdefault(row['unit_type'], {})[row['state']] = row['count']
+        
+        conn.close()
+        return summary
+    
+    # ==================== 图片资源 ====================
+    
+    @db_timed
+    def get_articles_without_images(self, limit: int = 500, after_id: int = 0) -> List[Dict]:
+        """已获取全文但还没有登记图片的文章（按 id 分页，after_id 为上一页最后的 id）"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT a.id, a.url, a.cover_url FROM articles a
+            WHERE a.id > ? AND a.fetch_status = 'content_fetched'
+              AND a.images_registered_at IS NULL
+            ORDER BY a.id
+            LIMIT ?
+        ''', (after_id, limit))
+        
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    @db_timed
+    def save_article_images(self, rows: List[Tuple], article_ids: List[int] = ()) -> int:
+        """
+        登记文章图片
+        Args:
+            rows: [(article_id, role, position, url, width, height), ...]
+            article_ids: 本批处理过的文章（包括没有图片的），同一事务中标记为已登记
+        """
+        if not rows and not article_ids:
+            return 0
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            before = conn.total_changes
+            cursor.executemany('''
+                INSERT OR IGNORE INTO article_images
+                (article_id, role, position, url, width, height)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', rows)
+            # 其他文章已下载过的相同URL直接关联
+            cursor.execute('''
+                UPDATE article_images
+                SET sha256 = (SELECT d.sha256 FROM article_images d
+                              WHERE d.url = article_images.url AND d.status = 'done' LIMIT 1),
+                    status = 'done', fetched_at = CURRENT_TIMESTAMP
+                WHERE status = 'pending'
+                  AND EXISTS (SELECT 1 FROM article_images d
+                              WHERE d.url = article_images.url AND d.status = 'done')
+            ''')
+            registered = conn.total_changes - before
+            cursor.executemany('''
+                UPDATE articles SET images_registered_at = CURRENT_TIMESTAMP WHERE id = ?
+            ''', [(article_id,) for article_id in article_ids])
+            conn.commit()
+            return registered
+        except Exception as e:
+            self.log.error(f"❌ 登记文章图片失败: {e}", error=type(e).__name__)
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_pending_image_urls(self, limit: int = None, retry_failed: bool = False) -> List[str]:
+        """待下载的图片URL（去重），limit 为 None 表示全部"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        statuses = ('pending', 'failed') if retry_failed else ('pending',)
+        cursor.execute(f'''
+            SELECT url FROM article_images
+            WHERE status IN ({','.join('?' * len(statuses))})
+            GROUP BY url
+            ORDER BY MIN(id)
+            LIMIT ?
+        ''', statuses + (-1 if limit is None else limit,))
+        
+        urls = [row['url'] for row in cursor.fetchall()]
+        conn.close()
+        return urls
+    
+    @db_timed
+    def save_image_results(self, results: List[Dict]) -> bool:
+        """
+        批量保存下载结果（一个事务）
+        Args:
+            results: [{'url', 'sha256', 'path', 'size', 'content_type'} 或 {'url', 'error'}]
+        """
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            for result in results:
+                if result.get('error'):
+                    cursor.execute('''
+                        UPDATE article_images SET status = 'failed', error = ?
+                        WHERE url = ? AND status != 'done'
+                    ''', (result['error'][:500], result['url']))
+                    continue
+                cursor.execute('''
+                    INSERT OR IGNORE INTO image_assets
+                    (sha256, path, size, content_type, source_url)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (result['sha256'], result['path'], result['size'],
+                      result['content_type'], result['url']))
+                cursor.execute('''
+                    UPDATE article_images
+                    SET sha256 = ?, status = 'done', error = NULL,
+                        fetched_at = CURRENT_TIMESTAMP
+                    WHERE url = ?
+                ''', (result['sha256'], result['url']))
+            conn.commit()
+            return True
+        except Exception as e:
+            self.log.error(f"❌ 保存图片下载结果失败: {e}", error=type(e).__name__)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_image_summary(self) -> Dict:
+        """图片下载统计"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT status, COUNT(*) AS images, COUNT(DISTINCT url) AS urls
+            FROM article_images GROUP BY status
+        ''')
+        summary = {row['status']: {'images': row['images'], 'urls': row['urls']}
+                   for row in cursor.fetchall()}
+        cursor.execute('SELECT COUNT(*) AS files, COALESCE(SUM(size), 0) AS bytes FROM image_assets')
+        row = cursor.fetchone()
+        summary['assets'] = {'files': row['files'], 'bytes': row['bytes']}
+        
+        conn.close()
+        return summary
+    
+    # ==================== 正文结构 ====================
+    
+    @db_timed
+    def get_article_html_batch(self, after_id: int = 0, limit: int = 200) -> List[Dict]:
+        """按 article_id 顺序分批读取正文HTML（跨分片），after_id 为上一批最后的ID"""
+        rows = self._query_raw_all('''
+            SELECT article_id, content_html FROM {db}.article_contents
+            WHERE article_id > ? AND content_html IS NOT NULL
+            ORDER BY article_id
+            LIMIT ?
+        ''', (after_id, limit))
+        rows = sorted(rows, key=lambda row: row['article_id'])[:limit]
+        return [dict(row) for row in rows]
+    
+    @db_timed
+    def get_parsed_hashes(self, hashes: List[str], parser_version: int) -> set:
+        """已用当前解析器版本缓存过的内容哈希"""
+        if not hashes:
+            return set()
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT content_hash FROM parsed_contents
+            WHERE parser_version = ? AND content_hash IN ({','.join('?' * len(hashes))})
+        ''', [parser_version] + list(hashes))
+        
+        cached = {row['content_hash'] for row in cursor.fetchall()}
+        conn.close()
+        return cached
+    
+    @db_timed
+    def save_parsed_contents(self, parsed: List[Tuple], links: List[Tuple]) -> bool:
+        """
+        保存解析结果并关联文章（一个事务）
+        Args:
+            parsed: [(content_hash, parser_version, blocks_json, paragraph_count,
+                      heading_count, image_count, char_count), ...]
+            links: [(article_id, content_hash), ...]
+        """
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.executemany('''
+                INSERT OR REPLACE INTO parsed_contents
+                (content_hash, parser_version, blocks, paragraph_count,
+                 heading_count, image_count, char_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', parsed)
+            cursor.executemany('''
+                INSERT INTO article_structure (article_id, content_hash)
+                VALUES (?, ?)
+                ON CONFLICT(article_id) DO UPDATE SET
+                    content_hash = excluded.content_hash,
+                    parsed_at = CURRENT_TIMESTAMP
+                WHERE content_hash != excluded.content_hash
+            ''', links)
+            conn.commit()
+            return True
+        except Exception as e:
+            self.log.error(f"❌ 保存正文解析结果失败: {e}", error=type(e).__name__)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_article_structure(self, article_url: str) -> Optional[Dict]:
+        """文章的结构化正文（未解析时返回 None）"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT p.* FROM articles a
+            JOIN article_structure s ON s.article_id = a.id
+            JOIN parsed_contents p ON p.content_hash = s.content_hash
+            WHERE a.url = ?
+        ''', (article_url,))
+        
+        row = cursor.fetchone()
+        conn.close()
+        
+        if not row:
+            return None
+        result = dict(row)
+        result['blocks'] = json.loads(result['blocks'])
+        return result
+    
+    # ==================== 批次 ====================
+    
+    BATCH_FIELDS = ('name', 'last_mode', 'status', 'total_accounts', 'completed_accounts',
+                    'total_articles', 'fetched_articles', 'estimated_cost', 'actual_cost',
+                    'current_balance', 'phase', 'user_confirmed', 'confirm_time',
+                    'unfetched_count')
+    
+    @db_timed
+    def create_batch(self, batch_id: str, name: str, mode: str,
+                     initial_balance: float = None) -> bool:
+        """创建批次记录"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO batches (batch_id, name, initial_mode, last_mode,
+                                     initial_balance, current_balance)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (batch_id, name, mode, mode, initial_balance, initial_balance))
+            conn.commit()
+            return True
+        except Exception as e:
+            self.log.error(f"❌ 创建批次失败: {e}", error=type(e).__name__,
+                           batch_id=batch_id)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_batch(self, batch_id: str) -> Optional[Dict]:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM batches WHERE batch_id = ?', (batch_id,))
+        row = cursor.fetchone()
+        conn.close()
+        
+        return dict(row) if row else None
+    
+    @db_timed
+    def list_batches(self) -> List[Dict]:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('SELECT * FROM batches ORDER BY created_at, id')
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    @db_timed
+    def update_batch(self, batch_id: str, **fields) -> bool:
+        """更新批次字段（只允许 BATCH_FIELDS 中的字段）"""
+        unknown = set(fields) - set(self.BATCH_FIELDS)
+        if unknown:
+            raise ValueError(f"未知的批次字段: {', '.join(sorted(unknown))}")
+        if not fields:
+            return True
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            assignments = ', '.join(f"{column} = ?" for column in fields)
+            cursor.execute(f'''
+                UPDATE batches SET {assignments}, updated_at = CURRENT_TIMESTAMP
+                WHERE batch_id = ?
+            ''', list(fields.values()) + [batch_id])
+            conn.commit()
+            return cursor.rowcount > 0
+        except Exception as e:
+            self.log.error(f"❌ 更新批次失败: {e}", error=type(e).__name__,
+                           batch_id=batch_id)
+            conn.rollback()
+            return False
+        finally:
+            conn.close()
+    
+    @db_timed
+    def assign_accounts_to_batch(self, batch_id: str, accounts: List[Tuple[str, str]]) -> int:
+        """把公众号归入批次（不存在的先创建），返回公众号数"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.executemany('''
+                INSERT OR IGNORE INTO accounts (biz, nick_name) VALUES (?, ?)
+            ''', accounts)
+            cursor.executemany('''
+                UPDATE accounts SET batch_id = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE biz = ?
+            ''', [(batch_id, biz) for biz, _ in accounts])
+            conn.commit()
+            return len(accounts)
+        except Exception as e:
+            self.log.error(f"❌ 公众号归入批次失败: {e}", error=type(e).__name__,
+                           batch_id=batch_id)
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_batch_accounts(self, batch_id: str, need_list: bool = False) -> List[Dict]:
+        """
+        批次内的公众号；need_list 为 True 时只返回本批次还需要获取列表的：
+        列表未获取完，或列表在批次创建之前就已完成、本批次还没有增量同步过
+        """
+        condition = ('AND (acc.stop_flag = 0 OR acc.list_synced_at IS NULL '
+                     'OR acc.list_synced_at < b.created_at)') if need_list else ''
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute(f'''
+            SELECT acc.* FROM accounts acc
+            JOIN batches b ON b.batch_id = acc.batch_id
+            WHERE acc.batch_id = ? {condition}
+            ORDER BY acc.id
+        ''', (batch_id,))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    @db_timed
+    def claim_batch_articles(self, batch_id: str) -> int:
+        """批次公众号下尚未归属任何批次的文章（新列出的）归入该批次"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                UPDATE articles SET batch_id = ?
+                WHERE batch_id IS NULL
+                  AND account_id IN (SELECT id FROM accounts WHERE batch_id = ?)
+            ''', (batch_id, batch_id))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+    
+    @db_timed
+    def snapshot_batch(self, batch_id: str) -> int:
+        """把批次公众号下文章的当前状态和数据写入 batch_articles（已有快照则覆盖）"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                INSERT INTO batch_articles
+                (batch_id, article_id, account_id, fetch_status, read_num, zan,
+                 looking, share_num, collect_num, comment_count)
+                SELECT acc.batch_id, a.id, a.account_id, a.fetch_status, s.read_num, s.zan,
+                       s.looking, s.share_num, s.collect_num, s.comment_count
+                FROM accounts acc
+                JOIN articles a ON a.account_id = acc.id
+                LEFT JOIN article_stats s ON s.article_id = a.id
+                WHERE acc.batch_id = ?
+                ON CONFLICT(batch_id, article_id) DO UPDATE SET
+                    fetch_status = excluded.fetch_status,
+                    read_num = excluded.read_num,
+                    zan = excluded.zan,
+                    looking = excluded.looking,
+                    share_num = excluded.share_num,
+                    collect_num = excluded.collect_num,
+                    comment_count = excluded.comment_count,
+                    captured_at = CURRENT_TIMESTAMP
+            ''', (batch_id,))
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            self.log.error(f"❌ 保存批次快照失败: {e}", error=type(e).__name__,
+                           batch_id=batch_id)
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_batch_progress(self, batch_id: str) -> Dict:
+        """按当前数据统计批次进度（公众号数、文章数及各状态文章数）"""
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT COUNT(*) AS total_accounts,
+                   COALESCE(SUM(stop_flag), 0) AS completed_accounts
+            FROM accounts WHERE batch_id = ?
+        ''', (batch_id,))
+        progress = dict(cursor.fetchone())
+        
+        cursor.execute('''
+            SELECT a.fetch_status, COUNT(*) AS count
+            FROM articles a JOIN accounts acc ON acc.id = a.account_id
+            WHERE acc.batch_id = ?
+            GROUP BY a.fetch_status
+        ''', (batch_id,))
+        by_status = {row['fetch_status']: row['count'] for row in cursor.fetchall()}
+        conn.close()
+        
+        progress['by_status'] = by_status
+        progress['total_articles'] = sum(by_status.values())
+        progress['fetched_articles'] = by_status.get('content_fetched', 0)
+        return progress
+    
+    # ==================== 文章派生指标 ====================
+    
+    def _maybe_refresh_metrics(self):
+        """
+        距上次刷新超过 METRICS_REFRESH_INTERVAL 秒时重算待刷新的公众号
+        每次重算整个公众号，逐条写入时立即重算会变成 O(n²)，因此按时间合并
+        """
+        if time.monotonic() - self._metrics_refreshed_at < METRICS_REFRESH_INTERVAL:
+            return
+        # 并发写入时只需一个线程刷新
+        if not self._metrics_lock.acquire(blocking=False):
+            return
+        try:
+            self.refresh_article_metrics()
+        finally:
+            self._metrics_lock.release()
+    
+    @db_timed
+    def refresh_article_metrics(self, account_ids: List[int] = None, full: bool = False) -> int:
+        """
+        用窗口函数重算公众号内的排名、百分位、中位数、z分数和互动率
+        Args:
+            account_ids: 额外要重算的公众号（默认只重算 article_metrics_dirty 中的）
+            full: 重算所有有统计数据的公众号
+        Returns:
+            重算的公众号数
+        """
+        conn = get_connection()
+        # 标准差需要 sqrt，部分 SQLite 编译版本未启用数学函数
+        conn.create_function('sqrt', 1, math.sqrt, deterministic=True)
+        try:
+            # 写锁覆盖读取待刷新列表到清空列表的全过程，期间新标记的公众号不会丢失
+            conn.execute('BEGIN IMMEDIATE')
+            if full:
+                conn.execute('''
+                    INSERT OR IGNORE INTO article_metrics_dirty (account_id)
+                    SELECT DISTINCT art.account_id
+                    FROM article_stats s JOIN articles art ON art.id = s.article_id
+                ''')
+            if account_ids:
+                conn.executemany('INSERT OR IGNORE INTO article_metrics_dirty (account_id) VALUES (?)',
+                                 [(account_id,) for account_id in account_ids])
+            count = conn.execute('SELECT COUNT(*) FROM article_metrics_dirty').fetchone()[0]
+            if count:
+                conn.execute('''
+                    DELETE FROM article_metrics
+                    WHERE account_id IN (SELECT account_id FROM article_metrics_dirty)
+                ''')
+                conn.execute('''
+                    INSERT INTO article_metrics
+                    (article_id, account_id, read_num, read_rank, read_percentile,
+                     account_median, read_zscore, engagement_rate, zan_rate,
+                     looking_rate, share_rate)
+                    WITH s AS (
+                        SELECT st.article_id, art.account_id, st.read_num, st.zan, st.looking,
+                               st.share_num, st.collect_num, st.comment_count,
+                               ROW_NUMBER() OVER (PARTITION BY art.account_id
+                                                  ORDER BY st.read_num, st.article_id) AS rn,
+                               COUNT(*) OVER acc AS cnt,
+                               RANK() OVER (PARTITION BY art.account_id
+                                            ORDER BY st.read_num DESC) AS read_rank,
+                               PERCENT_RANK() OVER (PARTITION BY art.account_id
+                                                    ORDER BY st.read_num) AS read_percentile,
+                               AVG(st.read_num) OVER acc AS mean,
+                               AVG(st.read_num * st.read_num * 1.0) OVER acc AS mean_sq
+                        FROM article_stats st
+                        JOIN articles art ON art.id = st.article_id
+                        WHERE art.account_id IN (SELECT account_id FROM article_metrics_dirty)
+                        WINDOW acc AS (PARTITION BY art.account_id)
+                    ),
+                    med AS (
+                        -- 奇数篇取中间一篇，偶数篇取中间两篇的平均
+                        SELECT account_id, AVG(read_num) AS median
+                        FROM s WHERE rn IN ((cnt + 1) / 2, (cnt + 2) / 2)
+                        GROUP BY account_id
+                    )
+                    SELECT s.article_id, s.account_id, s.read_num, s.read_rank, s.read_percentile,
+                           med.median,
+                           (s.read_num - med.median)
+                               / NULLIF(sqrt(MAX(s.mean_sq - s.mean * s.mean, 0)), 0),
+                           (s.zan + s.looking + s.share_num + s.collect_num + s.comment_count)
+                               * 1.0 / NULLIF(s.read_num, 0),
+                           s.zan * 1.0 / NULLIF(s.read_num, 0),
+                           s.looking * 1.0 / NULLIF(s.read_num, 0),
+                           s.share_num * 1.0 / NULLIF(s.read_num, 0)
+                    FROM s JOIN med ON med.account_id = s.account_id
+                ''')
+                conn.execute('DELETE FROM article_metrics_dirty')
+            conn.commit()
+            self._metrics_refreshed_at = time.monotonic()
+            return count
+        except Exception as e:
+            self.log.error(f"❌ 刷新文章指标失败: {e}", error=type(e).__name__)
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_hot_articles(self, min_zscore: float = 2.0, account_id: int = None,
+                         limit: int = 50) -> List[Dict]:
+        """
+        相对所属公众号表现突出的文章（z分数从高到低）
+        指定公众号时按 (account_id, read_rank) 索引读取（同一公众号内z分数与排名顺序一致），
+        否则按 read_zscore 索引读取
+        """
+        conn = get_connection()
+        try:
+            sql = '''
+                SELECT m.article_id, m.account_id, art.title, art.url, art.post_time_str,
+                       acc.nick_name, m.read_num, m.read_rank, m.read_percentile,
+                       m.account_median, m.read_zscore, m.engagement_rate,
+                       m.zan_rate, m.looking_rate, m.share_rate
+                FROM article_metrics m
+                JOIN articles art ON art.id = m.article_id
+                JOIN accounts acc ON acc.id = m.account_id
+                WHERE m.read_zscore >= ?
+            '''
+            if account_id is None:
+                sql += ' ORDER BY m.read_zscore DESC LIMIT ?'
+                params = (min_zscore, limit)
+            else:
+                sql += ' AND m.account_id = ? ORDER BY m.read_rank LIMIT ?'
+                params = (min_zscore, account_id, limit)
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            conn.close()
+    
+    # ==================== 统计查询 ====================
+    
+    @db_timed
+    def get_statistics(self) -> Dict:
+        """获取统计信息"""
+        conn = get_connection()
+        try:
+            return query_statistics(conn)
+        finally:
+            conn.close()
+    
+    @db_timed
+    def get_cost_by_key(self) -> Dict[str, float]:
+        """按付费密钥统计花费（热库及各分片中的记录）"""
+        costs = {}
+        for key_id, total_cost in self._query_raw_all('''
+            SELECT key_id, SUM(cost_money) FROM {db}.api_raw_responses
+            WHERE key_id IS NOT NULL
+            GROUP BY key_id
+        '''):
+            costs[key_id] = costs.get(key_id, 0) + (total_cost or 0)
+        return costs
+    
+    @db_timed
+    def get_observed_api_costs(self) -> Dict[str, Dict]:
+        """
+        按接口统计历史实际费用（只统计成功且计费的调用）
+        返回: {api_type: {'avg_cost': 平均单次费用, 'calls': 调用次数}}
+        """
+        totals = {}
+        for api_type, total_cost, calls in self._query_raw_all('''
+            SELECT api_type, SUM(cost_money), COUNT(*)
+            FROM {db}.api_raw_responses
+            WHERE response_code = 0 AND cost_money > 0
+            GROUP BY api_type
+        '''):
+            cost_sum, call_sum = totals.get(api_type, (0, 0))
+            totals[api_type] = (cost_sum + total_cost, call_sum + calls)
+        
+        return {api_type: {'avg_cost': cost_sum / calls, 'calls': calls}
+                for api_type, (cost_sum, calls) in totals.items()}
+    
+    @db_timed
+    def get_detail_candidates(self, batch_id: str = None) -> List[Dict]:
+        """
+        获取所有公众号中尚未完成详情采集的文章（排除已确认删除的文章）
+        附带已知阅读数和所属公众号的平均阅读数，供调度估值
+        Args:
+            batch_id: 只返回该批次公众号的文章
+        """
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            WITH account_reads AS (
+                SELECT art.account_id, AVG(s.read_num) AS avg_read
+                FROM article_stats s
+                JOIN articles art ON art.id = s.article_id
+                GROUP BY art.account_id
+            )
+            SELECT a.id, a.account_id, a.url, a.title, a.post_time_str,
+                   a.fetch_status, s.read_num, ar.avg_read AS account_avg_read
+            FROM articles a
+            LEFT JOIN article_stats s ON s.article_id = a.id
+            LEFT JOIN account_reads ar ON ar.account_id = a.account_id
+            WHERE a.fetch_status != 'content_fetched'
+              AND NOT EXISTS (
+                  SELECT 1 FROM api_raw_responses r
+                  WHERE r.api_type IN ('read_zan_pro', 'article_detail')
+                    AND r.request_key = a.url AND r.response_code = 101
+              )
+              AND NOT EXISTS (
+                  -- 启用分片时原始响应不在主库，以重试队列中的死信为准
+                  SELECT 1 FROM retry_queue q
+                  WHERE q.request_key = a.url AND q.status = 'dead'
+                    AND q.error_class = 'code_101'
+              )
+              AND (? IS NULL OR a.account_id IN (SELECT id FROM accounts WHERE batch_id = ?))
+            ORDER BY a.post_time_str DESC
+        ''', (batch_id, batch_id))
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return [dict(row) for row in rows]
+    
+    @db_timed
+    def get_existing_urls(self, urls: List[str], saved_before: str = None) -> set:
+        """
+        返回给定URL中已存在于 articles 表的集合（单次查询）
+        Args:
+            saved_before: 只返回该时间（含）之前入库的文章
+        """
+        urls = [url for url in urls if url]
+        if not urls:
+            return set()
+        
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        placeholders = ','.join('?' * len(urls))
+        if saved_before:
+            cursor.execute(f'''
+                SELECT url FROM articles WHERE url IN ({placeholders}) AND created_at <= ?
+            ''', urls + [saved_before])
+        else:
+            cursor.execute(f'SELECT url FROM articles WHERE url IN ({placeholders})', urls)
+        rows = cursor.fetchall()
+        conn.close()
+        
+        return {row['url'] for row in rows}
     
+    @db_timed
     def check_article_exists(self, url: str) -> Tuple[bool, Optional[str]]:
         """
         检查文章是否存在及其状态
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+API密钥池
+多个密钥各自跟踪余额（来自接口返回的 remain_money）和限速状态，
+每次请求选择最健康、余额最多的密钥；余额耗尽的密钥退出轮换，不中断采集
+"""
+
+import hashlib
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from structured_log import get_logger
+
+
+def key_fingerprint(key: str) -> str:
+    """密钥指纹（写入 api_raw_responses.key_id，不保存明文）"""
+    return hashlib.sha256(key.encode()).hexdigest()[:12]
+
+
+class TokenBucket:
+    """令牌桶限速：每秒补充 rate 个令牌，最多积攒 burst 个"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self) -> float:
+        """距离下一个可用令牌的秒数（0表示现在可用）"""
+        if not self.rate:
+            return 0.0
+        self._refill(time.monotonic())
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        if self.rate:
+            self.tokens -= 1
+
+
+class ApiKeyState:
+    """单个密钥的状态"""
+
+    def __init__(self, key: str, rate: float, burst: int):
+        self.key = key
+        self.key_id = key_fingerprint(key)
+        self.balance: Optional[float] = None  # None 表示尚未获取
+        self.bucket = TokenBucket(rate, burst)
+        self.exhausted = False
+        self.calls = 0
+        self.errors = 0
+        self.consecutive_errors = 0
+
+    def to_dict(self) -> Dict:
+        return {
+            'key_id': self.key_id,
+            'balance': self.balance,
+            'exhausted': self.exhausted,
+            'calls': self.calls,
+            'errors': self.errors,
+        }
+
+
+class KeyPool:
+    """密钥池（线程安全）"""
+
+    def __init__(self, keys: List[str], min_balance: float,
+                 rate: float = 0, burst: int = 1):
+        """
+        Args:
+            keys: API密钥列表（重复的会被去掉）
+            min_balance: 低于该余额的密钥视为耗尽
+            rate: 每个密钥每秒最多请求数（0表示不限速）
+            burst: 每个密钥允许的突发请求数
+        """
+        unique = list(dict.fromkeys(keys))
+        if not unique:
+            raise ValueError("至少需要一个API密钥")
+        self.log = get_logger('key_pool')
+        self.min_balance = min_balance
+        self.states = [ApiKeyState(key, rate, burst) for key in unique]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.states)
+
+    # ==================== 选择密钥 ====================
+
+    def _candidates(self) -> List[ApiKeyState]:
+        # 连续失败少的优先，其次余额多的优先（未知余额排在已知余额之后）
+        alive = [s for s in self.states if not s.exhausted]
+        return sorted(alive, key=lambda s: (s.consecutive_errors,
+                                            s.balance is None,
+                                            -(s.balance or 0)))
+
+    def acquire(self) -> Optional[ApiKeyState]:
+        """
+        取一个可用密钥（必要时等待限速令牌）
+        Returns:
+            所有密钥都已耗尽时返回 None
+        """
+        while True:
+            with self._lock:
+                candidates = self._candidates()
+                if not candidates:
+                    return None
+                waits = [(s.bucket.wait_time(), idx, s) for idx, s in enumerate(candidates)]
+                wait, _, state = min(waits)
+                if wait <= 0:
+                    state.bucket.take()
+                    state.calls += 1
+                    return state
+            time.sleep(wait)
+
+    # ==================== 反馈 ====================
+
+    def report(self, state: ApiKeyState, result: Dict):
+        """根据接口返回更新密钥余额；余额不足（code 102 或低于阈值）的密钥退出轮换"""
+        with self._lock:
+            state.consecutive_errors = 0
+            if result.get('remain_money') is not None:
+                state.balance = result['remain_money']
+            if result.get('code') == 102 or (state.balance is not None
+                                              and state.balance < self.min_balance):
+                if not state.exhausted:
+                    state.exhausted = True
+                    self.log.warning(f"  🔑 密钥 {state.key_id} 余额不足，已移出密钥池",
+                                     key_id=state.key_id, balance=state.balance)
+
+    def report_error(self, state: ApiKeyState):
+        """请求异常（超时、5xx等），降低该密钥的优先级"""
+        with self._lock:
+            state.errors += 1
+            state.consecutive_errors += 1
+
+    def set_balance(self, state: ApiKeyState, balance: Optional[float],
+                    only_if_unknown: bool = False):
+        """设置余额（查询余额接口的结果）"""
+        with self._lock:
+            if balance is None or (only_if_unknown and state.balance is not None):
+                return
+            state.balance = balance
+            state.exhausted = balance < self.min_balance
+
+    def refresh(self, fetch: Callable[[str], Optional[float]], only_if_unknown: bool = False):
+        """用余额查询接口刷新所有密钥的余额"""
+        for state in self.states:
+            self.set_balance(state, fetch(state.key), only_if_unknown)
+
+    # ==================== 汇总 ====================
+
+    def has_available(self) -> bool:
+        with self._lock:
+            return any(not s.exhausted for s in self.states)
+
+    def total_balance(self) -> float:
+        """未耗尽密钥的余额合计"""
+        with self._lock:
+            return round(sum(s.balance or 0 for s in self.states if not s.exhausted), 4)
+
+    def summary(self) -> List[Dict]:
+        with self._lock:
+            return [s.to_dict() for s in self.states]
@@ -3,14 +3,24 @@
 主程序入口
 """
 
+import argparse
 import json
 import os
+from contextlib import nullcontext
 from collector import WechatArticleCollector
 from db_manager import DatabaseManager
-from config import API_KEY, MIN_BALANCE, TARGET_ACCOUNTS
+from config import API_KEYS, MIN_BALANCE
+import cache_eviction
+import config
+import metrics
+import profiler
+import registry
 
+# 开始采集前列出的公众号数量上限
+ACCOUNT_PREVIEW = 30
 
-def main():
+
+def main(args: argparse.Namespace = None):
     """主函数"""
     print("="*60)
     print("微信公众号文章采集系统")
@@ -20,10 +30,43 @@ def main():
     print("2. 从断点恢复采集")
     print("3. 查看采集统计")
     print("4. 测试单个公众号")
-    print("5. 退出")
+    print("5. 启动本地查询服务")
+    print("6. 按预算调度获取文章详情")
+    print("7. 增量同步（只获取新发布的文章）")
+    print("8. 重试失败的请求")
+    print("9. 两阶段批次采集（先列表、确认费用、再并发获取详情）")
+    print("10. 退出")
+    
+    choice = input("\n请输入选项 (1-10): ").strip()
     
-    choice = input("\n请输入选项 (1-5): ").strip()
+    if args is not None and args.verbose:
+        config.VERBOSE = True
+    if args is not None and args.tag is not None:
+        config.ACCOUNT_TAG = args.tag
     
+    # 只对采集类操作开启剖析
+    if args is not None and args.profile and choice in ("1", "2", "4", "6", "7", "8", "9"):
+        mode = 'sampling' if args.profile_sampling else 'deterministic'
+        profiling = profiler.session(args.profile_dir, mode, args.profile_interval)
+    else:
+        profiling = nullcontext()
+    
+    # 采集期间在后台把过期的原始响应归档到冷库
+    if choice in ("1", "2", "6", "7", "8", "9"):
+        eviction = cache_eviction.background_eviction()
+    else:
+        eviction = nullcontext()
+    
+    try:
+        with profiling, eviction:
+            run_choice(choice)
+    finally:
+        # 即使中途中断也导出已采集的指标
+        metrics.export_if_configured()
+
+
+def run_choice(choice: str):
+    """执行菜单选项"""
     if choice == "1":
         start_new_collection()
     elif choice == "2":
@@ -33,6 +76,16 @@ def main():
     elif choice == "4":
         test_single_account()
     elif choice == "5":
+        start_query_service()
+    elif choice == "6":
+        scheduled_detail_collection()
+    elif choice == "7":
+        incremental_sync()
+    elif choice == "8":
+        retry_failed_requests()
+    elif choice == "9":
+        two_phase_batch()
+    elif choice == "10":
         print("退出程序")
     else:
         print("无效选项")
@@ -40,13 +93,16 @@ def main():
 
 def start_new_collection():
     """开始新的采集任务"""
+    accounts = registry.target_accounts()
     print("\n开始批量采集任务...")
-    print(f"目标公众号数量: {len(TARGET_ACCOUNTS)}")
+    print(f"目标公众号数量: {len(accounts)}")
     
-    # 显示公众号列表
+    # 显示公众号列表（按优先级，数量多时只显示前面的）
     print("\n公众号列表:")
-    for idx, (biz, name) in enumerate(TARGET_ACCOUNTS, 1):
+    for idx, (biz, name) in enumerate(accounts[:ACCOUNT_PREVIEW], 1):
         print(f"  {idx}. {name}")
+    if len(accounts) > ACCOUNT_PREVIEW:
+        print(f"  ... 共 {len(accounts)} 个")
     
     confirm = input("\n确认开始采集? (y/n): ").strip().lower()
     if confirm != 'y':
@@ -54,15 +110,15 @@ def start_new_collection():
         return
     
     # 创建采集器并开始采集
-    collector = WechatArticleCollector(API_KEY, MIN_BALANCE)
-    collector.collect_multiple_accounts(TARGET_ACCOUNTS)
+    collector = WechatArticleCollector(api_keys=API_KEYS, min_balance=MIN_BALANCE)
+    collector.collect_multiple_accounts(accounts)
 
 
 def resume_collection():
     """恢复采集"""
     print("\n恢复上次的采集任务...")
     
-    collector = WechatArticleCollector(API_KEY, MIN_BALANCE)
+    collector = WechatArticleCollector(api_keys=API_KEYS, min_balance=MIN_BALANCE)
     collector.resume_collection()
 
 
@@ -82,31 +138,32 @@ def show_statistics():
     print(f"总消耗金额: ¥{stats['total_cost']:.2f}")
     print(f"当前余额: ¥{stats['current_balance']:.2f}")
     
-    # 显示每个公众号的进度
+    # 显示每个公众号的进度（登记表与进度一次查询）
     print("\n各公众号进度:")
-    for biz, name in TARGET_ACCOUNTS:
-        account_info = db.get_account_info(biz)
-        if account_info:
-            status = "✅ 已完成" if account_info['stop_flag'] else "⏳ 进行中"
-            print(f"  {name}: {status} (第{account_info['last_page']}页)")
+    for entry in registry.load_entries(db):
+        name = entry['nick_name']
+        if entry['account_id'] is not None:
+            status = "✅ 已完成" if entry['stop_flag'] else "⏳ 进行中"
+            print(f"  {name}: {status} (第{entry['last_page']}页)")
         else:
             print(f"  {name}: 未开始")
 
 
 def test_single_account():
     """测试单个公众号"""
+    accounts = registry.target_accounts()
     print("\n测试单个公众号采集")
     print("\n可选公众号:")
-    for idx, (biz, name) in enumerate(TARGET_ACCOUNTS, 1):
+    for idx, (biz, name) in enumerate(accounts, 1):
         print(f"  {idx}. {name}")
     
     try:
         choice = int(input("\n请选择公众号编号: ").strip())
-        if 1 <= choice <= len(TARGET_ACCOUNTS):
-            biz, name = TARGET_ACCOUNTS[choice - 1]
+        if 1 <= choice <= len(accounts):
+            biz, name = accounts[choice - 1]
             print(f"\n开始采集: {name}")
             
-            collector = WechatArticleCollector(API_KEY, MIN_BALANCE)
+            collector = WechatArticleCollector(api_keys=API_KEYS, min_balance=MIN_BALANCE)
             collector.collect_account_articles(biz, name)
         else:
             print("无效的编号")
@@ -114,5 +171,91 @@ def test_single_account():
         print("请输入有效的数字")
 
 
+def scheduled_detail_collection():
+    """按余额和历史费用规划详情采集顺序，确认后执行"""
+    from scheduler import build_plan, run_plan
+    
+    print("\n调度目标:")
+    print("  1. 完成的文章数最多")
+    print("  2. 高阅读文章优先")
+    objective = 'reads' if input("\n请选择 (1-2): ").strip() == "2" else 'complete'
+    
+    collector = WechatArticleCollector(api_keys=API_KEYS, min_balance=MIN_BALANCE)
+    plan = build_plan(collector.db, collector.current_balance, collector.min_balance, objective)
+    plan.print_plan()
+    
+    if not plan.selected:
+        print("\n没有可在预算内完成的文章")
+        return
+    
+    confirm = input("\n确认按计划执行? (y/n): ").strip().lower()
+    if confirm != 'y':
+        print("取消执行")
+        return
+    
+    run_plan(collector, plan)
+
+
+def incremental_sync():
+    """增量同步所有公众号的新文章"""
+    print("\n开始增量同步...")
+    collector = WechatArticleCollector(api_keys=API_KEYS, min_balance=MIN_BALANCE)
+    collector.sync_multiple_accounts(registry.target_accounts(collector.db))
+
+
+def retry_failed_requests():
+    """重试队列中失败的请求（不扫描全部公众号）"""
+    collector = WechatArticleCollector(api_keys=API_KEYS, min_balance=MIN_BALANCE)
+    summary = collector.db.get_retry_summary()
+    print(f"\n重试队列: 待重试 {summary.get('pending', 0)}，"
+          f"已成功 {summary.get('done', 0)}，永久失败 {summary.get('dead', 0)}")
+    if not summary.get('pending'):
+        print("没有需要重试的请求")
+        return
+    collector.drain_retry_queue()
+
+
+def two_phase_batch():
+    """新建或继续两阶段批次"""
+    from batch import BatchManager, print_batches, run_two_phase
+    
+    collector = WechatArticleCollector(api_keys=API_KEYS, min_balance=MIN_BALANCE)
+    print("\n批次列表:")
+    print_batches(collector.db)
+    
+    current = BatchManager(collector.db).get_current_batch()
+    if current and current['status'] != 'completed':
+        answer = input(f"\n继续批次 {current['batch_id']}（{current['name']}）? "
+                       f"(y=继续 / n=新建): ").strip().lower()
+        if answer == 'y':
+            run_two_phase(collector, current['batch_id'])
+            return
+    
+    name = input("\n新批次名称（可留空）: ").strip() or None
+    run_two_phase(collector, name=name, accounts=registry.target_accounts(collector.db))
+
+
+def start_query_service():
+    """启动本地只读查询服务（供看板使用）"""
+    from query_service import serve_forever
+    serve_forever()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="微信公众号文章采集系统")
+    parser.add_argument('--profile', action='store_true',
+                        help="按阶段剖析采集运行（listing/stats/content/db）")
+    parser.add_argument('--profile-sampling', action='store_true',
+                        help="只做低开销栈采样，不启用cProfile")
+    parser.add_argument('--profile-dir', default=None, help="剖析结果目录")
+    parser.add_argument('--profile-interval', type=float, default=None,
+                        help="栈采样间隔（秒）")
+    parser.add_argument('--verbose', action='store_true',
+                        help="逐篇输出采集日志（默认只显示实时进度）")
+    parser.add_argument('--tag', default=None,
+                        help="只采集登记表中带该标签的公众号（默认 ACCOUNT_TAG）")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main(parse_args())
\ No newline at end of file
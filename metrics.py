@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+运行指标采集
+接口延迟直方图、缓存命中计数、各接口费用、数据库操作耗时
+可在运行结束时导出为 Prometheus 文本格式或 JSON 文件
+"""
+
+import functools
+import json
+import threading
+import time
+from typing import Dict, Tuple, List, Callable
+
+import profiler
+
+API_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: Tuple, extra: Tuple = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = [(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs]
+    return '{' + ','.join(f'{k}="{v}"' for k, v in escaped) + '}'
+
+
+class Counter:
+    """单调递增计数器"""
+
+    type_name = 'counter'
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0)
+
+    def total(self) -> float:
+        with self._lock:
+            return sum(self._values.values())
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def prometheus_lines(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {value}" for key, value in items]
+
+    def to_dict(self) -> List[Dict]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [{'labels': dict(key), 'value': value} for key, value in items]
+
+
+class Histogram:
+    """固定分桶直方图"""
+
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...]):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket_counts, sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                self._series[key] = series
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, **labels):
+        """计时上下文管理器"""
+        return _Timer(self, labels)
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def quantile(self, q: float, **labels) -> float:
+        """按分桶估算分位数（取所在桶上界）"""
+        with self._lock:
+            series = self._series.get(_label_key(labels))
+            if not series or series[2] == 0:
+                return 0.0
+            counts, _, count = series[0], series[1], series[2]
+            target = q * count
+            running = 0
+            for i, bucket_count in enumerate(counts):
+                running += bucket_count
+                if running >= target:
+                    return self.buckets[i] if i < len(self.buckets) else float('inf')
+        return float('inf')
+
+    def prometheus_lines(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        for key, (counts, total, count) in items:
+            running = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                running += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(key, (('le', repr(float(bound))),))} {running}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, (('le', '+Inf'),))} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+    def to_dict(self) -> List[Dict]:
+        with self._lock:
+            items = sorted((k, (list(v[0]), v[1], v[2])) for k, v in self._series.items())
+        result = []
+        for key, (counts, total, count) in items:
+            labels = dict(key)
+            result.append({
+                'labels': labels,
+                'count': count,
+                'sum': total,
+                'buckets': {str(b): c for b, c in zip(self.buckets + ('+Inf',), counts)},
+                'p50': self.quantile(0.5, **labels),
+                'p99': self.quantile(0.99, **labels),
+            })
+        return result
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str = '') -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str = '',
+                  buckets: Tuple[float, ...] = API_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, help_text, buckets))
+
+    def _get_or_create(self, name: str, factory: Callable):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = factory()
+                self._metrics[name] = metric
+            return metric
+
+    def reset(self):
+        """清零所有指标（压测各场景之间使用）"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.reset()
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            if metric.help:
+                lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.prometheus_lines())
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        return {
+            metric.name: {'type': metric.type_name, 'help': metric.help,
+                          'series': metric.to_dict()}
+            for metric in metrics
+        }
+
+    def export(self, path: str):
+        """导出到文件：.prom/.txt 为Prometheus文本格式，其余为JSON"""
+        if path.endswith(('.prom', '.txt')):
+            content = self.to_prometheus()
+        else:
+            content = json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+
+# 进程级默认注册表
+REGISTRY = MetricsRegistry()
+
+API_LATENCY = REGISTRY.histogram(
+    'wechat_api_request_seconds', '接口调用耗时（source=network/cache）', API_LATENCY_BUCKETS)
+API_CACHE = REGISTRY.counter(
+    'wechat_api_cache_requests_total', 'api_raw_responses 缓存命中/未命中次数')
+API_COST = REGISTRY.counter(
+    'wechat_api_cost_yuan_total', '各接口消耗金额（元）')
+API_ERRORS = REGISTRY.counter(
+    'wechat_api_errors_total', '接口调用异常次数')
+DB_LATENCY = REGISTRY.histogram(
+    'wechat_db_operation_seconds', '数据库操作耗时', DB_LATENCY_BUCKETS)
+SLEEP_SECONDS = REGISTRY.counter(
+    'wechat_sleep_seconds_total', '请求间隔休眠累计时长')
+API_COALESCED = REGISTRY.counter(
+    'wechat_api_coalesced_total',
+    '共享在途请求结果的调用次数（source=network 即节省的付费调用）')
+RAW_CACHE_ARCHIVED = REGISTRY.counter(
+    'wechat_raw_cache_archived_total', '归档到冷库的原始响应条数（reason=expired/over_budget）')
+
+STAGE_ITEMS = REGISTRY.counter(
+    'wechat_stage_items_total', '各阶段完成数（stage=pages/stats/content，进度显示按此计算速率）')
+
+ASSET_DOWNLOADS = REGISTRY.counter(
+    'wechat_asset_downloads_total', '图片下载次数（result=new/duplicate/failed）')
+ASSET_BYTES = REGISTRY.counter(
+    'wechat_asset_bytes_total', '下载的图片字节数')
+
+
+def db_timed(func):
+    """DatabaseManager 方法计时装饰器，按方法名记录（剖析时计入 db 阶段）"""
+    operation = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            with profiler.stage('db'):
+                return func(*args, **kwargs)
+        finally:
+            DB_LATENCY.observe(time.perf_counter() - start, operation=operation)
+
+    return wrapper
+
+
+def export_if_configured(registry: MetricsRegistry = None):
+    """如果配置了 METRICS_EXPORT_PATH，则导出指标"""
+    from config import METRICS_EXPORT_PATH
+    if not METRICS_EXPORT_PATH:
+        return
+    (registry or REGISTRY).export(METRICS_EXPORT_PATH)
+    print(f"📈 运行指标已导出: {METRICS_EXPORT_PATH}")
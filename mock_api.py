@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+本地模拟 dajiala API 服务
+用于压测和离线测试：模拟 post_history / read_zan_pro / article_detail / get_remain_money
+支持可配置延迟、错误率、已删除文章（code 101）、费用扣减和合成公众号/文章
+同时充当图片CDN：封面和正文图片URL指向本服务的 /mmbiz/ 路径
+"""
+
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+# 与真实接口一致的单次费用
+from config import DEFAULT_API_COSTS as DEFAULT_COSTS
+
+PAGE_SIZE = 5
+
+
+def synthetic_accounts(count: int, prefix: str = "bench") -> List[Tuple[str, str]]:
+    """生成合成公众号列表 [(biz, nick_name), ...]"""
+    accounts = []
+    for i in range(count):
+        biz = base64.b64encode(f"{prefix}{i:06d}".encode()).decode()
+        accounts.append((biz, f"压测公众号{i + 1}"))
+    return accounts
+
+
+@lru_cache(maxsize=256)
+def synthetic_png(rgb: Tuple[int, int, int], width: int = 32, height: int = 32) -> bytes:
+    """生成纯色PNG"""
+    def chunk(tag: bytes, data: bytes) -> bytes:
+        return (struct.pack('>I', len(data)) + tag + data
+                + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff))
+
+    row = b'\x00' + bytes(rgb) * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+
+class MockApiConfig:
+    """模拟服务参数"""
+
+    def __init__(self, articles_per_account: int = 40, old_articles: int = 5,
+                 latency_ms: Dict[str, float] = None, error_rate: float = 0.0,
+                 deleted_rate: float = 0.0, initial_balance: float = 1000.0,
+                 costs: Dict[str, float] = None, seed: int = 42,
+                 key_balances: Dict[str, float] = None):
+        """
+        Args:
+            articles_per_account: 每个公众号2025年内的文章数
+            old_articles: 每个公众号2025年前的文章数（触发停止标记）
+            latency_ms: 各接口模拟延迟（毫秒），如 {'post_history': 200}
+            error_rate: 返回HTTP 500的概率
+            deleted_rate: 文章被删除（code 101）的比例，按URL确定性选取
+            initial_balance: 初始余额
+            costs: 各接口单次费用
+            seed: 随机种子
+            key_balances: 按密钥独立计费的初始余额；未列出的密钥共用 initial_balance
+        """
+        self.articles_per_account = articles_per_account
+        self.old_articles = old_articles
+        self.latency_ms = latency_ms or {}
+        self.error_rate = error_rate
+        self.deleted_rate = deleted_rate
+        self.initial_balance = initial_balance
+        self.costs = dict(DEFAULT_COSTS, **(costs or {}))
+        self.seed = seed
+        self.key_balances = dict(key_balances or {})
+
+
+class MockApiState:
+    """模拟服务状态：余额、调用计数和费用统计"""
+
+    def __init__(self, config: MockApiConfig):
+        self.config = config
+        self.balance = config.initial_balance
+        self.key_balances = dict(config.key_balances)
+        self.calls = {}
+        self.errors = {}
+        self.spent = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(config.seed)
+        self._articles = {}  # biz -> 文章列表
+        self._by_url = {}  # url -> 文章
+        self.image_base = 'https://mmbiz.qpic.cn/mock'  # 服务启动后改为本地地址
+
+    # ==================== 合成数据 ====================
+
+    def articles_for(self, biz: str) -> List[Dict]:
+        """按biz确定性生成文章（最新在前）"""
+        with self._lock:
+            articles = self._articles.get(biz)
+            if articles is None:
+                articles = self._build_articles(biz)
+                self._articles[biz] = articles
+                for article in articles:
+                    self._by_url[article['url']] = article
+            return articles
+
+    def _build_articles(self, biz: str) -> List[Dict]:
+        token = hashlib.md5(biz.encode()).hexdigest()[:10]
+        total = self.config.articles_per_account + self.config.old_articles
+        # 2025年内的文章均匀分布在 2025-08-19 往前，之后是2024年的旧文章
+        start = datetime(2025, 8, 19, 7, 30)
+        span_days = 200
+        step = span_days / max(self.config.articles_per_account, 1)
+        articles = []
+        for i in range(total):
+            if i < self.config.articles_per_account:
+                post_time = start - timedelta(days=step * i)
+            else:
+                post_time = datetime(2024, 12, 30, 7, 30) - timedelta(days=i)
+            appmsgid = 2247480000 + total - i
+            articles.append({
+                'position': 1,
+                'url': f"https://mp.weixin.qq.com/s/{token}_{i:05d}",
+                'post_time': int(post_time.timestamp()),
+                'post_time_str': post_time.strftime('%Y-%m-%d %H:%M:%S'),
+                'cover_url': f"{self.image_base}/{token}_{i:05d}/0?wx_fmt=jpeg",
+                'original': 1,
+                'item_show_type': 0,
+                'digest': f"合成摘要 {i}",
+                'title': f"合成文章 {token} #{i}",
+                'appmsgid': appmsgid,
+                'msg_status': 2,
+                'is_deleted': '0',
+                'types': 9,
+                '_biz': biz,
+                '_index': i,
+            })
+        return articles
+
+    def article_by_url(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            return self._by_url.get(url)
+
+    def is_deleted(self, url: str) -> bool:
+        bucket = int(hashlib.md5(url.encode()).hexdigest()[:8], 16) % 10000
+        return bucket < self.config.deleted_rate * 10000
+
+    # ==================== 计费 ====================
+
+    def record_call(self, endpoint: str):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def record_error(self, endpoint: str):
+        with self._lock:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self._rng.random() < self.config.error_rate
+
+    def balance_of(self, key: str = None) -> float:
+        with self._lock:
+            return self.key_balances.get(key, self.balance)
+
+    def charge(self, endpoint: str, key: str = None) -> Optional[Tuple[float, float]]:
+        """扣费，余额不足返回None"""
+        cost = self.config.costs.get(endpoint, 0)
+        with self._lock:
+            balance = self.key_balances.get(key, self.balance)
+            if balance < cost:
+                return None
+            balance = round(balance - cost, 4)
+            if key in self.key_balances:
+                self.key_balances[key] = balance
+            else:
+                self.balance = balance
+            self.spent[endpoint] = round(self.spent.get(endpoint, 0) + cost, 4)
+            return cost, balance
+
+    def top_up(self, amount: float):
+        """充值"""
+        with self._lock:
+            self.balance = round(self.balance + amount, 4)
+
+    def summary(self) -> Dict:
+        with self._lock:
+            return {
+                'balance': self.balance,
+                'key_balances': dict(self.key_balances),
+                'calls': dict(self.calls),
+                'errors': dict(self.errors),
+                'spent': dict(self.spent),
+                'total_spent': round(sum(self.spent.values()), 4),
+            }
+
+
+class MockApiHandler(BaseHTTPRequestHandler):
+    """模拟接口处理"""
+
+    state: MockApiState = None
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        self._dispatch(parsed.path, params)
+
+    def do_POST(self):
+        parsed = urlparse(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        try:
+            params = json.loads(body) if body else {}
+        except ValueError:
+            params = {}
+        params.update({k: v[-1] for k, v in parse_qs(parsed.query).items()})
+        self._dispatch(parsed.path, params)
+
+    def _dispatch(self, path: str, params: Dict):
+        if path.startswith('/mmbiz/'):
+            self._image(path)
+            return
+        endpoint = path.rstrip('/').rsplit('/', 1)[-1]
+        handlers = {
+            'post_history': self._post_history,
+            'read_zan_pro': self._read_zan_pro,
+            'article_detail': self._article_detail,
+            'get_remain_money': self._get_remain_money,
+        }
+        handler = handlers.get(endpoint)
+        if handler is None:
+            self._send_json(404, {'code': 404, 'msg': f'unknown endpoint {endpoint}'})
+            return
+
+        self.state.record_call(endpoint)
+        latency = self.state.config.latency_ms.get(endpoint, 0)
+        if latency:
+            time.sleep(latency / 1000.0)
+
+        if endpoint != 'get_remain_money' and self.state.should_fail():
+            self.state.record_error(endpoint)
+            self._send_json(500, {'code': 500, 'msg': 'mock internal error'})
+            return
+
+        self._send_json(200, handler(params))
+
+    def _charged(self, endpoint: str, key: Optional[str], payload: Dict) -> Dict:
+        charged = self.state.charge(endpoint, key)
+        if charged is None:
+            return {'code': 102, 'msg': '余额不足', 'cost_money': 0,
+                    'remain_money': self.state.balance_of(key)}
+        cost, remain = charged
+        payload.update({'cost_money': cost, 'remain_money': remain})
+        return payload
+
+    def _post_history(self, params: Dict) -> Dict:
+        biz = params.get('biz') or ''
+        page = int(params.get('page') or 1)
+        articles = self.state.articles_for(biz)
+        total_page = (len(articles) + PAGE_SIZE - 1) // PAGE_SIZE
+        chunk = articles[(page - 1) * PAGE_SIZE: page * PAGE_SIZE]
+        data = [{k: v for k, v in a.items() if not k.startswith('_')} for a in chunk]
+        return self._charged('post_history', params.get('key'), {
+            'code': 0,
+            'msg': 'success',
+            'data': data,
+            'total_num': len(articles),
+            'total_page': total_page,
+            'now_page': page,
+            'now_page_articles_num': len(data),
+            'mp_nickname': f"mock_{biz}",
+            'mp_ghid': f"gh_{hashlib.md5(biz.encode()).hexdigest()[:12]}",
+        })
+
+    def _read_zan_pro(self, params: Dict) -> Dict:
+        url = params.get('url') or ''
+        if self.state.is_deleted(url):
+            return {'code': 101, 'msg': '该内容已被发布者删除'}
+        seed = int(hashlib.md5(url.encode()).hexdigest()[:8], 16)
+        read = 100 + seed % 50000
+        return self._charged('read_zan_pro', params.get('key'), {
+            'code': 0,
+            'msg': 'success',
+            'data': {
+                'read': read,
+                'zan': read // 40,
+                'looking': read // 80,
+                'share_num': read // 10,
+                'collect_num': read // 20,
+                'comment_count': seed % 200,
+            },
+        })
+
+    def _article_detail(self, params: Dict) -> Dict:
+        url = params.get('url') or ''
+        if self.state.is_deleted(url):
+            return {'code': 101, 'msg': '该内容已被发布者删除'}
+        article = self.state.article_by_url(url) or {}
+        title = article.get('title', '合成文章')
+        paragraphs = [f"这是《{title}》的第{i + 1}段正文。" * 5 for i in range(20)]
+        html = ''.join(f"<p>{p}</p>" for p in paragraphs)
+        token = hashlib.md5(url.encode()).hexdigest()[:12]
+        return self._charged('article_detail', params.get('key'), {
+            'code': 0,
+            'msg': '',
+            'biz': article.get('_biz', ''),
+            'title': title,
+            'author': '压测作者',
+            'copyright_stat': 1,
+            'source_url': '',
+            'ip_wording': '中国浙江',
+            'pubtime': article.get('post_time_str', ''),
+            'url': url,
+            'content': ''.join(paragraphs),
+            'content_multi_text': html,
+            # 第1张各文章内容相同（不同URL），第3张为所有文章共用的同一URL
+            'picture_page_info_list': [
+                {'cdn_url': f"{self.state.image_base}/{token}/0?wx_fmt=png",
+                 'width': 1080, 'height': 360},
+                {'cdn_url': f"{self.state.image_base}/{token}/1?wx_fmt=png",
+                 'width': 1080, 'height': 361},
+                {'cdn_url': f"{self.state.image_base}/shared/qrcode?wx_fmt=png",
+                 'width': 430, 'height': 430},
+            ],
+            'video_page_infos': [],
+        })
+
+    def _get_remain_money(self, params: Dict) -> Dict:
+        return {'code': 0, 'msg': 'success',
+                'remain_money': self.state.balance_of(params.get('key'))}
+
+    def _image(self, path: str):
+        """模拟CDN图片：不计费，受延迟和错误率影响"""
+        self.state.record_call('image')
+        latency = self.state.config.latency_ms.get('image', 0)
+        if latency:
+            time.sleep(latency / 1000.0)
+        if self.state.should_fail():
+            self.state.record_error('image')
+            self._send_json(500, {'code': 500, 'msg': 'mock cdn error'})
+            return
+
+        token, _, index = path[len('/mmbiz/'):].rpartition('/')
+        seed = 'same' if index == '0' else path
+        digest = hashlib.md5(seed.encode()).digest()
+        body = synthetic_png((digest[0], digest[1], digest[2]))
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MockApiServer:
+    """在后台线程中运行的模拟服务"""
+
+    def __init__(self, config: MockApiConfig = None, host: str = '127.0.0.1',
+                 port: int = 0):
+        self.config = config or MockApiConfig()
+        self.state = MockApiState(self.config)
+        handler = type('BoundMockApiHandler', (MockApiHandler,), {'state': self.state})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        host, port = self.httpd.server_address[:2]
+        self.state.image_base = f"http://{host}:{port}/mmbiz"
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/fbmain/monitor/v3"
+
+    def start(self) -> 'MockApiServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="本地模拟 dajiala API 服务")
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0, help="所有接口的模拟延迟")
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--deleted-rate', type=float, default=0.0)
+    parser.add_argument('--balance', type=float, default=1000.0)
+    args = parser.parse_args()
+
+    latency = {name: args.latency_ms for name in DEFAULT_COSTS}
+    server = MockApiServer(MockApiConfig(latency_ms=latency, error_rate=args.error_rate,
+                                         deleted_rate=args.deleted_rate,
+                                         initial_balance=args.balance),
+                           port=args.port)
+    print(f"🧪 模拟API服务已启动: {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("\n停止模拟服务")
+    finally:
+        server.httpd.server_close()
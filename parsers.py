@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+API响应解析
+把三个接口的原始响应转换为规范化表的行，采集和离线重放共用同一套解析逻辑
+"""
+
+import json
+from typing import Dict, List, Optional, Tuple
+
+# 只采集该日期之后发布的文章
+ARTICLE_CUTOFF = '2025-01-01'
+
+VIDEO_URL_KEYS = ('url', 'video_url', 'mp4_url', 'cdn_url')
+
+
+def article_list_row(article_data: Dict) -> Tuple:
+    """
+    接口一单篇文章 -> articles 行
+    返回: (url, title, digest, post_time_str, post_time, original,
+           position, cover_url, appmsgid)
+    """
+    return (
+        article_data.get('url'),
+        article_data.get('title'),
+        article_data.get('digest'),
+        article_data.get('post_time_str'),
+        article_data.get('post_time'),
+        article_data.get('original', 0),
+        article_data.get('position'),
+        article_data.get('cover_url'),
+        article_data.get('appmsgid'),
+    )
+
+
+def split_list_page(articles: List[Dict]) -> Tuple[List[Dict], bool]:
+    """
+    按发布时间截断一页文章列表
+    返回: (截止日期之后的文章, 是否遇到截止日期之前的文章)
+    """
+    kept = []
+    for article in articles:
+        post_time_str = article.get('post_time_str', '')
+        if post_time_str and post_time_str < ARTICLE_CUTOFF:
+            return kept, True
+        kept.append(article)
+    return kept, False
+
+
+def stats_row(stats_data: Dict) -> Tuple:
+    """
+    接口二 data -> article_stats 行
+    返回: (read_num, zan, looking, share_num, collect_num, comment_count)
+    """
+    return (
+        stats_data.get('read', 0),
+        stats_data.get('zan', 0),
+        stats_data.get('looking', 0),
+        stats_data.get('share_num', 0),
+        stats_data.get('collect_num', 0),
+        stats_data.get('comment_count', 0),
+    )
+
+
+def picture_urls(content_data: Dict) -> List[str]:
+    """接口三中的图片URL列表"""
+    return [item.get('cdn_url') for item in content_data.get('picture_page_info_list') or []
+            if isinstance(item, dict) and item.get('cdn_url')]
+
+
+def picture_infos(content_data: Dict) -> List[Dict]:
+    """接口三中的图片信息 [{'url', 'width', 'height'}, ...]，按正文顺序"""
+    infos = []
+    for item in content_data.get('picture_page_info_list') or []:
+        if isinstance(item, dict) and item.get('cdn_url'):
+            infos.append({
+                'url': item['cdn_url'],
+                'width': item.get('width'),
+                'height': item.get('height'),
+            })
+    return infos
+
+
+def video_urls(content_data: Dict) -> List[str]:
+    """接口三中的视频URL列表"""
+    urls = []
+    for item in content_data.get('video_page_infos') or []:
+        if isinstance(item, str):
+            urls.append(item)
+            continue
+        if not isinstance(item, dict):
+            continue
+        for key in VIDEO_URL_KEYS:
+            if item.get(key):
+                urls.append(item[key])
+                break
+    return urls
+
+
+def content_row(content_data: Dict) -> Tuple:
+    """
+    接口三响应 -> article_contents 行
+    返回: (title, content, content_html, copyright_stat, source_url,
+           ip_wording, picture_urls, video_urls)
+    """
+    return (
+        content_data.get('title'),
+        content_data.get('content'),
+        content_data.get('content_multi_text'),
+        content_data.get('copyright_stat'),
+        content_data.get('source_url'),
+        content_data.get('ip_wording'),
+        json.dumps(picture_urls(content_data), ensure_ascii=False),
+        json.dumps(video_urls(content_data), ensure_ascii=False),
+    )
+
+
+def content_author(content_data: Dict) -> Optional[str]:
+    """接口三中的作者"""
+    return content_data.get('author') or None
+
+
+def biz_from_request_key(request_key: str) -> Tuple[str, int]:
+    """post_history 的缓存键 '{biz}_{page}' -> (biz, page)"""
+    biz, _, page = request_key.rpartition('_')
+    return biz, int(page)
@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+采集运行性能剖析
+按阶段（listing/stats/content/db）分别剖析，输出每阶段的 cProfile 文件
+和可直接用于火焰图工具（flamegraph.pl / speedscope）的折叠栈文件；
+并发采集的工作线程同样剖析（每个线程独立记录阶段，结束时合并）
+
+两种模式：
+- deterministic：cProfile 逐阶段剖析 + 栈采样，开销较大，适合排查
+- sampling：仅定时栈采样，开销很低，可在生产运行中常开
+"""
+
+import cProfile
+import functools
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+STAGES = ('listing', 'stats', 'content', 'db')
+ROOT_STAGE = 'other'
+
+# 当前进程的剖析会话（未开启时为None，阶段标记为空操作）
+_active = None
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler: 'StageProfiler', name: str):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._exit()
+        return False
+
+
+class StackSampler(threading.Thread):
+    """定时采样所有线程的调用栈（栈底标记该线程当前所处阶段），累计折叠栈计数"""
+
+    def __init__(self, profiler: 'StageProfiler', interval: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.profiler = profiler
+        self.interval = interval
+        self.counts = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(self.profiler.stage_of(thread_id))
+                stack.reverse()
+                self.counts[';'.join(part.replace(';', ',') for part in stack)] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+
+class _ThreadState:
+    """一个线程的阶段栈和各阶段的 cProfile（cProfile 只剖析启用它的线程）"""
+
+    __slots__ = ('stack', 'stage_started', 'profiles', 'active', 'profiling')
+
+    def __init__(self):
+        self.stack = [ROOT_STAGE]
+        self.stage_started = None
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self.active = None  # 正在运行的 cProfile 所属阶段
+        self.profiling = True
+
+
+class StageProfiler:
+    """
+    分阶段剖析器：每个线程各自记录阶段栈，deterministic 模式下每个线程每个阶段
+    一个 cProfile，结束时按阶段合并；阶段耗时为各线程累计
+    """
+
+    def __init__(self, output_dir: str, mode: str = 'deterministic',
+                 interval: float = None):
+        if mode not in ('deterministic', 'sampling'):
+            raise ValueError(f"未知的剖析模式: {mode}")
+        self.mode = mode
+        self.interval = interval or (0.005 if mode == 'deterministic' else 0.01)
+        self.output_dir = os.path.join(output_dir, datetime.now().strftime("%Y%m%d_%H%M%S"))
+        self.thread_id = threading.get_ident()
+        self.profiles = {}
+        self.wall_time = {}
+        self._threads: Dict[int, _ThreadState] = {}
+        self._lock = threading.Lock()
+        self._stopping = False
+        self._sampler = None
+        self._started_at = None
+
+    def _state(self) -> _ThreadState:
+        thread_id = threading.get_ident()
+        state = self._threads.get(thread_id)
+        if state is None:
+            state = _ThreadState()
+            with self._lock:
+                self._threads[thread_id] = state
+        return state
+
+    def stage_of(self, thread_id: int) -> str:
+        state = self._threads.get(thread_id)
+        return state.stack[-1] if state else ROOT_STAGE
+
+    @property
+    def current_stage(self) -> str:
+        return self._state().stack[-1]
+
+    def stage(self, name: str):
+        return _Stage(self, name)
+
+    def _switch(self, state: _ThreadState, old: Optional[str], new: Optional[str]):
+        now = time.perf_counter()
+        if old is not None and state.stage_started is not None:
+            with self._lock:
+                self.wall_time[old] = self.wall_time.get(old, 0) + now - state.stage_started
+        if state.active is not None:
+            state.profiles[state.active].disable()
+            state.active = None
+        if new is not None and self.mode == 'deterministic' and state.profiling \
+                and not self._stopping:
+            profile = state.profiles.get(new)
+            if profile is None:
+                profile = cProfile.Profile()
+                state.profiles[new] = profile
+            try:
+                profile.enable()
+                state.active = new
+            except ValueError:
+                # 解释器只允许一个 cProfile 同时运行时（Python 3.12+），该线程只做栈采样
+                state.profiling = False
+        # 其他线程的根阶段（进入第一个阶段之前）不计时
+        state.stage_started = now if new is not None else None
+
+    def _enter(self, name: str):
+        state = self._state()
+        previous = state.stack[-1]
+        state.stack.append(name)
+        if name != previous:
+            self._switch(state, previous, name)
+
+    def _exit(self):
+        state = self._state()
+        current = state.stack.pop()
+        if current != state.stack[-1]:
+            parent = state.stack[-1]
+            # 其他线程回到根阶段时停止计时和剖析
+            if parent == ROOT_STAGE and threading.get_ident() != self.thread_id:
+                parent = None
+            self._switch(state, current, parent)
+
+    def start(self):
+        self._started_at = time.perf_counter()
+        self._switch(self._state(), None, ROOT_STAGE)
+        self._sampler = StackSampler(self, self.interval)
+        self._sampler.start()
+
+    def _merge_profiles(self):
+        """按阶段合并各线程的 cProfile（仍在其他线程中运行的跳过）"""
+        own = self._threads.get(self.thread_id)
+        for thread_id, state in list(self._threads.items()):
+            for name, profile in state.profiles.items():
+                if state is not own and state.active == name:
+                    continue
+                stats = self.profiles.get(name)
+                if stats is None:
+                    self.profiles[name] = pstats.Stats(profile)
+                else:
+                    stats.add(profile)
+
+    def stop(self) -> str:
+        """停止剖析并写出结果，返回输出目录"""
+        self._sampler.stop()
+        self._stopping = True
+        state = self._state()
+        self._switch(state, state.stack[-1], None)
+        total = time.perf_counter() - self._started_at
+        self._merge_profiles()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(os.path.join(self.output_dir, "collapsed.txt"), 'w', encoding='utf-8') as f:
+            for stack, count in self._sampler.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+        stage_samples = Counter()
+        for stack, count in self._sampler.counts.items():
+            stage_samples[stack.split(';', 1)[0]] += count
+
+        report = io.StringIO()
+        for name, stats in sorted(self.profiles.items()):
+            path = os.path.join(self.output_dir, f"stage_{name}.prof")
+            stats.dump_stats(path)
+            report.write(f"\n{'='*60}\n阶段: {name}\n{'='*60}\n")
+            stats.stream = report
+            stats.sort_stats('cumulative').print_stats(20)
+        if self.profiles:
+            with open(os.path.join(self.output_dir, "summary.txt"), 'w', encoding='utf-8') as f:
+                f.write(report.getvalue())
+
+        summary = {
+            'mode': self.mode,
+            'interval': self.interval,
+            'total_seconds': round(total, 4),
+            'stage_seconds': {k: round(v, 4) for k, v in sorted(self.wall_time.items())},
+            'stage_samples': dict(stage_samples),
+            'samples': self._sampler.samples,
+            'threads': len(self._threads),
+        }
+        with open(os.path.join(self.output_dir, "summary.json"), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, ensure_ascii=False, indent=2)
+        return self.output_dir
+
+
+def stage(name: str):
+    """阶段标记（未开启剖析时为空操作）"""
+    if _active is None:
+        return _NULL_STAGE
+    return _active.stage(name)
+
+
+def staged(name: str):
+    """把整个函数调用计入指定阶段的装饰器"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _active is None:
+                return func(*args, **kwargs)
+            with _active.stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def session(output_dir: str = None, mode: str = 'deterministic', interval: float = None):
+    """开启剖析会话，退出时写出各阶段剖析文件和折叠栈"""
+    global _active
+    if output_dir is None:
+        from config import PROFILE_DIR
+        output_dir = PROFILE_DIR
+    profiler = StageProfiler(output_dir, mode, interval)
+    _active = profiler
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        _active = None
+        path = profiler.stop()
+        seconds = ', '.join(f"{k} {v:.2f}s" for k, v in sorted(profiler.wall_time.items()))
+        print(f"\n🔬 剖析结果已写入: {path}")
+        print(f"  各阶段耗时: {seconds}")
+        print(f"  火焰图: flamegraph.pl {os.path.join(path, 'collapsed.txt')} > flame.svg")
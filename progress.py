@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+采集进度实时显示
+后台线程按固定间隔读取指标计数器（metrics.STAGE_ITEMS / API_COST）和数据库中剩余的工作量，
+计算各阶段速率、消费速率、完成时间和余额耗尽时间，在一行内刷新显示；
+采集线程只做计数，不做任何字符串格式化
+"""
+
+import functools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import config
+import metrics
+
+STAGES = (('pages', '列表', '页'), ('stats', '统计', '篇'), ('content', '正文', '篇'))
+# 速率的指数平滑系数（越大越接近最近一个间隔的瞬时速率）
+RATE_SMOOTHING = 0.3
+
+
+def format_duration(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return '--:--:--'
+    seconds = int(seconds)
+    if seconds >= 100 * 3600:
+        return f"{seconds // 86400}天"
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+class ProgressMonitor:
+    """按固定间隔采样计数器并刷新状态行"""
+
+    def __init__(self, collector, interval: float = None, stream=None):
+        self.collector = collector
+        self.db = collector.db
+        self.interval = interval or config.PROGRESS_INTERVAL
+        self.stream = stream or sys.stdout
+        # 终端中在同一行刷新；输出被重定向或开启详细日志时逐行输出
+        self.inline = self.stream.isatty() and not config.VERBOSE
+        self.started = time.monotonic()
+        self.rates = {}
+        self._last = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _counters(self) -> Dict[str, float]:
+        values = {stage: metrics.STAGE_ITEMS.value(stage=stage) for stage, _, _ in STAGES}
+        values['cost'] = metrics.API_COST.total()
+        return values
+
+    def sample(self) -> Dict:
+        """采样一次，返回当前速率和剩余工作量"""
+        now = time.monotonic()
+        counters = self._counters()
+        if self._last is not None:
+            last_time, last_counters = self._last
+            elapsed = now - last_time
+            if elapsed > 0:
+                for name, value in counters.items():
+                    instant = (value - last_counters[name]) / elapsed
+                    previous = self.rates.get(name)
+                    self.rates[name] = instant if previous is None else (
+                        RATE_SMOOTHING * instant + (1 - RATE_SMOOTHING) * previous)
+        self._last = (now, counters)
+
+        remaining = self.db.get_work_remaining()
+        balance = self.collector.current_balance
+        snapshot = {
+            'elapsed': now - self.started,
+            'counters': counters,
+            'rates': dict(self.rates),
+            'remaining': remaining,
+            'balance': balance,
+            'eta': None,
+            'budget_eta': None,
+        }
+
+        # 每篇待统计的文章还需要正文，两个阶段各自按速率估算，取较慢的一个
+        etas = []
+        for stage, pending in (('stats', remaining['list_only']),
+                               ('content', remaining['list_only'] + remaining['stats_fetched'])):
+            rate = self.rates.get(stage)
+            if pending and rate:
+                etas.append(pending / rate)
+        if etas:
+            snapshot['eta'] = max(etas)
+        elif not remaining['list_only'] and not remaining['stats_fetched']:
+            snapshot['eta'] = 0.0
+
+        spend_rate = self.rates.get('cost')
+        if spend_rate:
+            snapshot['budget_eta'] = max(0.0, balance - self.collector.min_balance) / spend_rate
+        return snapshot
+
+    def render(self, snapshot: Dict) -> str:
+        parts = [f"⏱️ {format_duration(snapshot['elapsed'])}"]
+        for stage, label, unit in STAGES:
+            parts.append(f"{label} {snapshot['rates'].get(stage, 0):.1f}{unit}/s")
+        remaining = snapshot['remaining']
+        parts.append(f"待统计 {remaining['list_only']:,} 待正文 "
+                     f"{remaining['list_only'] + remaining['stats_fetched']:,} "
+                     f"重试 {remaining['retry_pending']:,}")
+        parts.append(f"¥{snapshot['rates'].get('cost', 0) * 60:.2f}/分钟 "
+                     f"余额 ¥{snapshot['balance']:.2f}")
+        eta, budget_eta = snapshot['eta'], snapshot['budget_eta']
+        line = ' | '.join(parts) + f" | 预计完成 {format_duration(eta)}"
+        if budget_eta is not None:
+            line += f" 余额耗尽 {format_duration(budget_eta)}"
+            if eta is None or budget_eta < eta:
+                line += " ⚠️"
+        return line
+
+    def refresh(self):
+        line = self.render(self.sample())
+        if self.inline:
+            self.stream.write(f"\r{line}\033[K")
+        else:
+            self.stream.write(f"{line}\n")
+        self.stream.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # 显示失败不影响采集（例如数据库短暂被锁）
+                self.stream.write(f"\n⚠️ 进度刷新失败: {e}\n")
+
+    def start(self):
+        self._last = (time.monotonic(), self._counters())
+        self._thread = threading.Thread(target=self._run, name='progress', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.refresh()
+        if self.inline:
+            self.stream.write('\n')
+            self.stream.flush()
+
+
+_active_lock = threading.Lock()
+_active: Optional[ProgressMonitor] = None
+
+
+@contextmanager
+def live(collector):
+    """
+    在采集期间显示实时进度
+    可以嵌套（例如批量采集内的重试队列），只有最外层启动显示线程
+    """
+    global _active
+    with _active_lock:
+        if _active is not None or not config.PROGRESS_INTERVAL:
+            owner = None
+        else:
+            owner = _active = ProgressMonitor(collector)
+    if owner is None:
+        yield _active
+        return
+    owner.start()
+    try:
+        yield owner
+    finally:
+        owner.stop()
+        with _active_lock:
+            _active = None
+
+
+def tracked(func):
+    """采集器方法装饰器：整个调用期间显示实时进度"""
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        with live(self):
+            return func(self, *args, **kwargs)
+    return wrapper
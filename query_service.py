@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+本地只读查询服务
+为看板提供HTTP/JSON查询接口，共享一个常驻进程的连接池和结果缓存
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+import queue
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Dict, Any, List, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import database
+from db_manager import query_statistics, statistics_sources
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+# /hot 默认只返回阅读数高于公众号中位数两个标准差的文章
+DEFAULT_HOT_ZSCORE = 2.0
+
+
+class ResultCache:
+    """LRU + TTL 查询结果缓存（线程安全）"""
+
+    def __init__(self, max_entries: int = 512, ttl: float = 30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ReadConnectionPool:
+    """只读SQLite连接池，避免每次查询都重新打开数据库"""
+
+    def __init__(self, db_path: str, size: int = 4):
+        self.db_path = db_path
+        self._pool = queue.Queue()
+        for _ in range(size):
+            self._pool.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True,
+                               check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def close(self):
+        while not self._pool.empty():
+            self._pool.get_nowait().close()
+
+
+def encode_cursor(values: Tuple) -> str:
+    """把keyset位置编码为不透明的游标字符串"""
+    raw = json.dumps(list(values), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+class InvalidCursor(ValueError):
+    """游标无法解码或与接口的排序键不匹配（HTTP 400）"""
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List]:
+    """
+    解码游标（空游标表示从头开始）
+    Args:
+        size: 接口排序键的个数，解码结果必须是同样长度的标量列表
+    """
+    if not cursor:
+        return None
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError):
+        raise InvalidCursor(f"invalid cursor: {cursor}")
+    if not isinstance(position, list) or len(position) != size or not all(
+            value is None or isinstance(value, (str, int, float)) for value in position):
+        raise InvalidCursor(f"invalid cursor: {cursor}")
+    return position
+
+
+def _like_pattern(q: str) -> str:
+    """子串匹配的 LIKE 模式（转义 % _ \\，配合 ESCAPE '\\'）"""
+    escaped = q.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+
+def _files_signature(paths: List[str]) -> Tuple:
+    """文件的修改时间和大小，用于判断主库之外的库是否有新写入"""
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        signature.append((path, stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class QueryService:
+    """
+    只读查询服务
+    写入路径（采集器/DatabaseManager）提交事务后，SQLite的 data_version 会变化，
+    服务据此整体失效结果缓存，因此无需采集进程主动通知；
+    统计还读取分片和冷库，其缓存键另外包含这些文件的修改时间和大小
+    """
+
+    def __init__(self, db_path: str = None, pool_size: int = 4,
+                 cache_size: int = 512, cache_ttl: float = 30.0):
+        if db_path is None:
+            db_path = database.DATABASE_PATH
+        else:
+            # 表结构检查、分片目录和统计都针对该数据库
+            database.set_database_path(db_path)
+        database.ensure_schema()
+        self.db_path = db_path
+        self.pool = ReadConnectionPool(db_path, pool_size)
+        self.cache = ResultCache(cache_size, cache_ttl)
+        # 专用连接用于检测其他连接的写入
+        self._watch_conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True,
+                                           check_same_thread=False)
+        self._watch_lock = threading.Lock()
+        self._data_version = self._read_data_version()
+
+    def _read_data_version(self) -> int:
+        with self._watch_lock:
+            return self._watch_conn.execute('PRAGMA data_version').fetchone()[0]
+
+    def _check_invalidation(self):
+        """数据库有新提交时清空缓存"""
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self.cache.clear()
+
+    def _cached(self, key, producer):
+        self._check_invalidation()
+        result = self.cache.get(key)
+        if result is None:
+            result = producer()
+            self.cache.put(key, result)
+        return result
+
+    def _query(self, sql: str, params: Tuple = ()) -> List[Dict]:
+        with self.pool.connection() as conn:
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+
+    @staticmethod
+    def _page_size(limit) -> int:
+        try:
+            limit = int(limit)
+        except (TypeError, ValueError):
+            return DEFAULT_PAGE_SIZE
+        return max(1, min(limit, MAX_PAGE_SIZE))
+
+    # ==================== 查询接口 ====================
+
+    def statistics(self) -> Dict:
+        """整体统计（与 DatabaseManager.get_statistics 共用同一查询，包括分片和冷库）"""
+        def produce():
+            with self.pool.connection() as conn:
+                return query_statistics(conn)
+        external = [path for _, path in statistics_sources() if path]
+        return self._cached(('statistics', _files_signature(external)), produce)
+
+    def account_progress(self) -> List[Dict]:
+        """各公众号采集进度"""
+        def produce():
+            return self._query('''
+                SELECT
+                    a.id, a.biz, a.nick_name, a.status, a.stop_flag, a.last_page,
+                    a.last_fetch_time,
+                    COUNT(art.id) AS total_articles,
+                    COUNT(CASE WHEN art.fetch_status = 'list_only' THEN 1 END) AS list_only_count,
+                    COUNT(CASE WHEN art.fetch_status = 'stats_fetched' THEN 1 END) AS stats_fetched_count,
+                    COUNT(CASE WHEN art.fetch_status = 'content_fetched' THEN 1 END) AS content_fetched_count
+                FROM accounts a
+                LEFT JOIN articles art ON art.account_id = a.id
+                GROUP BY a.id
+                ORDER BY a.id
+            ''')
+        return self._cached(('accounts',), produce)
+
+    def list_articles(self, biz: str = None, status: str = None,
+                      limit=None, cursor: str = None) -> Dict:
+        """
+        文章列表，按 (post_time_str, id) 倒序，keyset游标分页
+        """
+        limit = self._page_size(limit)
+        position = decode_cursor(cursor, 2)
+
+        def produce():
+            where = []
+            params = []
+            if biz:
+                where.append('acc.biz = ?')
+                params.append(biz)
+            if status:
+                where.append('art.fetch_status = ?')
+                params.append(status)
+            if position:
+                where.append("(COALESCE(art.post_time_str, ''), art.id) < (?, ?)")
+                params.extend(position)
+            sql = '''
+                SELECT art.id, art.url, art.title, art.digest, art.post_time_str,
+                       art.fetch_status, acc.biz, acc.nick_name,
+                       s.read_num, s.zan, s.looking, s.share_num,
+                       s.collect_num, s.comment_count
+                FROM articles art
+                JOIN accounts acc ON acc.id = art.account_id
+                LEFT JOIN article_stats s ON s.article_id = art.id
+            '''
+            if where:
+                sql += ' WHERE ' + ' AND '.join(where)
+            sql += " ORDER BY COALESCE(art.post_time_str, '') DESC, art.id DESC LIMIT ?"
+            params.append(limit)
+            rows = self._query(sql, tuple(params))
+            next_cursor = None
+            if len(rows) == limit:
+                last = rows[-1]
+                next_cursor = encode_cursor((last['post_time_str'] or '', last['id']))
+            return {'items': rows, 'next_cursor': next_cursor}
+
+        return self._cached(('articles', biz, status, limit, cursor), produce)
+
+    def top_articles(self, n=None, biz: str = None, cursor: str = None) -> Dict:
+        """按阅读数倒序的Top-N，游标为 (read_num, id)"""
+        limit = self._page_size(n)
+        position = decode_cursor(cursor, 2)
+
+        def produce():
+            where = []
+            params = []
+            if biz:
+                where.append('acc.biz = ?')
+                params.append(biz)
+            if position:
+                where.append('(s.read_num, art.id) < (?, ?)')
+                params.extend(position)
+            sql = '''
+                SELECT art.id, art.url, art.title, art.post_time_str,
+                       acc.biz, acc.nick_name,
+                       s.read_num, s.zan, s.looking, s.share_num,
+                       s.collect_num, s.comment_count
+                FROM article_stats s
+                JOIN articles art ON art.id = s.article_id
+                JOIN accounts acc ON acc.id = art.account_id
+            '''
+            if where:
+                sql += ' WHERE ' + ' AND '.join(where)
+            sql += ' ORDER BY s.read_num DESC, art.id DESC LIMIT ?'
+            params.append(limit)
+            rows = self._query(sql, tuple(params))
+            next_cursor = None
+            if len(rows) == limit:
+                last = rows[-1]
+                next_cursor = encode_cursor((last['read_num'], last['id']))
+            return {'items': rows, 'next_cursor': next_cursor}
+
+        return self._cached(('top', biz, limit, cursor), produce)
+
+    def hot_articles(self, min_zscore=None, biz: str = None, limit=None) -> Dict:
+        """相对所属公众号表现突出的文章（读取预先计算的 article_metrics，按z分数倒序）"""
+        limit = self._page_size(limit)
+        try:
+            min_zscore = float(min_zscore) if min_zscore is not None else DEFAULT_HOT_ZSCORE
+        except ValueError:
+            min_zscore = DEFAULT_HOT_ZSCORE
+
+        def produce():
+            params = [min_zscore]
+            sql = '''
+                SELECT art.id, art.url, art.title, art.post_time_str,
+                       acc.biz, acc.nick_name,
+                       m.read_num, m.read_rank, m.read_percentile, m.account_median,
+                       m.read_zscore, m.engagement_rate, m.zan_rate, m.looking_rate,
+                       m.share_rate
+                FROM article_metrics m
+                JOIN articles art ON art.id = m.article_id
+                JOIN accounts acc ON acc.id = m.account_id
+                WHERE m.read_zscore >= ?
+            '''
+            if biz:
+                # 同一公众号内z分数与排名顺序一致，走 (account_id, read_rank) 索引
+                sql += ' AND m.account_id = (SELECT id FROM accounts WHERE biz = ?) ORDER BY m.read_rank'
+                params.append(biz)
+            else:
+                sql += ' ORDER BY m.read_zscore DESC'
+            sql += ' LIMIT ?'
+            params.append(limit)
+            return {'items': self._query(sql, tuple(params))}
+
+        return self._cached(('hot', min_zscore, biz, limit), produce)
+
+    def search_articles(self, q: str, limit=None, cursor: str = None) -> Dict:
+        """按标题/摘要搜索，结果按 id 倒序分页"""
+        limit = self._page_size(limit)
+        position = decode_cursor(cursor, 1)
+        if not q:
+            return {'items': [], 'next_cursor': None}
+
+        def produce():
+            pattern = _like_pattern(q)
+            params = [pattern, pattern]
+            sql = '''
+                SELECT art.id, art.url, art.title, art.digest, art.post_time_str,
+                       art.fetch_status, acc.biz, acc.nick_name, s.read_num
+                FROM articles art
+                JOIN accounts acc ON acc.id = art.account_id
+                LEFT JOIN article_stats s ON s.article_id = art.id
+                WHERE (art.title LIKE ? ESCAPE '\\' OR art.digest LIKE ? ESCAPE '\\')
+            '''
+            if position:
+                sql += ' AND art.id < ?'
+                params.append(position[0])
+            sql += ' ORDER BY art.id DESC LIMIT ?'
+            params.append(limit)
+            rows = self._query(sql, tuple(params))
+            next_cursor = None
+            if len(rows) == limit:
+                next_cursor = encode_cursor((rows[-1]['id'],))
+            return {'items': rows, 'next_cursor': next_cursor}
+
+        return self._cached(('search', q, limit, cursor), produce)
+
+    def cache_info(self) -> Dict:
+        return {
+            'entries': len(self.cache),
+            'hits': self.cache.hits,
+            'misses': self.cache.misses,
+            'data_version': self._data_version,
+        }
+
+    def close(self):
+        self.pool.close()
+        self._watch_conn.close()
+
+
+class QueryRequestHandler(BaseHTTPRequestHandler):
+    """HTTP请求处理：GET /statistics /accounts /articles /top /hot /search /cache"""
+
+    service: QueryService = None
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        routes = {
+            '/statistics': lambda: self.service.statistics(),
+            '/accounts': lambda: self.service.account_progress(),
+            '/articles': lambda: self.service.list_articles(
+                params.get('biz'), params.get('status'),
+                params.get('limit'), params.get('cursor')),
+            '/top': lambda: self.service.top_articles(
+                params.get('n'), params.get('biz'), params.get('cursor')),
+            '/hot': lambda: self.service.hot_articles(
+                params.get('min_z'), params.get('biz'), params.get('limit')),
+            '/search': lambda: self.service.search_articles(
+                params.get('q', ''), params.get('limit'), params.get('cursor')),
+            '/cache': lambda: self.service.cache_info(),
+        }
+        handler = routes.get(parsed.path.rstrip('/') or '/')
+        if handler is None:
+            self._send_json(404, {'error': f'unknown path: {parsed.path}'})
+            return
+        try:
+            self._send_json(200, handler())
+        except InvalidCursor as e:
+            self._send_json(400, {'error': str(e)})
+        except sqlite3.Error as e:
+            self._send_json(500, {'error': str(e)})
+
+    def _send_json(self, status: int, payload: Any):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # 看板轮询频繁，不逐条输出访问日志
+        pass
+
+
+def create_server(host: str = None, port: int = None,
+                  service: QueryService = None) -> ThreadingHTTPServer:
+    """创建查询服务HTTP服务器（不启动）"""
+    from config import (QUERY_SERVICE_HOST, QUERY_SERVICE_PORT,
+                        QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+    if host is None:
+        host = QUERY_SERVICE_HOST
+    if port is None:
+        port = QUERY_SERVICE_PORT
+    if service is None:
+        service = QueryService(cache_size=QUERY_CACHE_SIZE, cache_ttl=QUERY_CACHE_TTL)
+
+    handler = type('BoundQueryRequestHandler', (QueryRequestHandler,),
+                   {'service': service})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def serve_forever(host: str = None, port: int = None):
+    """启动查询服务"""
+    server = create_server(host, port)
+    address, bound_port = server.server_address[:2]
+    print(f"🌐 查询服务已启动: http://{address}:{bound_port}")
+    print("  可用接口: /statistics /accounts /articles /top /hot /search /cache")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n停止查询服务")
+    finally:
+        server.server_close()
+        server.RequestHandlerClass.service.close()
+
+
+if __name__ == "__main__":
+    serve_forever()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+公众号登记表
+要监控的公众号保存在数据库的 account_registry / account_tags 表中（优先级、标签、守护进程调度间隔），
+支持从 CSV / JSON 批量导入；登记表为空时用 config.TARGET_ACCOUNTS 和已采集过的公众号初始化
+CSV 列: biz,nick_name,tags,priority,enabled,sync_interval,stats_interval,detail_interval
+（tags 用 |、; 或逗号分隔；只有 biz 必填，空单元格保留原值）
+JSON: [{"biz": ..., "nick_name": ..., "tags": ["心理"], "priority": 5}, ...]
+"""
+
+import argparse
+import csv
+import json
+import re
+from typing import Dict, List, Tuple
+
+import config
+import database
+from db_manager import DatabaseManager
+
+INTERVAL_FIELDS = ('sync_interval', 'stats_interval', 'detail_interval')
+_TAG_SEPARATORS = re.compile(r'[|;，,]')
+
+
+def _normalize_entry(raw: Dict) -> Dict:
+    """统一一条导入记录的字段类型，空值视为未指定"""
+    def value(key):
+        item = raw.get(key)
+        if isinstance(item, str):
+            item = item.strip()
+        return None if item in ('', None) else item
+
+    biz = value('biz')
+    if not biz:
+        raise ValueError("缺少 biz")
+    entry = {'biz': biz, 'nick_name': value('nick_name')}
+    if value('priority') is not None:
+        entry['priority'] = int(value('priority'))
+    if value('enabled') is not None:
+        enabled = value('enabled')
+        if isinstance(enabled, str):
+            enabled = enabled.lower() not in ('0', 'false', 'no', 'n')
+        entry['enabled'] = int(bool(enabled))
+    for field in INTERVAL_FIELDS:
+        if value(field) is not None:
+            entry[field] = float(value(field))
+    tags = raw.get('tags')
+    if isinstance(tags, str):
+        tags = _TAG_SEPARATORS.split(tags) if tags.strip() else None
+    if tags is not None:
+        entry['tags'] = sorted({tag.strip() for tag in tags if tag and tag.strip()})
+    return entry
+
+
+def read_entries(path: str) -> Tuple[List[Dict], List[str]]:
+    """
+    读取 CSV 或 JSON 文件（按扩展名判断）
+    Returns:
+        (有效记录, 错误说明)；同一 biz 出现多次时以最后一条为准
+    """
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith('.json'):
+            data = json.load(f)
+            rows = data.get('accounts', []) if isinstance(data, dict) else data
+        else:
+            rows = list(csv.DictReader(f))
+
+    entries, errors = {}, []
+    for line, raw in enumerate(rows, 1):
+        try:
+            entry = _normalize_entry(raw)
+        except (ValueError, TypeError, AttributeError) as e:
+            errors.append(f"第 {line} 条: {e}")
+            continue
+        entries[entry['biz']] = entry
+    return list(entries.values()), errors
+
+
+def import_file(db: DatabaseManager, path: str) -> Tuple[int, List[str]]:
+    """导入文件到登记表，返回 (登记条数, 错误说明)"""
+    ensure_seeded(db)
+    entries, errors = read_entries(path)
+    return (db.upsert_registry_accounts(entries) if entries else 0), errors
+
+
+def ensure_seeded(db: DatabaseManager) -> int:
+    """登记表为空时用配置中的公众号初始化"""
+    return db.seed_account_registry(config.TARGET_ACCOUNTS)
+
+
+def load_entries(db: DatabaseManager, tag: str = None) -> List[Dict]:
+    """启用的公众号登记记录（按优先级从高到低；tag 默认取 config.ACCOUNT_TAG）"""
+    ensure_seeded(db)
+    return db.get_registry_accounts(config.ACCOUNT_TAG if tag is None else tag)
+
+
+def target_accounts(db: DatabaseManager = None, tag: str = None) -> List[Tuple[str, str]]:
+    """要采集的公众号 [(biz, nick_name), ...]，替代原来写死在配置中的列表"""
+    entries = load_entries(db or DatabaseManager(), tag)
+    return [(entry['biz'], entry['nick_name']) for entry in entries]
+
+
+def print_registry(db: DatabaseManager, tag: str = None, include_disabled: bool = False):
+    ensure_seeded(db)
+    entries = db.get_registry_accounts(tag, enabled_only=not include_disabled)
+    print(f"📋 登记的公众号: {len(entries)} 个{f'（标签 {tag}）' if tag else ''}")
+    for entry in entries:
+        if entry['account_id'] is None:
+            progress = "未开始"
+        else:
+            progress = "列表完成" if entry['stop_flag'] else f"第{entry['last_page']}页"
+        intervals = ' '.join(f"{field.split('_')[0]}={entry[field]:g}s"
+                             for field in INTERVAL_FIELDS if entry[field] is not None)
+        flags = '' if entry['enabled'] else ' ⏸️停用'
+        print(f"  [{entry['priority']:>3}] {entry['nick_name']} ({entry['biz']}) "
+              f"{progress}{flags} {entry['tags'] or ''} {intervals}".rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="管理要监控的公众号登记表")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--import', dest='import_path', metavar='FILE',
+                        help="从 CSV / JSON 文件批量登记或更新")
+    parser.add_argument('--enable', nargs='+', metavar='BIZ', help="启用公众号")
+    parser.add_argument('--disable', nargs='+', metavar='BIZ', help="停用公众号（保留已采集数据）")
+    parser.add_argument('--tag', default=None, help="只列出带该标签的公众号")
+    parser.add_argument('--all', action='store_true', help="列出时包括已停用的公众号")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    db = DatabaseManager()
+
+    if args.import_path:
+        count, errors = import_file(db, args.import_path)
+        for error in errors[:20]:
+            print(f"  ⚠️ {error}")
+        if len(errors) > 20:
+            print(f"  ⚠️ ... 共 {len(errors)} 条错误")
+        print(f"✅ 已登记 {count} 个公众号，跳过 {len(errors)} 条")
+    if args.enable:
+        print(f"✅ 已启用 {db.set_registry_enabled(args.enable, True)} 个公众号")
+    if args.disable:
+        print(f"✅ 已停用 {db.set_registry_enabled(args.disable, False)} 个公众号")
+    if not (args.import_path or args.enable or args.disable) or args.tag:
+        print_registry(db, args.tag, args.all)
+
+
+if __name__ == "__main__":
+    main()
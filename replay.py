@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+离线重放：从 api_raw_responses 批量重建规范化表
+不访问网络。流式读取原始响应（冷库、主库、各分片），多进程并行解析，大事务批量写入
+accounts / articles / article_stats / article_contents；启用分片时文章内容写入对应分片
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from collections import deque
+from multiprocessing import Pool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import config
+import database
+import parsers
+import sharding
+from db_manager import DatabaseManager
+
+READ_CHUNK = 500
+COMMIT_EVERY = 20000
+
+
+# ==================== 解析（在工作进程中执行） ====================
+
+def _parse_post_history(rows: List[Tuple]) -> List[Dict]:
+    pages = []
+    for request_key, response_text, _ in rows:
+        try:
+            response = json.loads(response_text)
+            biz, page = parsers.biz_from_request_key(request_key)
+        except ValueError:
+            continue
+        if response.get('code') != 0:
+            continue
+        articles = response.get('data') or []
+        kept, has_old = parsers.split_list_page(articles)
+        pages.append({
+            'biz': biz,
+            'page': page,
+            'nick_name': response.get('mp_nickname'),
+            'ghid': response.get('mp_ghid'),
+            'rows': [parsers.article_list_row(a) for a in kept if a.get('url')],
+            'reached_end': has_old or not articles,
+        })
+    return pages
+
+
+def _parse_read_zan(rows: List[Tuple]) -> List[Tuple]:
+    parsed = []
+    for request_key, response_text, created_at in rows:
+        try:
+            response = json.loads(response_text)
+        except ValueError:
+            continue
+        if response.get('code') != 0:
+            continue
+        parsed.append(parsers.stats_row(response.get('data') or {}) + (created_at, request_key))
+    return parsed
+
+
+def _parse_article_detail(rows: List[Tuple]) -> List[Tuple]:
+    parsed = []
+    for request_key, response_text, _ in rows:
+        try:
+            response = json.loads(response_text)
+        except ValueError:
+            continue
+        if response.get('code') != 0:
+            continue
+        parsed.append((parsers.content_row(response), parsers.content_author(response),
+                       request_key))
+    return parsed
+
+
+PARSERS = {
+    'post_history': _parse_post_history,
+    'read_zan_pro': _parse_read_zan,
+    'article_detail': _parse_article_detail,
+}
+
+
+def _parse_chunk(task: Tuple[str, List[Tuple]]):
+    api_type, rows = task
+    return PARSERS[api_type](rows)
+
+
+# ==================== 读取与写入（主进程） ====================
+
+def stream_raw_chunks(conn: sqlite3.Connection, api_type: str, chunk_size: int = READ_CHUNK,
+                      db: str = 'main') -> Iterator[Tuple[str, List[Tuple]]]:
+    """按 id 做 keyset 分页，流式读取某个库中的某类原始响应"""
+    last_id = 0
+    while True:
+        rows = conn.execute(f'''
+            SELECT id, request_key, response_data, created_at FROM {db}.api_raw_responses
+            WHERE api_type = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        ''', (api_type, last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield api_type, [(row[1], row[2], row[3]) for row in rows]
+
+
+def attach_archive(conn: sqlite3.Connection, archive_path: str = None) -> bool:
+    """把冷库 ATTACH 为 archive（与 get_statistics 相同）；冷库不存在或没有原始响应表时返回 False"""
+    archive_path = archive_path or config.RAW_ARCHIVE_PATH
+    if not os.path.exists(archive_path):
+        return False
+    conn.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+    if conn.execute("SELECT 1 FROM archive.sqlite_master WHERE name = 'api_raw_responses'").fetchone():
+        return True
+    conn.execute('DETACH DATABASE archive')
+    return False
+
+
+def iter_raw_chunks(reader: sqlite3.Connection, api_type: str, chunk_size: int,
+                    has_archive: bool, router: Optional[sharding.ShardRouter]
+                    ) -> Iterator[Tuple[str, List[Tuple]]]:
+    """
+    依次读取冷库、主库和各分片中的原始响应：冷库中是较早的响应，
+    先重放，主库和分片中重新获取的响应随后覆盖
+    """
+    if has_archive:
+        yield from stream_raw_chunks(reader, api_type, chunk_size, 'archive')
+    yield from stream_raw_chunks(reader, api_type, chunk_size)
+    if router is None:
+        return
+    for shard in router.list_shards():
+        conn = router.connect(shard)
+        try:
+            yield from stream_raw_chunks(conn, api_type, chunk_size)
+        finally:
+            conn.close()
+
+
+class BulkLoader:
+    """
+    单连接批量写入，每 COMMIT_EVERY 行提交一次
+    启用分片时文章内容写入文章所在分片（每个分片一个连接，与主库同时提交）
+    """
+
+    def __init__(self, conn: sqlite3.Connection, router: sharding.ShardRouter = None):
+        self.conn = conn
+        self.router = router
+        self.shard_conns: Dict[str, sqlite3.Connection] = {}
+        self.pending = 0
+        self.counts = {}
+        self.account_ids = {}
+        self.account_pages = {}  # biz -> (last_page, stop_flag)
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        conn.execute('PRAGMA cache_size = -200000')
+        conn.execute('BEGIN')
+
+    def _shard_conn(self, shard: str) -> sqlite3.Connection:
+        conn = self.shard_conns.get(shard)
+        if conn is None:
+            conn = self.router.connect(shard)
+            conn.execute('PRAGMA synchronous = OFF')
+            self.shard_conns[shard] = conn
+        return conn
+
+    def _commit_shards(self):
+        # 分片先于主库提交（与 save_article_content 一致）
+        for conn in self.shard_conns.values():
+            conn.commit()
+
+    def _tick(self, table: str, n: int):
+        self.counts[table] = self.counts.get(table, 0) + n
+        self.pending += n
+        if self.pending >= COMMIT_EVERY:
+            self._commit_shards()
+            self.conn.execute('COMMIT')
+            self.conn.execute('BEGIN')
+            self.pending = 0
+
+    def _account_id(self, biz: str, nick_name: str, ghid: str) -> int:
+        account_id = self.account_ids.get(biz)
+        if account_id is None:
+            self.conn.execute('''
+                INSERT OR IGNORE INTO accounts (biz, nick_name, ghid) VALUES (?, ?, ?)
+            ''', (biz, nick_name or biz, ghid))
+            account_id = self.conn.execute(
+                'SELECT id FROM accounts WHERE biz = ?', (biz,)).fetchone()[0]
+            self.account_ids[biz] = account_id
+        return account_id
+
+    def clear_derived(self):
+        """清空统计和内容表（包括各分片中的文章内容）"""
+        self.conn.execute('DELETE FROM article_contents')
+        self.conn.execute('DELETE FROM article_stats')
+        for shard in self.router.list_shards() if self.router else []:
+            self._shard_conn(shard).execute('DELETE FROM article_contents')
+
+    def load_pages(self, pages: List[Dict]):
+        for page in pages:
+            account_id = self._account_id(page['biz'], page['nick_name'], page['ghid'])
+            last_page, stop_flag = self.account_pages.get(page['biz'], (0, False))
+            self.account_pages[page['biz']] = (max(last_page, page['page']),
+                                               stop_flag or page['reached_end'])
+            if not page['rows']:
+                continue
+            self.conn.executemany('''
+                INSERT INTO articles
+                (account_id, url, title, digest, post_time_str, post_time,
+                 original, position, cover_url, appmsgid, fetch_status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'list_only')
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title, digest = excluded.digest,
+                    post_time_str = excluded.post_time_str, post_time = excluded.post_time,
+                    original = excluded.original, position = excluded.position,
+                    cover_url = excluded.cover_url, appmsgid = excluded.appmsgid
+            ''', [(account_id,) + row for row in page['rows']])
+            self._tick('articles', len(page['rows']))
+
+    def load_stats(self, rows: List[Tuple]):
+        """统计数据按响应时间入库；已有的行只更新数值，保留原来的获取时间"""
+        if not rows:
+            return
+        self.conn.executemany('''
+            INSERT INTO article_stats
+            (article_id, read_num, zan, looking, share_num, collect_num, comment_count,
+             fetched_at)
+            SELECT id, ?, ?, ?, ?, ?, ?, IFNULL(?, CURRENT_TIMESTAMP) FROM articles WHERE url = ?
+            ON CONFLICT(article_id) DO UPDATE SET
+                read_num = excluded.read_num, zan = excluded.zan, looking = excluded.looking,
+                share_num = excluded.share_num, collect_num = excluded.collect_num,
+                comment_count = excluded.comment_count
+        ''', rows)
+        self._tick('article_stats', len(rows))
+
+    def load_contents(self, rows: List[Tuple]):
+        if not rows:
+            return
+        sql = '''
+            INSERT INTO article_contents
+            (article_id, title, content, content_html, copyright_stat,
+             source_url, ip_wording, picture_urls, video_urls)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(article_id) DO UPDATE SET
+                title = excluded.title, content = excluded.content,
+                content_html = excluded.content_html, copyright_stat = excluded.copyright_stat,
+                source_url = excluded.source_url, ip_wording = excluded.ip_wording,
+                picture_urls = excluded.picture_urls, video_urls = excluded.video_urls
+        '''
+        by_conn: Dict[Optional[str], List[Tuple]] = {}
+        for content, _, url in rows:
+            article = self.conn.execute('''
+                SELECT a.id, acc.biz, a.post_time_str
+                FROM articles a JOIN accounts acc ON acc.id = a.account_id
+                WHERE a.url = ?
+            ''', (url,)).fetchone()
+            if article is None:
+                continue
+            shard = self.router.shard_for_row(article[1], article[2]) if self.router else None
+            by_conn.setdefault(shard, []).append((article[0],) + content)
+        for shard, values in by_conn.items():
+            conn = self.conn if shard is None else self._shard_conn(shard)
+            conn.executemany(sql, values)
+        self.conn.executemany('''
+            UPDATE articles SET author = ? WHERE url = ? AND ? IS NOT NULL
+        ''', [(author, url, author) for _, author, url in rows])
+        self._tick('article_contents', len(rows))
+
+    def _sharded_content_ids(self):
+        """把各分片中已有内容的文章 id 收集到临时表，用于判断文章状态"""
+        self.conn.execute('CREATE TEMP TABLE IF NOT EXISTS sharded_content_ids '
+                          '(article_id INTEGER PRIMARY KEY)')
+        for shard in self.router.list_shards():
+            conn = self.router.connect(shard)
+            try:
+                cursor = conn.execute('SELECT article_id FROM article_contents')
+                while True:
+                    ids = cursor.fetchmany(READ_CHUNK)
+                    if not ids:
+                        break
+                    self.conn.executemany(
+                        'INSERT OR IGNORE INTO temp.sharded_content_ids VALUES (?)',
+                        [tuple(row) for row in ids])
+            finally:
+                conn.close()
+
+    def finish(self):
+        """集合式更新公众号进度和文章状态，标记需要重算指标的公众号，然后提交"""
+        self.conn.executemany('''
+            UPDATE accounts SET last_page = MAX(last_page, ?), stop_flag = (stop_flag OR ?)
+            WHERE biz = ?
+        ''', [(page, int(stop), biz) for biz, (page, stop) in self.account_pages.items()])
+        content_check = 'EXISTS (SELECT 1 FROM article_contents c WHERE c.article_id = articles.id)'
+        if self.router is not None:
+            self._commit_shards()
+            self._sharded_content_ids()
+            content_check += (' OR EXISTS (SELECT 1 FROM temp.sharded_content_ids s '
+                              'WHERE s.article_id = articles.id)')
+        self.conn.execute(f'''
+            UPDATE articles SET fetch_status = CASE
+                WHEN {content_check}
+                    THEN 'content_fetched'
+                WHEN EXISTS (SELECT 1 FROM article_stats s WHERE s.article_id = articles.id)
+                    THEN 'stats_fetched'
+                ELSE 'list_only'
+            END
+        ''')
+        # 统计数据已整体重写：原有指标和新载入统计的公众号都需要重算派生指标
+        self.conn.execute('''
+            INSERT OR IGNORE INTO article_metrics_dirty (account_id)
+            SELECT account_id FROM article_metrics
+            UNION
+            SELECT art.account_id FROM article_stats s JOIN articles art ON art.id = s.article_id
+        ''')
+        self.conn.execute('COMMIT')
+
+    def close(self):
+        for conn in self.shard_conns.values():
+            conn.close()
+        self.shard_conns.clear()
+
+
+def replay(db_path: str = None, workers: int = None, rebuild: bool = False,
+           chunk_size: int = READ_CHUNK) -> Dict:
+    """
+    从原始响应重建规范化表
+    Args:
+        db_path: 数据库文件（默认当前数据库）
+        workers: 解析进程数（默认CPU核数，1表示不启用多进程）
+        rebuild: 先清空 article_stats / article_contents 再重建
+        chunk_size: 每个解析任务包含的原始响应条数
+    """
+    if db_path:
+        database.set_database_path(db_path)
+    if not database.check_database_exists():
+        raise FileNotFoundError(f"数据库不存在: {database.DATABASE_PATH}")
+
+    workers = workers or os.cpu_count() or 1
+    router = sharding.get_router()
+    reader = sqlite3.connect(database.DATABASE_PATH)
+    has_archive = attach_archive(reader)
+    writer = sqlite3.connect(database.DATABASE_PATH, isolation_level=None)
+    started = time.perf_counter()
+    loader = None
+
+    try:
+        loader = BulkLoader(writer, router)
+        if rebuild:
+            loader.clear_derived()
+        load = {
+            'post_history': loader.load_pages,
+            'read_zan_pro': loader.load_stats,
+            'article_detail': loader.load_contents,
+        }
+
+        pool = Pool(workers) if workers > 1 else None
+        # 在途解析任务上限，保证读取不会把整张表读进内存
+        max_inflight = workers * 4
+        try:
+            # 文章列表必须先于统计和内容落库（后两者按url关联文章）
+            for api_type in ('post_history', 'read_zan_pro', 'article_detail'):
+                pending = deque()
+                for task in iter_raw_chunks(reader, api_type, chunk_size, has_archive, router):
+                    if pool is None:
+                        load[api_type](_parse_chunk(task))
+                        continue
+                    pending.append(pool.apply_async(_parse_chunk, (task,)))
+                    if len(pending) >= max_inflight:
+                        load[api_type](pending.popleft().get())
+                while pending:
+                    load[api_type](pending.popleft().get())
+                print(f"  ✅ 已重放 {api_type}")
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+
+        loader.finish()
+        DatabaseManager().refresh_article_metrics()
+    except Exception:
+        if writer.in_transaction:
+            writer.execute('ROLLBACK')
+        raise
+    finally:
+        if loader is not None:
+            loader.close()
+        reader.close()
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    return {'elapsed_s': round(elapsed, 3), 'workers': workers, 'rows': loader.counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="从原始响应（冷库、主库、各分片）离线重建规范化表")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--workers', type=int, default=None, help="解析进程数")
+    parser.add_argument('--chunk-size', type=int, default=READ_CHUNK)
+    parser.add_argument('--rebuild', action='store_true',
+                        help="先清空统计和内容表，再完整重建")
+    args = parser.parse_args()
+
+    print("🔁 开始离线重放原始响应...")
+    result = replay(args.database, args.workers, args.rebuild, args.chunk_size)
+    print(f"\n✅ 重放完成，耗时 {result['elapsed_s']:.2f}s（{result['workers']} 个解析进程）")
+    for table, count in result['rows'].items():
+        print(f"  {table}: {count} 行")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+费用感知的详情采集调度
+根据 api_raw_responses 中的历史 cost_money 估算各接口单价，
+在可用余额内挑选并排序待采集文章，使完整采集的文章数（或高阅读文章数）最大化
+"""
+
+from typing import Dict, List
+
+from db_manager import DatabaseManager
+import progress
+
+OBJECTIVES = ('complete', 'reads')
+
+
+class CostModel:
+    """各接口单次费用估计：优先使用历史实际费用，没有记录时使用默认值"""
+
+    def __init__(self, observed: Dict[str, Dict], defaults: Dict[str, float]):
+        self.costs = dict(defaults)
+        self.sources = {api_type: 'default' for api_type in defaults}
+        for api_type, row in observed.items():
+            if row['avg_cost']:
+                self.costs[api_type] = row['avg_cost']
+                self.sources[api_type] = f"历史{row['calls']}次"
+
+    @classmethod
+    def from_history(cls, db: DatabaseManager) -> 'CostModel':
+        from config import DEFAULT_API_COSTS
+        return cls(db.get_observed_api_costs(), DEFAULT_API_COSTS)
+
+    def remaining_cost(self, fetch_status: str) -> float:
+        """完成一篇文章还需的费用"""
+        cost = self.costs['article_detail']
+        if fetch_status == 'list_only':
+            cost += self.costs['read_zan_pro']
+        return cost
+
+
+class SchedulePlan:
+    """调度计划：按执行顺序排列的文章及费用估算"""
+
+    def __init__(self, objective: str, budget: float, cost_model: CostModel,
+                 selected: List[Dict], deferred: List[Dict]):
+        self.objective = objective
+        self.budget = budget
+        self.cost_model = cost_model
+        self.selected = selected
+        self.deferred = deferred
+
+    @property
+    def estimated_cost(self) -> float:
+        return sum(item['est_cost'] for item in self.selected)
+
+    @property
+    def deferred_cost(self) -> float:
+        return sum(item['est_cost'] for item in self.deferred)
+
+    def print_plan(self):
+        """打印计划（执行前展示）"""
+        by_status = {}
+        for item in self.selected:
+            by_status[item['fetch_status']] = by_status.get(item['fetch_status'], 0) + 1
+
+        print(f"\n{'='*60}")
+        print("详情采集调度计划")
+        print(f"{'='*60}")
+        print(f"优化目标: {'完成文章数最多' if self.objective == 'complete' else '高阅读文章优先'}")
+        print("接口单价估计:")
+        for api_type in ('read_zan_pro', 'article_detail'):
+            print(f"  {api_type}: {self.cost_model.costs[api_type]:.4f}元 "
+                  f"({self.cost_model.sources[api_type]})")
+        print(f"可用预算: {self.budget:.2f}元")
+        print(f"计划完成: {len(self.selected)} 篇，预计费用 {self.estimated_cost:.2f}元")
+        print(f"  其中仅差全文: {by_status.get('stats_fetched', 0)} 篇，"
+              f"需统计+全文: {by_status.get('list_only', 0)} 篇")
+        if self.deferred:
+            print(f"预算外暂缓: {len(self.deferred)} 篇，约需 {self.deferred_cost:.2f}元")
+        for item in self.selected[:10]:
+            print(f"  - [{item['fetch_status']}] {item['title'][:30]} "
+                  f"(预估阅读 {int(item['est_reads'])}, {item['est_cost']:.2f}元)")
+        if len(self.selected) > 10:
+            print(f"  ... 其余 {len(self.selected) - 10} 篇")
+
+
+def build_plan(db: DatabaseManager, balance: float, min_balance: float,
+               objective: str = 'complete') -> SchedulePlan:
+    """
+    生成调度计划
+    Args:
+        balance: 当前余额
+        min_balance: 需保留的最低余额
+        objective: complete=完成文章数最多；reads=按每元预估阅读数贪心挑选
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"未知的调度目标: {objective}")
+
+    cost_model = CostModel.from_history(db)
+    budget = max(0.0, balance - min_balance)
+
+    candidates = db.get_detail_candidates()
+    for item in candidates:
+        item['est_cost'] = cost_model.remaining_cost(item['fetch_status'])
+        # 未获取统计的文章用所属公众号的平均阅读数估值
+        item['est_reads'] = item['read_num'] if item['read_num'] is not None \
+            else (item['account_avg_read'] or 0)
+
+    if objective == 'complete':
+        # 单篇剩余费用越低越先做（仅差全文的优先），同价位新文章优先
+        candidates.sort(key=lambda x: (x['est_cost'], -_time_key(x)))
+    else:
+        candidates.sort(key=lambda x: (-(x['est_reads'] / x['est_cost']), -x['est_reads']))
+
+    selected, deferred = [], []
+    remaining = budget
+    for item in candidates:
+        # 为每篇文章预留完整费用，避免预算耗尽时留下只获取了统计的半成品
+        if item['est_cost'] <= remaining:
+            selected.append(item)
+            remaining -= item['est_cost']
+        else:
+            deferred.append(item)
+
+    return SchedulePlan(objective, budget, cost_model, selected, deferred)
+
+
+def _time_key(item: Dict) -> float:
+    value = item.get('post_time_str') or ''
+    return float(value[:10].replace('-', '') or 0)
+
+
+def run_plan(collector, plan: SchedulePlan) -> int:
+    """
+    按计划顺序采集，每篇文章完整完成后再进行下一篇
+    返回完成的文章数
+    """
+    completed = 0
+    total = len(plan.selected)
+    with progress.live(collector):
+        for idx, item in enumerate(plan.selected, 1):
+            collector.log.info(f"\n  [{idx}/{total}] {item['title'][:30]}...", url=item['url'])
+            if not collector.fetch_article_detail(item):
+                print("\n⚠️ 余额不足，调度执行中断")
+                break
+            exists, status = collector.db.check_article_exists(item['url'])
+            if status == 'content_fetched':
+                completed += 1
+    print(f"\n✅ 调度执行完成：{completed}/{total} 篇完成全部采集")
+    return completed
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+分片存储
+主库只保存元数据（accounts / articles / article_stats 等），体积大的
+api_raw_responses 和 article_contents 按公众号（哈希分桶）或文章发布月份
+写入独立的分片文件。不同分片的写入互不争用文件锁，旧分片可整文件归档或删除
+
+SHARD_MODE:
+- none: 不分片（默认），全部数据在主库
+- account: 按 biz 哈希分到 SHARD_BUCKETS 个分片
+- month: 按文章发布月份分片；文章列表（post_history）与月份无关，仍保存在主库
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import config
+import database
+import parsers
+
+SHARD_MODES = ('none', 'account', 'month')
+SHARDED_TABLES = ('api_raw_responses', 'article_contents')
+
+# 文章 -> 分片 的缓存上限
+ROUTE_CACHE_SIZE = 100000
+
+
+def _create_shard_tables(conn: sqlite3.Connection):
+    """分片文件中的表结构与主库对应表一致"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS api_raw_responses (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            api_type TEXT NOT NULL,
+            request_key TEXT NOT NULL,
+            request_params TEXT NOT NULL,
+            response_data TEXT NOT NULL,
+            response_code INTEGER,
+            cost_money REAL,
+            remain_money REAL,
+            key_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(api_type, request_key)
+        )
+    ''')
+    columns = [row[1] for row in conn.execute('PRAGMA table_info(api_raw_responses)')]
+    if 'key_id' not in columns:
+        # 旧分片文件：补充密钥指纹字段，同时清除请求参数中的明文密钥
+        conn.execute('BEGIN')
+        conn.execute('ALTER TABLE api_raw_responses ADD COLUMN key_id TEXT')
+        database.scrub_request_keys(conn)
+        conn.commit()
+    conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_api_raw_type_created
+        ON api_raw_responses(api_type, created_at)
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS article_contents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            article_id INTEGER NOT NULL UNIQUE,  -- 对应主库 articles.id
+            title TEXT,
+            content TEXT,
+            content_html TEXT,
+            copyright_stat INTEGER,
+            source_url TEXT,
+            ip_wording TEXT,
+            picture_urls TEXT,
+            video_urls TEXT,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+
+class ShardRouter:
+    """把原始响应和文章内容路由到分片文件"""
+
+    def __init__(self, mode: str, shard_dir: str, buckets: int = 8):
+        if mode not in SHARD_MODES or mode == 'none':
+            raise ValueError(f"未知的分片模式: {mode}")
+        self.mode = mode
+        self.shard_dir = shard_dir
+        self.buckets = max(1, buckets)
+        self._initialized = set()
+        self._routes: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+        os.makedirs(shard_dir, exist_ok=True)
+
+    # ==================== 路由 ====================
+
+    def shard_path(self, shard: str) -> str:
+        return os.path.join(self.shard_dir, f"{shard}.db")
+
+    def _bucket(self, biz: str) -> str:
+        digest = int(hashlib.md5(biz.encode()).hexdigest()[:8], 16)
+        return f"account_{digest % self.buckets:02d}"
+
+    def shard_for_account(self, biz: str) -> Optional[str]:
+        """公众号级数据（文章列表）所在分片；None 表示主库"""
+        return self._bucket(biz) if self.mode == 'account' else None
+
+    def shard_for_article(self, article_url: str) -> Optional[str]:
+        """文章级数据（统计响应、全文响应、文章内容）所在分片；文章不在主库时返回 None"""
+        with self._lock:
+            if article_url in self._routes:
+                return self._routes[article_url]
+
+        conn = database.get_connection()
+        try:
+            row = conn.execute('''
+                SELECT acc.biz, a.post_time_str
+                FROM articles a JOIN accounts acc ON acc.id = a.account_id
+                WHERE a.url = ?
+            ''', (article_url,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+
+        shard = self.shard_for_row(row['biz'], row['post_time_str'])
+        with self._lock:
+            if len(self._routes) >= ROUTE_CACHE_SIZE:
+                self._routes.clear()
+            self._routes[article_url] = shard
+        return shard
+
+    def shard_for_row(self, biz: str, post_time_str: Optional[str]) -> str:
+        """已知文章所属公众号和发布时间时直接计算分片（不查询主库）"""
+        if self.mode == 'account':
+            return self._bucket(biz)
+        month = (post_time_str or '')[:7]
+        return f"month_{month.replace('-', '_')}" if len(month) == 7 else "month_unknown"
+
+    def shard_for_raw(self, api_type: str, request_key: str) -> Optional[str]:
+        if api_type == 'post_history':
+            biz, _ = parsers.biz_from_request_key(request_key)
+            return self.shard_for_account(biz)
+        return self.shard_for_article(request_key)
+
+    # ==================== 连接 ====================
+
+    def connect(self, shard: Optional[str]) -> sqlite3.Connection:
+        """打开分片连接（首次使用时建表）；shard 为 None 时返回主库连接"""
+        if shard is None:
+            return database.get_connection()
+        path = self.shard_path(shard)
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        if path not in self._initialized:
+            _create_shard_tables(conn)
+            self._initialized.add(path)
+        return conn
+
+    def list_shards(self) -> List[str]:
+        if not os.path.isdir(self.shard_dir):
+            return []
+        return sorted(name[:-3] for name in os.listdir(self.shard_dir) if name.endswith('.db'))
+
+    # ==================== 跨分片读取 ====================
+
+    def query_all(self, sql: str, params: Tuple = ()) -> Iterator[sqlite3.Row]:
+        """
+        在主库和每个分片上执行同一查询并依次返回结果行
+        sql 中用 {db} 表示库名，例如 SELECT ... FROM {db}.api_raw_responses；
+        分片逐个 ATTACH 到主库连接，不受 SQLite 同时附加数量的限制
+        """
+        conn = database.get_connection()
+        try:
+            yield from conn.execute(sql.format(db='main'), params)
+            for shard in self.list_shards():
+                conn.execute("ATTACH DATABASE ? AS shard", (self.shard_path(shard),))
+                try:
+                    yield from conn.execute(sql.format(db='shard'), params).fetchall()
+                finally:
+                    conn.execute("DETACH DATABASE shard")
+        finally:
+            conn.close()
+
+    # ==================== 分片管理 ====================
+
+    def archive_shard(self, shard: str, archive_dir: str) -> str:
+        """把整个分片文件移动到归档目录"""
+        os.makedirs(archive_dir, exist_ok=True)
+        target = os.path.join(archive_dir, f"{shard}.db")
+        shutil.move(self.shard_path(shard), target)
+        self._forget(shard)
+        return target
+
+    def drop_shard(self, shard: str):
+        """删除整个分片文件（其中的原始响应和文章内容一并删除）"""
+        os.remove(self.shard_path(shard))
+        self._forget(shard)
+
+    def _forget(self, shard: str):
+        self._initialized.discard(self.shard_path(shard))
+
+    def migrate_from_main(self, batch_size: int = 1000) -> Dict[str, int]:
+        """把主库中已有的原始响应和文章内容移动到对应分片"""
+        moved = {table: 0 for table in SHARDED_TABLES}
+        conn = database.get_connection()
+        try:
+            last_id = 0
+            while True:
+                rows = conn.execute('''
+                    SELECT * FROM api_raw_responses WHERE id > ? ORDER BY id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                moved['api_raw_responses'] += self._move_rows(
+                    conn, 'api_raw_responses',
+                    [(self.shard_for_raw(r['api_type'], r['request_key']), r) for r in rows])
+
+            last_id = 0
+            while True:
+                rows = conn.execute('''
+                    SELECT c.*, a.url AS article_url FROM article_contents c
+                    JOIN articles a ON a.id = c.article_id
+                    WHERE c.id > ? ORDER BY c.id LIMIT ?
+                ''', (last_id, batch_size)).fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1]['id']
+                moved['article_contents'] += self._move_rows(
+                    conn, 'article_contents',
+                    [(self.shard_for_article(r['article_url']), r) for r in rows])
+        finally:
+            conn.close()
+        return moved
+
+    def _move_rows(self, main_conn: sqlite3.Connection, table: str,
+                   routed: List[Tuple[Optional[str], sqlite3.Row]]) -> int:
+        by_shard: Dict[str, List[sqlite3.Row]] = {}
+        for shard, row in routed:
+            if shard is not None:
+                by_shard.setdefault(shard, []).append(row)
+
+        moved = 0
+        for shard, rows in by_shard.items():
+            columns = [c for c in rows[0].keys() if c not in ('id', 'article_url')]
+            shard_conn = self.connect(shard)
+            try:
+                shard_conn.executemany(
+                    f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}) "
+                    f"VALUES ({', '.join('?' * len(columns))})",
+                    [tuple(row[c] for c in columns) for row in rows])
+                shard_conn.commit()
+            finally:
+                shard_conn.close()
+            # 分片写入成功后再从主库删除
+            main_conn.executemany(f"DELETE FROM {table} WHERE id = ?",
+                                  [(row['id'],) for row in rows])
+            main_conn.commit()
+            moved += len(rows)
+        return moved
+
+
+_router: Optional[ShardRouter] = None
+_router_key = None
+
+
+def get_router() -> Optional[ShardRouter]:
+    """
+    当前数据库对应的分片路由（进程内共享）；未启用分片时返回 None
+    分片目录默认在数据库文件旁边：<数据库名>_shards/
+    """
+    global _router, _router_key
+    if config.SHARD_MODE == 'none':
+        return None
+    shard_dir = config.SHARD_DIR or os.path.splitext(database.DATABASE_PATH)[0] + '_shards'
+    key = (config.SHARD_MODE, os.path.abspath(shard_dir), config.SHARD_BUCKETS)
+    if _router is None or _router_key != key:
+        _router = ShardRouter(config.SHARD_MODE, shard_dir, config.SHARD_BUCKETS)
+        _router_key = key
+    return _router
+
+
+def main():
+    parser = argparse.ArgumentParser(description="分片文件管理")
+    parser.add_argument('--database', help="主库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--migrate', action='store_true',
+                        help="把主库中已有的原始响应和文章内容移动到分片")
+    parser.add_argument('--archive', metavar='SHARD', help="把分片文件移动到归档目录")
+    parser.add_argument('--archive-dir', default='shard_archive')
+    parser.add_argument('--drop', metavar='SHARD', help="删除分片文件")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    database.ensure_schema()
+    router = get_router()
+    if router is None:
+        print("未启用分片（SHARD_MODE=none）")
+        return
+
+    if args.migrate:
+        moved = router.migrate_from_main()
+        print("✅ 已迁移: " + ', '.join(f"{t} {n} 行" for t, n in moved.items()))
+    if args.archive:
+        print(f"📦 已归档: {router.archive_shard(args.archive, args.archive_dir)}")
+    if args.drop:
+        confirm = input(f"确认删除分片 {args.drop}？其中的原始响应和文章内容将无法恢复 (y/n): ")
+        if confirm.strip().lower() == 'y':
+            router.drop_shard(args.drop)
+            print(f"🗑️ 已删除分片 {args.drop}")
+
+    print(f"\n分片模式: {router.mode}，目录: {router.shard_dir}")
+    for shard in router.list_shards():
+        size = os.path.getsize(router.shard_path(shard)) / 1024
+        print(f"  {shard}: {size:.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
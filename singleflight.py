@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+在途请求合并（single-flight）
+同一 (api_type, request_key) 同时只发出一个请求，并发调用方等待并共享其结果，
+避免转载文章、重试与断点续传重叠时对同一URL重复付费
+"""
+
+import functools
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import metrics
+
+
+class _Call:
+    """一个在途请求"""
+
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """按键合并并发调用"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行 fn 或等待同键的在途调用
+        Returns:
+            (结果, 是否共享了其他调用方的结果)
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+# 进程内共享，不同采集器实例之间同样合并
+GROUP = SingleFlight()
+
+
+def coalesced(api_type: str, key_func: Callable[..., Hashable]):
+    """
+    采集器 call_api_* 方法的合并装饰器
+    Args:
+        api_type: 接口类型
+        key_func: 由方法参数计算合并键：request_key（与 api_raw_responses 一致），
+                  以及影响结果的参数（如 use_cache，跳过缓存的调用不能共享读缓存的结果）
+    共享到的结果如果是领头请求从网络获取的，计为节省一次付费调用
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            key = (api_type, key_func(*args, **kwargs))
+
+            def lead():
+                self._local.last_source = None
+                result = func(self, *args, **kwargs)
+                return result, getattr(self._local, 'last_source', None)
+
+            (result, source), shared = GROUP.do(key, lead)
+            if shared:
+                metrics.API_COALESCED.inc(api_type=api_type, source=source or 'none')
+            return result
+
+        return wrapper
+
+    return decorator
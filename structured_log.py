@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+结构化日志
+- 采集线程只把日志记录放入队列（QueueHandler），格式化和写文件由后台线程完成，不阻塞采集
+- 文件为 JSON Lines，每行包含时间、级别、线程、消息和上下文字段（biz、url、api_type、latency_ms 等）
+- 控制台只输出消息本身：平时显示 WARNING 及以上，VERBOSE 时显示 INFO
+- INFO 及以下按调用位置限速，同一行代码每秒最多输出 LOG_SAMPLE_RATE 条，
+  被丢弃的条数记在下一条输出的 suppressed 字段中
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+import config
+
+ROOT_LOGGER = 'wechat'
+
+_setup_lock = threading.Lock()
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """每条记录一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'ts': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'msg': record.getMessage().strip(),
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _ConsoleHandler(logging.StreamHandler):
+    """写到当前的 sys.stdout（与 print 输出一致，重定向后也能捕获）"""
+
+    def __init__(self):
+        super().__init__(sys.stdout)
+
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        # 终端中先清掉进度显示所在的行（见 progress.py），下次刷新时再画出来
+        return f"\r\033[K{message}" if sys.stdout.isatty() else message
+
+
+class _ConsoleLevelFilter(logging.Filter):
+    """控制台级别随 config.VERBOSE 变化（main.py --verbose 在启动后才设置）"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= (logging.INFO if config.VERBOSE else logging.WARNING)
+
+
+class RateLimitFilter(logging.Filter):
+    """按调用位置的令牌桶限速，只作用于 INFO 及以下"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        self._buckets = {}  # (pathname, lineno) -> [tokens, last_time, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.rate <= 0 or record.levelno >= logging.WARNING:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(site)
+            if bucket is None:
+                bucket = self._buckets[site] = [self.rate, now, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.fields = dict(getattr(record, 'fields', None) or {}, suppressed=suppressed)
+        return True
+
+
+class StructuredLogger:
+    """带上下文字段的日志接口：log.info("消息", biz=..., url=...)"""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def _log(self, level: int, message: str, fields: Dict, exc_info=None):
+        if self.logger.isEnabledFor(level):
+            # stacklevel=3 让限速和 JSON 中的位置指向调用方，而不是本类
+            self.logger.log(level, message, extra={'fields': fields},
+                            exc_info=exc_info, stacklevel=3)
+
+    def debug(self, message: str, **fields):
+        self._log(logging.DEBUG, message, fields)
+
+    def info(self, message: str, **fields):
+        self._log(logging.INFO, message, fields)
+
+    def warning(self, message: str, **fields):
+        self._log(logging.WARNING, message, fields)
+
+    def error(self, message: str, exc_info=None, **fields):
+        self._log(logging.ERROR, message, fields, exc_info)
+
+
+def setup_logging(path: str = None, level: str = None) -> Optional[logging.handlers.QueueListener]:
+    """
+    配置日志管道（每个进程只执行一次，重复调用直接返回）
+    Args:
+        path: JSON Lines 文件路径（默认 config.LOG_PATH，留空只输出到控制台）
+        level: 记录级别（默认 config.LOG_LEVEL）
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        path = config.LOG_PATH if path is None else path
+        root = logging.getLogger(ROOT_LOGGER)
+        root.setLevel(getattr(logging, (level or config.LOG_LEVEL).upper(), logging.INFO))
+        root.propagate = False
+
+        console = _ConsoleHandler()
+        console.setFormatter(logging.Formatter('%(message)s'))
+        console.addFilter(_ConsoleLevelFilter())
+        handlers = [console]
+        if path:
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            file_handler = logging.handlers.RotatingFileHandler(
+                path, maxBytes=config.LOG_MAX_BYTES, backupCount=config.LOG_BACKUP_COUNT,
+                encoding='utf-8')
+            file_handler.setFormatter(JsonLinesFormatter())
+            handlers.append(file_handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = logging.handlers.QueueHandler(log_queue)
+        # 限速放在入队之前，被丢弃的记录不占用队列和后台线程
+        queue_handler.addFilter(RateLimitFilter(config.LOG_SAMPLE_RATE))
+        root.addHandler(queue_handler)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers,
+                                                   respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+        return _listener
+
+
+def shutdown():
+    """写完队列中剩余的日志并停止后台线程"""
+    global _listener
+    with _setup_lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        logging.getLogger(ROOT_LOGGER).handlers.clear()
+        _listener = None
+
+
+def get_logger(name: str) -> StructuredLogger:
+    """获取模块日志（首次调用时配置日志管道）"""
+    setup_logging()
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"))
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+测试批次统计对比
+"""
+
+import csv
+import io
+
+import database
+from mock_api import MockApiConfig, MockApiServer
+from testutil import new_collector, run_tests, use_temp_database
+
+
+def test_batch_diff():
+    """新增、消失、变化和无变化的文章及阅读数差值"""
+    import batch_compare
+
+    use_temp_database()
+    with MockApiServer(MockApiConfig()) as server:
+        collector = new_collector(server)
+        assert collector.collect_list_page('D1', 1, 'diff') is not None
+
+    conn = database.get_connection()
+    try:
+        ids = [row['id'] for row in conn.execute('SELECT id FROM articles ORDER BY id')]
+        snapshot = 'INSERT INTO batch_articles (batch_id, article_id, fetch_status, read_num) ' \
+                   'VALUES (?, ?, ?, ?)'
+        conn.executemany(snapshot, [
+            ('old', ids[0], 'stats_fetched', 100),
+            ('old', ids[1], 'stats_fetched', 200),
+            ('old', ids[2], 'stats_fetched', 300),
+            ('old', ids[3], 'stats_fetched', 400),
+        ])
+        conn.executemany(snapshot, [
+            ('new', ids[1], 'stats_fetched', 200),
+            ('new', ids[2], 'content_fetched', 450),
+            ('new', ids[3], 'stats_fetched', 400),
+            ('new', ids[4], 'stats_fetched', 50),
+        ])
+        conn.commit()
+    finally:
+        conn.close()
+
+    summary = batch_compare.summarize('old', 'new')
+    assert summary == {
+        'new': {'articles': 1, 'read_delta': 50},
+        'removed': {'articles': 1, 'read_delta': -100},
+        'changed': {'articles': 1, 'read_delta': 150},
+        'unchanged': {'articles': 2, 'read_delta': 0},
+    }
+
+    rows = {row.article_id: row for row in batch_compare.iter_diff('old', 'new')}
+    assert {row.change for row in rows.values()} == {'new', 'removed', 'changed'}
+    assert rows[ids[2]].old_status == 'stats_fetched' and rows[ids[2]].new_status == 'content_fetched'
+    assert rows[ids[0]].new_read is None and rows[ids[0]].nick_name == 'diff'
+
+    top = list(batch_compare.iter_diff('old', 'new', order_by_delta=True, limit=1))
+    assert [row.article_id for row in top] == [ids[2]]
+    assert len(list(batch_compare.iter_diff('old', 'new', changes=['unchanged']))) == 2
+
+    output = io.StringIO()
+    assert batch_compare.export_csv('old', 'new', output) == 3
+    assert len(list(csv.reader(io.StringIO(output.getvalue())))) == 4
+
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试原始响应缓存的过期与归档
+"""
+
+import contextlib
+import io
+
+import config
+import database
+from mock_api import MockApiConfig, MockApiServer
+from testutil import new_collector, run_tests, use_temp_database
+
+TTL = {'post_history': 3600, 'read_zan_pro': 3600, 'article_detail': None}
+
+
+def _raw_rows(db: str = 'main'):
+    """[(api_type, request_key, response_code)]，db 为 archive 时读取冷库"""
+    conn = database.get_connection()
+    try:
+        if db == 'archive':
+            conn.execute('ATTACH DATABASE ? AS archive', (config.RAW_ARCHIVE_PATH,))
+        return sorted(tuple(row) for row in conn.execute(
+            f'SELECT api_type, request_key, response_code FROM {db}.api_raw_responses'))
+    finally:
+        conn.close()
+
+
+def test_eviction_keeps_permanent_results():
+    """过期的列表和阅读数归档；code 101 和未解析的正文留在热库；过期后缓存不再命中"""
+    import db_manager
+    from cache_eviction import RawCacheEvictor
+
+    use_temp_database()
+    mock_config = MockApiConfig(articles_per_account=8, old_articles=1, deleted_rate=0.3)
+    saved_ttl = dict(db_manager.RAW_CACHE_TTL)
+    db_manager.RAW_CACHE_TTL.update(TTL)
+    try:
+        with MockApiServer(mock_config) as server, contextlib.redirect_stdout(io.StringIO()):
+            collector = new_collector(server)
+            for biz in ('E1', 'E2'):
+                collector.collect_account_articles(biz, f"evict_{biz}")
+            # 不在 articles 表中的文章：正文响应已缓存但未解析入库
+            unparsed = [article['url'] for article in server.state.articles_for('E3')
+                        if not server.state.is_deleted(article['url'])][:2]
+            for url in unparsed:
+                assert collector.call_api_3_article_detail(url)['code'] == 0
+
+            hot = _raw_rows()
+            deleted = [row for row in hot if row[2] == 101]
+            assert deleted, "模拟服务应返回已删除的文章"
+            stats_url = next(row[1] for row in hot
+                             if row[0] == 'read_zan_pro' and row[2] == 0)
+
+            conn = database.get_connection()
+            conn.execute("UPDATE api_raw_responses SET created_at = datetime('now', '-1 day')")
+            conn.commit()
+            conn.close()
+
+            # 过期后列表和阅读数不再命中缓存，code 101 和正文仍然命中
+            db = collector.db
+            assert db.get_raw_response('read_zan_pro', stats_url) is None
+            assert db.get_raw_response('post_history', 'E1_1') is None
+            assert db.get_raw_response(deleted[0][0], deleted[0][1])['code'] == 101
+            assert db.get_raw_response('article_detail', unparsed[0]) is not None
+
+            evictor = RawCacheEvictor(max_rows=1, ttl=TTL)
+            moved = evictor.run_until_idle()
+
+            remaining = _raw_rows()
+            archived = _raw_rows('archive')
+            assert moved == len(archived) == len(hot) - len(remaining)
+            assert set(remaining) == set(deleted) | {('article_detail', url, 0) for url in unparsed}
+            assert {row[0] for row in archived} == {'post_history', 'read_zan_pro', 'article_detail'}
+            assert not any(row[2] == 101 for row in archived)
+            assert evictor.stats()['archive']['read_zan_pro'] == sum(
+                1 for row in archived if row[0] == 'read_zan_pro')
+
+            # 已归档的阅读数重新付费获取
+            calls = server.state.summary()['calls']['read_zan_pro']
+            assert collector.call_api_2_read_zan(stats_url)['code'] == 0
+            assert server.state.summary()['calls']['read_zan_pro'] == calls + 1
+            # 已删除的文章仍由热库中的 code 101 命中，不再请求
+            calls = server.state.summary()['calls']
+            assert collector.call_api_2_read_zan(
+                next(row[1] for row in deleted if row[0] == 'read_zan_pro'))['code'] == 101
+            assert server.state.summary()['calls'] == calls
+    finally:
+        db_manager.RAW_CACHE_TTL.clear()
+        db_manager.RAW_CACHE_TTL.update(saved_ttl)
+
+
+if __name__ == "__main__":
+    run_tests(globals())
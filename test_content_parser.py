@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+测试正文HTML结构化解析
+"""
+
+from testutil import run_tests
+
+
+def test_content_parser():
+    """段落、换行、标题、图片，以及隐藏/跳过区域内未闭合的标签"""
+    from content_parser import parse_html, to_markdown
+
+    html = (
+        '<h2>第一节</h2>'
+        '<p>第一行<br>第二行</p>'
+        '<p><strong>整段加粗的小标题</strong></p>'
+        '<p><span style="font-size: 20px">大字号标题</span></p>'
+        '<p>这是一个普通的段落，以句号结尾。</p>'
+        '<section style="display: none"><p>隐藏<span>未闭合</section>'
+        '<p>隐藏区域之后的段落</p>'
+        '<script>var x = "<p>脚本</p>";</script>'
+        '<img data-src="https://example.com/a.png" data-w="600" data-ratio="0.5">'
+        '<img src="https://example.com/b.png">'
+    )
+    blocks = parse_html(html)
+    assert blocks == [
+        {'type': 'heading', 'level': 2, 'text': '第一节'},
+        {'type': 'paragraph', 'text': '第一行\n第二行'},
+        {'type': 'heading', 'level': 3, 'text': '整段加粗的小标题'},
+        {'type': 'heading', 'level': 2, 'text': '大字号标题'},
+        {'type': 'paragraph', 'text': '这是一个普通的段落，以句号结尾。'},
+        {'type': 'paragraph', 'text': '隐藏区域之后的段落'},
+        {'type': 'image', 'position': 0, 'src': 'https://example.com/a.png',
+         'width': 600, 'height': 300},
+        {'type': 'image', 'position': 1, 'src': 'https://example.com/b.png'},
+    ]
+
+    markdown = to_markdown(blocks, {'https://example.com/a.png': 'images/a.png'})
+    assert markdown.startswith('## 第一节\n\n第一行  \n第二行\n\n')
+    assert '![图1](images/a.png)' in markdown and '![图2](https://example.com/b.png)' in markdown
+
+    # 隐藏区域内嵌套同名标签：内层闭合时不结束跳过
+    nested = parse_html('<section style="display:none"><section>a</section>b</section>'
+                        '<p>正文</p>')
+    assert nested == [{'type': 'paragraph', 'text': '正文'}]
+    assert parse_html('') == [] and parse_html(None) == []
+
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+测试守护进程（针对本地模拟服务，间隔缩短到零点几秒）：
+按优先级派发、按间隔重复执行、SIGTERM / request_stop 停止、状态文件与健康检查
+"""
+
+import contextlib
+import io
+import os
+import signal
+import tempfile
+import threading
+import time
+
+import daemon
+from mock_api import MockApiConfig, MockApiServer
+from testutil import new_collector, run_tests, use_temp_database
+
+INTERVAL = 0.3
+
+
+def _accounts():
+    """三个公众号，优先级不同，三类任务都按 INTERVAL 执行"""
+    return [{'biz': biz, 'nick_name': f"daemon_{biz}", 'priority': priority,
+             'sync_interval': INTERVAL, 'stats_interval': INTERVAL, 'detail_interval': INTERVAL}
+            for biz, priority in (('D0', 0), ('D1', 1), ('D2', 5))]
+
+
+@contextlib.contextmanager
+def _fast_daemon():
+    """缩短公众号忙时的推迟时间（状态文件在启动时即写入，心跳精确到秒，写入间隔不缩短）"""
+    saved = daemon.BUSY_RETRY_DELAY
+    daemon.BUSY_RETRY_DELAY = 0.05
+    try:
+        yield
+    finally:
+        daemon.BUSY_RETRY_DELAY = saved
+
+
+def _record_dispatch(instance: daemon.Daemon) -> list:
+    """记录派发顺序 [(biz, job)]"""
+    dispatched = []
+    run_job = instance._run_job
+
+    def recording(biz, job, interval):
+        dispatched.append((biz, job))
+        return run_job(biz, job, interval)
+
+    instance._run_job = recording
+    return dispatched
+
+
+def _wait_until(condition, timeout: float = 30) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_schedule_priority_and_sigterm():
+    """单并发时高优先级先执行；任务按间隔重复；SIGTERM 后保存状态退出"""
+    use_temp_database()
+    status_path = os.path.join(tempfile.mkdtemp(prefix='wechat_test_'), 'status.json')
+    mock_config = MockApiConfig(articles_per_account=6, old_articles=1)
+    previous_handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+    with MockApiServer(mock_config) as server, _fast_daemon(), \
+            contextlib.redirect_stdout(io.StringIO()):
+        collector = new_collector(server)
+        instance = daemon.Daemon(collector, _accounts(), workers=1, jitter=0,
+                                 status_path=status_path)
+        dispatched = _record_dispatch(instance)
+        checks = {}
+        exited = threading.Event()
+
+        def watch():
+            # 每个任务至少执行两次后检查运行中的状态文件，再发送 SIGTERM
+            def repeated():
+                return all(dispatched.count((biz, job)) >= 2
+                           for biz in ('D0', 'D1', 'D2') for job in daemon.JOBS)
+
+            _wait_until(lambda: exited.is_set() or repeated())
+            checks['repeated'] = repeated()
+            checks['running'] = (daemon.read_status(status_path) or {}).get('state')
+            checks['healthy'] = daemon.print_status(status_path)
+            # 守护进程已自行退出时不再发送信号（信号处理已恢复为默认）
+            if not exited.is_set():
+                os.kill(os.getpid(), signal.SIGTERM)
+
+        watcher = threading.Thread(target=watch)
+        try:
+            watcher.start()
+            instance.run()
+        finally:
+            exited.set()
+            watcher.join()
+            signal.signal(signal.SIGTERM, previous_handlers[0])
+            signal.signal(signal.SIGINT, previous_handlers[1])
+
+    assert checks == {'repeated': True, 'running': 'running', 'healthy': True}
+    first = [biz for biz, _ in dispatched]
+    assert first.index('D2') < first.index('D1') < first.index('D0')
+    assert collector.stop_requested
+
+    status = daemon.read_status(status_path)
+    assert status['state'] == 'stopped' and status['running'] == []
+    assert status['recent_errors'] == []
+    assert all(status['totals'][job]['runs'] >= 3 for job in daemon.JOBS)
+    for biz, account in status['accounts'].items():
+        assert account['priority'] == {'D0': 0, 'D1': 1, 'D2': 5}[biz]
+        for state in account['jobs'].values():
+            assert state['last_run'] and state['next_due']
+    # 全部文章的统计和正文已获取
+    assert collector.db.get_statistics()['fetched_articles'] == 18
+    # 已停止的守护进程不健康
+    with contextlib.redirect_stdout(io.StringIO()):
+        assert not daemon.print_status(status_path)
+        assert not daemon.print_status(status_path + '.missing')
+
+
+def test_request_stop_and_resume_schedule():
+    """request_stop 后尽快退出；重启时沿用状态文件中的下次执行时间"""
+    use_temp_database()
+    status_path = os.path.join(tempfile.mkdtemp(prefix='wechat_test_'), 'status.json')
+    with MockApiServer(MockApiConfig(articles_per_account=6)) as server, _fast_daemon(), \
+            contextlib.redirect_stdout(io.StringIO()):
+        collector = new_collector(server)
+        instance = daemon.Daemon(collector, _accounts(), workers=2, jitter=0,
+                                 status_path=status_path)
+        thread = threading.Thread(target=instance.run)
+        thread.start()
+        assert _wait_until(lambda: instance.totals['sync']['runs'] >= 3)
+        instance.request_stop('test')
+        thread.join(timeout=30)
+        assert not thread.is_alive()
+        assert instance.state == 'stopped'
+
+        saved = daemon.read_status(status_path)['accounts']
+        restarted = daemon.Daemon(new_collector(server), _accounts(), jitter=0,
+                                  status_path=status_path)
+        restarted._initial_schedule()
+    for biz, jobs in restarted.jobs.items():
+        for job, state in jobs.items():
+            assert daemon._format_time(state['next_due']) == saved[biz]['jobs'][job]['next_due']
+
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+测试API密钥池：按余额和健康度选择、限速、耗尽后退出，明文密钥不落库
+"""
+
+import json
+import time
+
+import database
+from mock_api import MockApiConfig, MockApiServer
+from testutil import new_collector, run_tests, use_temp_database
+
+
+def test_key_pool():
+    """去重、按余额选择、限速令牌、耗尽后退出"""
+    from key_pool import KeyPool, key_fingerprint
+
+    pool = KeyPool(['a', 'b', 'a'], min_balance=1.0)
+    assert len(pool) == 2
+    first, second = pool.states
+    assert first.key_id == key_fingerprint('a') != 'a'
+
+    pool.set_balance(first, 5.0)
+    pool.set_balance(second, 8.0)
+    assert pool.acquire() is second
+
+    # 连续失败的密钥优先级降低
+    pool.report_error(second)
+    assert pool.acquire() is first
+    pool.report(second, {'code': 0, 'remain_money': 7.5})
+    assert pool.acquire() is second
+
+    pool.report(second, {'code': 102, 'remain_money': 7.5})
+    assert second.exhausted and pool.total_balance() == 5.0
+    pool.report(first, {'code': 0, 'remain_money': 0.5})
+    assert first.exhausted
+    assert not pool.has_available() and pool.acquire() is None
+
+    limited = KeyPool(['c'], min_balance=0, rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(3):
+        limited.acquire()
+    assert time.monotonic() - started >= 0.09
+
+
+def test_key_pool_rotation_against_mock_api():
+    """密钥按余额轮换直到全部耗尽，原始响应只记录密钥指纹"""
+    from key_pool import key_fingerprint
+
+    use_temp_database()
+    mock_config = MockApiConfig(key_balances={'key-one': 0.2, 'key-two': 0.15})
+    with MockApiServer(mock_config) as server:
+        collector = new_collector(server, api_keys=['key-one', 'key-two'], min_balance=0.05)
+        assert collector.current_balance == 0.35
+        urls = [article['url'] for article in server.state.articles_for('P1')]
+
+        fetched = 0
+        for url in urls:
+            if not collector.check_balance():
+                break
+            result = collector.call_api_2_read_zan(url)
+            assert result and result['code'] == 0
+            fetched += 1
+
+    # 余额多的优先：0.2 -> 0.14 -> 0.08 -> 0.02 与 0.15 -> 0.09 -> 0.03 交替使用
+    assert fetched == 5
+    assert all(state['exhausted'] for state in collector.key_pool.summary())
+
+    conn = database.get_connection()
+    try:
+        rows = conn.execute('SELECT key_id, request_params FROM api_raw_responses').fetchall()
+    finally:
+        conn.close()
+    assert {row['key_id'] for row in rows} == {key_fingerprint('key-one'),
+                                               key_fingerprint('key-two')}
+    for row in rows:
+        params = json.loads(row['request_params'])
+        assert 'key' not in params
+        assert 'key-one' not in row['request_params'] and 'key-two' not in row['request_params']
+
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+测试本地只读查询服务
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import urllib.error
+import urllib.request
+
+import database
+import sharding
+from testutil import run_tests, use_temp_database
+
+
+def _insert_articles(titles):
+    conn = database.get_connection()
+    try:
+        conn.execute("INSERT INTO accounts (biz, nick_name) VALUES ('Q1', 'query')")
+        conn.executemany('''
+            INSERT INTO articles (account_id, url, title, post_time_str)
+            VALUES ((SELECT id FROM accounts WHERE biz = 'Q1'), ?, ?, '2025-06-01 08:00:00')
+        ''', [(f"https://mp.weixin.qq.com/s/q{i}", title) for i, title in enumerate(titles)])
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _insert_raw(conn: sqlite3.Connection, request_key: str, cost: float):
+    conn.execute('''
+        INSERT INTO api_raw_responses
+        (api_type, request_key, request_params, response_data, response_code,
+         cost_money, remain_money)
+        VALUES ('read_zan_pro', ?, '{}', '{}', 0, ?, 10)
+    ''', (request_key, cost))
+    conn.commit()
+
+
+def test_service_uses_given_database():
+    """指定的数据库被检查和升级表结构，当前目录下不产生默认数据库"""
+    from query_service import QueryService
+
+    workdir = tempfile.mkdtemp(prefix='wechat_test_')
+    other = os.path.join(tempfile.mkdtemp(prefix='wechat_test_'), 'other.db')
+    previous = os.getcwd()
+    os.chdir(workdir)
+    try:
+        database.set_database_path('wechat_articles.db')
+        service = QueryService(db_path=other)
+        try:
+            assert service.statistics()['total_articles'] == 0
+        finally:
+            service.close()
+        assert not os.path.exists(os.path.join(workdir, 'wechat_articles.db'))
+        conn = sqlite3.connect(other)
+        try:
+            assert conn.execute('PRAGMA user_version').fetchone()[0] == database.SCHEMA_VERSION
+        finally:
+            conn.close()
+    finally:
+        os.chdir(previous)
+
+
+def test_search_escapes_like_wildcards():
+    """搜索词中的 % _ \\ 按字面匹配"""
+    from query_service import QueryService
+
+    path = use_temp_database()
+    _insert_articles(['100% 真实', '100 真实', 'a_b', 'axb', 'c\\d'])
+    service = QueryService(db_path=path)
+    try:
+        def titles(q):
+            return sorted(item['title'] for item in service.search_articles(q)['items'])
+
+        assert titles('100%') == ['100% 真实']
+        assert titles('a_b') == ['a_b']
+        assert titles('c\\d') == ['c\\d']
+        assert titles('真实') == ['100 真实', '100% 真实']
+    finally:
+        service.close()
+
+
+def test_statistics_cache_sees_shard_and_archive_writes():
+    """只写入分片或冷库时，缓存的统计同样失效"""
+    from cache_eviction import RawCacheEvictor
+    from db_manager import DatabaseManager
+    from query_service import QueryService
+
+    path = use_temp_database('account')
+    router = sharding.get_router()
+    service = QueryService(db_path=path)
+    try:
+        assert service.statistics()['total_cost'] == 0
+
+        shard = router.connect(router.shard_for_account('Q1'))
+        try:
+            _insert_raw(shard, 'https://mp.weixin.qq.com/s/shard', 0.06)
+        finally:
+            shard.close()
+        assert round(service.statistics()['total_cost'], 2) == 0.06
+
+        archive = RawCacheEvictor()._connect()
+        try:
+            archive.execute('''
+                INSERT INTO archive.api_raw_responses
+                (api_type, request_key, request_params, response_data, cost_money)
+                VALUES ('read_zan_pro', 'https://mp.weixin.qq.com/s/old', '{}', '{}', 0.06)
+            ''')
+        finally:
+            archive.close()
+        assert round(service.statistics()['total_cost'], 2) == 0.12
+        assert service.statistics() == DatabaseManager().get_statistics()
+    finally:
+        service.close()
+
+
+def test_invalid_cursor_returns_400():
+    """无法解码或形状不对的游标返回 400，合法游标正常翻页"""
+    from query_service import QueryService, create_server
+
+    path = use_temp_database()
+    _insert_articles([f"文章{i}" for i in range(5)])
+    server = create_server('127.0.0.1', 0, QueryService(db_path=path))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        def status(url):
+            try:
+                with urllib.request.urlopen(base + url) as response:
+                    return response.status, json.load(response)
+            except urllib.error.HTTPError as e:
+                return e.code, None
+
+        for raw in (b'5', b'[1]', b'[{"a": 1}, 2]'):
+            cursor = base64.urlsafe_b64encode(raw).decode()
+            assert status(f"/articles?cursor={cursor}")[0] == 400
+            assert status(f"/top?cursor={cursor}")[0] == 400
+        assert status('/articles?cursor=!!!')[0] == 400
+
+        code, page = status('/articles?limit=3')
+        assert code == 200 and len(page['items']) == 3
+        code, rest = status(f"/articles?limit=3&cursor={page['next_cursor']}")
+        assert code == 200 and len(rest['items']) == 2
+    finally:
+        server.shutdown()
+        server.server_close()
+        server.RequestHandlerClass.service.close()
+
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+测试公众号登记表的 CSV / JSON 导入
+"""
+
+import json
+import os
+import tempfile
+
+from testutil import run_tests, use_temp_database
+
+
+def test_registry_import():
+    """CSV / JSON 导入：标签、重复 biz、错误行、空值保留原值"""
+    import registry
+    from db_manager import DatabaseManager
+
+    use_temp_database()
+    db = DatabaseManager()
+    directory = tempfile.mkdtemp(prefix='wechat_registry_')
+    csv_path = os.path.join(directory, 'accounts.csv')
+    with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+        f.write('biz,nick_name,tags,priority,enabled,sync_interval\n'
+                'R1,一号,心理|教育,5,,\n'
+                'R2,二号,教育;科技,9,no,3600\n'
+                ',缺少biz,,,,\n'
+                'R3,三号,,abc,,\n'
+                'R1,一号改名,心理,7,,\n')
+
+    count, errors = registry.import_file(db, csv_path)
+    assert count == 2
+    assert len(errors) == 2 and errors[0].startswith('第 3 条')
+
+    psychology = db.get_registry_accounts('心理')
+    assert [(e['biz'], e['nick_name'], e['priority']) for e in psychology] == [('R1', '一号改名', 7)]
+    assert db.get_registry_accounts('教育') == []
+    disabled = db.get_registry_accounts('教育', enabled_only=False)
+    assert [e['biz'] for e in disabled] == ['R2'] and not disabled[0]['enabled']
+    assert sorted(disabled[0]['tags'].split(',')) == ['教育', '科技']
+
+    json_path = os.path.join(directory, 'accounts.json')
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump({'accounts': [{'biz': 'R2', 'enabled': True},
+                                {'biz': 'R4', 'nick_name': '四号', 'tags': ['科技'],
+                                 'priority': 1}]}, f, ensure_ascii=False)
+    count, errors = registry.import_file(db, json_path)
+    assert count == 2 and errors == []
+
+    technology = db.get_registry_accounts('科技')
+    assert [e['biz'] for e in technology] == ['R2', 'R4']
+    # 未指定的字段保留原值
+    assert technology[0]['priority'] == 9 and technology[0]['sync_interval'] == 3600
+    assert technology[0]['nick_name'] == '二号'
+    assert ('R4', '四号') in registry.target_accounts(db, tag='科技')
+
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+测试失败请求的重试队列：指数退避、到期重试、永久失败（死信）
+"""
+
+import contextlib
+import io
+
+import database
+from mock_api import MockApiConfig, MockApiServer
+from testutil import new_collector, run_tests, use_temp_database
+
+
+def _seconds_until_retry(api_type: str, request_key: str) -> float:
+    conn = database.get_connection()
+    try:
+        return conn.execute('''
+            SELECT (julianday(next_attempt_at) - julianday('now')) * 86400
+            FROM retry_queue WHERE api_type = ? AND request_key = ?
+        ''', (api_type, request_key)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_transient_failure_is_queued_and_drained():
+    """HTTP 500 进入重试队列，退避时间随失败次数增长，恢复后重试成功"""
+    use_temp_database()
+    with MockApiServer(MockApiConfig()) as server, contextlib.redirect_stdout(io.StringIO()):
+        collector = new_collector(server)
+        collector.RETRY_BASE_DELAY = 0.2
+        url = collector.collect_list_page('T1', 1, 'retry')['urls'][0]
+        db = collector.db
+
+        server.state.config.error_rate = 1.0
+        assert collector.call_api_2_read_zan(url) is None
+        entry = db.get_retry_entry('read_zan_pro', url)
+        assert entry['status'] == 'pending' and entry['attempts'] == 1
+        assert entry['error_class'] == 'HTTPError'
+        # 第 1 次失败退避 0.1 ~ 0.2 秒
+        assert 0 < _seconds_until_retry('read_zan_pro', url) <= 0.2
+        assert db.get_due_retries() == []
+
+        assert collector.call_api_2_read_zan(url) is None
+        assert db.get_retry_entry('read_zan_pro', url)['attempts'] == 2
+        # 第 2 次失败退避 0.2 ~ 0.4 秒
+        assert 0.15 < _seconds_until_retry('read_zan_pro', url) <= 0.4
+
+        server.state.config.error_rate = 0.0
+        assert collector.drain_retry_queue(max_wait=5)
+        assert db.get_retry_entry('read_zan_pro', url)['status'] == 'done'
+        assert db.get_retry_summary() == {'done': 1}
+        assert db.check_article_exists(url) == (True, 'content_fetched')
+        assert server.state.summary()['errors'] == {'read_zan_pro': 2}
+
+
+def test_retry_backoff_and_attempt_limit():
+    """退避按指数增长并封顶；超过最大次数后不再重试"""
+    use_temp_database()
+    with MockApiServer(MockApiConfig(error_rate=1.0)) as server, \
+            contextlib.redirect_stdout(io.StringIO()):
+        collector = new_collector(server)
+        for attempts in range(1, 10):
+            delay = min(collector.RETRY_MAX_DELAY, collector.RETRY_BASE_DELAY * 2 ** (attempts - 1))
+            for _ in range(20):
+                assert delay / 2 <= collector._retry_delay(attempts) <= delay
+
+        collector.RETRY_BASE_DELAY = 0.01
+        collector.RETRY_MAX_ATTEMPTS = 3
+        url = 'https://mp.weixin.qq.com/s/never'
+        for _ in range(3):
+            assert collector.call_api_2_read_zan(url) is None
+        entry = collector.db.get_retry_entry('read_zan_pro', url)
+        assert entry['status'] == 'dead' and entry['attempts'] == 3
+        assert collector.db.get_next_retry_delay() is None
+        assert collector.drain_retry_queue(max_wait=1)
+
+
+def test_deleted_article_goes_dead():
+    """code 101 直接进入死信，之后不再付费请求"""
+    use_temp_database()
+    with MockApiServer(MockApiConfig(deleted_rate=1.0)) as server, \
+            contextlib.redirect_stdout(io.StringIO()):
+        collector = new_collector(server)
+        url = collector.collect_list_page('T2', 1, 'deleted')['urls'][0]
+
+        assert collector.call_api_2_read_zan(url)['code'] == 101
+        entry = collector.db.get_retry_entry('read_zan_pro', url)
+        assert entry['status'] == 'dead' and entry['error_class'] == 'code_101'
+        assert collector.db.get_retry_summary() == {'dead': 1}
+
+        calls = server.state.summary()['calls']
+        assert collector.call_api_2_read_zan(url, use_cache=False)['code'] == 101
+        assert server.state.summary()['calls'] == calls
+        assert collector.drain_retry_queue(max_wait=1)
+
+
+if __name__ == "__main__":
+    run_tests(globals())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+测试分片存储：路由规则、主库数据迁移到分片、跨分片读取与统计
+"""
+
+import contextlib
+import io
+import os
+import tempfile
+
+import config
+import database
+import sharding
+from mock_api import MockApiConfig, MockApiServer
+from testutil import new_collector, run_tests, use_temp_database
+
+
+def _count(conn, table: str) -> int:
+    try:
+        return conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_routing():
+    """account 模式按 biz 分桶；month 模式按发布月份，文章列表留在主库"""
+    use_temp_database('account')
+    router = sharding.get_router()
+    buckets = {router.shard_for_account(f"B{i}") for i in range(20)}
+    assert buckets == {'account_00', 'account_01'}
+    assert router.shard_for_account('B1') == router.shard_for_account('B1')
+    assert router.shard_for_row('B1', '2025-06-01 08:00:00') == router.shard_for_account('B1')
+    assert router.shard_for_raw('post_history', 'B1_3') == router.shard_for_account('B1')
+
+    conn = database.get_connection()
+    conn.execute("INSERT INTO accounts (biz, nick_name) VALUES ('B1', 'route')")
+    conn.execute('''
+        INSERT INTO articles (account_id, url, title, post_time_str)
+        VALUES ((SELECT id FROM accounts WHERE biz = 'B1'), 'https://mp.weixin.qq.com/s/r1',
+                'route', '2025-06-01 08:00:00')
+    ''')
+    conn.commit()
+    conn.close()
+    url = 'https://mp.weixin.qq.com/s/r1'
+    assert router.shard_for_raw('read_zan_pro', url) == router.shard_for_account('B1')
+    # 不在主库中的文章无法确定分片
+    assert router.shard_for_article('https://mp.weixin.qq.com/s/missing') is None
+
+    month = sharding.ShardRouter('month', tempfile.mkdtemp(prefix='wechat_test_'))
+    assert month.shard_for_account('B1') is None
+    assert month.shard_for_raw('post_history', 'B1_3') is None
+    assert month.shard_for_row('B1', '2025-06-01 08:00:00') == 'month_2025_06'
+    assert month.shard_for_row('B1', None) == 'month_unknown'
+    assert month.shard_for_row('B1', '') == 'month_unknown'
+    assert month.shard_for_raw('article_detail', url) == 'month_2025_06'
+    assert month.shard_path('month_2025_06') == os.path.join(month.shard_dir, 'month_2025_06.db')
+
+
+def test_migrate_from_main_and_read_across_shards():
+    """未分片时采集的数据迁移到分片后，主库不再保存；跨分片查询和统计结果不变"""
+    from db_manager import DatabaseManager
+
+    use_temp_database()
+    mock_config = MockApiConfig(articles_per_account=6, old_articles=1)
+    with MockApiServer(mock_config) as server, contextlib.redirect_stdout(io.StringIO()):
+        collector = new_collector(server)
+        for biz in ('S1', 'S2', 'S3', 'S4'):
+            assert collector.collect_account_articles(biz, f"shard_{biz}")
+        spent = server.state.summary()['total_spent']
+    raw_count = _count(database.get_connection(), 'api_raw_responses')
+    content_count = _count(database.get_connection(), 'article_contents')
+    assert content_count == 24
+    before = DatabaseManager().get_statistics()
+    assert round(before['total_cost'], 2) == round(spent, 2)
+
+    config.SHARD_MODE = 'account'
+    router = sharding.get_router()
+    assert router.list_shards() == []
+    moved = router.migrate_from_main(batch_size=7)
+    assert moved == {'api_raw_responses': raw_count, 'article_contents': content_count}
+    assert _count(database.get_connection(), 'api_raw_responses') == 0
+    assert _count(database.get_connection(), 'article_contents') == 0
+    assert router.list_shards() == ['account_00', 'account_01']
+
+    # 每个公众号的数据都在它自己的分片中
+    for shard in router.list_shards():
+        conn = router.connect(shard)
+        try:
+            keys = [row[0] for row in conn.execute(
+                "SELECT request_key FROM api_raw_responses WHERE api_type = 'post_history'")]
+        finally:
+            conn.close()
+        assert keys
+        assert all(router.shard_for_raw('post_history', key) == shard for key in keys)
+
+    # query_all 依次读取主库和各分片
+    rows = list(router.query_all(
+        'SELECT api_type, COUNT(*) AS n FROM {db}.api_raw_responses GROUP BY api_type'))
+    assert sum(row['n'] for row in rows) == raw_count
+    contents = list(router.query_all('SELECT article_id FROM {db}.article_contents'))
+    assert len(contents) == len({row['article_id'] for row in contents}) == content_count
+
+    after = DatabaseManager().get_statistics()
+    assert round(after.pop('total_cost'), 2) == round(before.pop('total_cost'), 2)
+    assert after == before
+
+    # 再次迁移没有需要移动的行
+    assert router.migrate_from_main() == {'api_raw_responses': 0, 'article_contents': 0}
+
+
+if __name__ == "__main__":
+    run_tests(globals())
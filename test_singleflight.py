@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+测试在途请求合并（single-flight）
+"""
+
+import threading
+import time
+
+from mock_api import MockApiConfig, MockApiServer
+from testutil import new_collector, run_tests, use_temp_database
+
+
+def test_singleflight():
+    """并发的同键调用只执行一次，异常同样传给等待方"""
+    from singleflight import SingleFlight
+
+    group = SingleFlight()
+    calls = []
+    barrier = threading.Barrier(5)
+    results = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'value'
+
+    def call():
+        barrier.wait()
+        results.append(group.do('key', slow))
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False] + [True] * 4
+    assert all(value == 'value' for value, _ in results)
+    assert group.in_flight() == 0
+
+    errors = []
+
+    def failing():
+        time.sleep(0.2)
+        raise RuntimeError('boom')
+
+    def call_failing():
+        try:
+            group.do('error', failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=call_failing) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == ['boom'] * 3
+    assert group.in_flight() == 0
+
+
+def test_collector_coalesces_paid_calls():
+    """同一文章的并发统计请求只付费一次；跳过缓存的调用不共享读缓存的结果"""
+    use_temp_database()
+    mock_config = MockApiConfig(latency_ms={'read_zan_pro': 300})
+    with MockApiServer(mock_config) as server:
+        collector = new_collector(server)
+        url = server.state.articles_for('S1')[0]['url']
+        barrier = threading.Barrier(4)
+        results = []
+
+        def fetch(use_cache=True):
+            barrier.wait()
+            results.append(collector.call_api_2_read_zan(url, use_cache=use_cache))
+
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert server.state.summary()['calls']['read_zan_pro'] == 1
+        assert all(result == results[0] and result['code'] == 0 for result in results)
+
+        barrier = threading.Barrier(2)
+        threads = [threading.Thread(target=fetch, args=(use_cache,))
+                   for use_cache in (True, False)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 读缓存的调用命中缓存，跳过缓存的调用单独请求
+        assert server.state.summary()['calls']['read_zan_pro'] == 2
+
+
+if __name__ == "__main__":
+    run_tests(globals())
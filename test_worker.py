@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+测试多进程工作单元的租约：过期后被其他进程接管，原持有者不能再续租或结束
+"""
+
+import time
+
+import database
+from mock_api import MockApiConfig, MockApiServer
+from testutil import new_collector, run_tests, use_temp_database
+
+
+def test_work_lease_reclaim():
+    """租约过期后单元被重新领取，原持有者的续租和结束都失败"""
+    from db_manager import DatabaseManager
+
+    use_temp_database()
+    db = DatabaseManager()
+    assert db.enqueue_work_units([('list', 'L1_1', 'L1')]) == 1
+    assert db.enqueue_work_units([('list', 'L1_1', 'L1')]) == 0
+
+    unit = db.claim_work_unit('crashed', 0.05)
+    assert unit['status'] == 'leased' and unit['attempts'] == 1
+    # 租约有效期内其他进程领取不到
+    assert db.claim_work_unit('worker', 60) is None
+
+    time.sleep(0.1)
+    assert db.get_work_summary() == {'list': {'expired': 1}}
+    reclaimed = db.claim_work_unit('worker', 60)
+    assert reclaimed['id'] == unit['id'] and reclaimed['attempts'] == 2
+
+    assert not db.renew_work_lease(unit['id'], 'crashed', 60)
+    assert not db.finish_work_unit(unit['id'], 'crashed', 'done')
+    assert db.renew_work_lease(unit['id'], 'worker', 60)
+    assert db.finish_work_unit(unit['id'], 'worker', 'done')
+    assert db.get_work_summary() == {'list': {'done': 1}}
+
+
+def test_worker_reclaims_expired_lease():
+    """工作进程接管崩溃进程留下的单元，并完成整个公众号"""
+    from db_manager import DatabaseManager
+    from worker import Worker, seed_work
+
+    use_temp_database()
+    mock_config = MockApiConfig(articles_per_account=8, old_articles=2)
+    with MockApiServer(mock_config) as server:
+        collector = new_collector(server)
+        assert seed_work(collector.db, [('W1', 'worker')]) == 1
+        # 模拟领取后崩溃的进程
+        assert collector.db.claim_work_unit('crashed', 0.05) is not None
+        time.sleep(0.1)
+
+        processed = Worker(collector, owner='worker', lease_seconds=30,
+                           heartbeat_interval=5).run()
+
+    assert processed['failed'] == 0 and processed['pending'] == 0
+    summary = DatabaseManager().get_work_summary()
+    assert set(summary) == {'list', 'detail'}
+    assert all(set(states) == {'done'} for states in summary.values())
+    assert summary['detail']['done'] == 8
+
+    conn = database.get_connection()
+    try:
+        rows = conn.execute('SELECT fetch_status, COUNT(*) AS n FROM articles '
+                            'GROUP BY fetch_status').fetchall()
+        assert {row['fetch_status']: row['n'] for row in rows} == {'content_fetched': 8}
+        # 被接管的列表页只领取两次（崩溃的一次 + 接管的一次）
+        attempts = conn.execute("SELECT attempts FROM work_units "
+                                "WHERE unit_key = 'W1_1'").fetchone()['attempts']
+        assert attempts == 2
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    run_tests(globals())
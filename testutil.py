@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+测试公用工具
+每个测试使用独立的临时数据库（分片目录、冷库也在同一临时目录中），
+采集器指向本地模拟服务 mock_api，不消耗真实费用
+"""
+
+import os
+import tempfile
+
+import config
+import database
+from mock_api import MockApiServer
+
+# 测试不写日志文件
+config.LOG_PATH = ''
+
+
+def use_temp_database(shard_mode: str = 'none') -> str:
+    """
+    切换到一个新的临时数据库
+    Args:
+        shard_mode: 分片模式（account 时只分 2 个桶，便于覆盖多个分片）
+    Returns:
+        数据库文件路径
+    """
+    directory = tempfile.mkdtemp(prefix='wechat_test_')
+    path = os.path.join(directory, 'test.db')
+    config.SHARD_MODE = shard_mode
+    config.SHARD_DIR = os.path.join(directory, 'shards')
+    config.SHARD_BUCKETS = 2
+    config.RAW_ARCHIVE_PATH = os.path.join(directory, 'archive.db')
+    config.ACCOUNT_TAG = ''
+    database.set_database_path(path)
+    database.init_database()
+    return path
+
+
+def new_collector(server: MockApiServer, **kwargs):
+    """指向模拟服务、去掉请求间隔的采集器"""
+    from collector import WechatArticleCollector
+
+    if 'api_keys' not in kwargs:
+        kwargs.setdefault('api_key', 'test-key')
+    kwargs.setdefault('min_balance', 0.2)
+    collector = WechatArticleCollector(base_url=server.base_url, **kwargs)
+    collector.PAGE_INTERVAL = 0
+    collector.ARTICLE_INTERVAL = 0
+    collector.ACCOUNT_INTERVAL = 0
+    return collector
+
+
+def run_tests(namespace: dict):
+    """直接运行测试文件时依次执行其中的 test_* 函数"""
+    for name, test in list(namespace.items()):
+        if name.startswith('test_') and callable(test):
+            print(f"运行 {name}...")
+            test()
+            print("  ✅ 通过")
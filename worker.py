@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+多进程采集工作进程
+采集任务拆成工作单元（一页文章列表 / 一篇文章的详情）写入 work_units 表，
+各进程以租约方式领取，处理期间定时心跳续租；进程崩溃后租约过期，
+单元会被其他进程重新领取。多个进程（或多台机器共享同一数据库文件）可同时运行
+"""
+
+import argparse
+import os
+import socket
+import threading
+import time
+import uuid
+from multiprocessing import Process
+from typing import Dict, List, Optional, Tuple
+
+import database
+import registry
+from collector import WechatArticleCollector
+from db_manager import DatabaseManager
+
+LEASE_SECONDS = 120
+HEARTBEAT_INTERVAL = 30
+IDLE_POLL_INTERVAL = 2
+MAX_ATTEMPTS = 3
+
+
+def seed_work(db: DatabaseManager, accounts: List[Tuple[str, str]]) -> int:
+    """
+    根据当前进度生成工作单元：列表未完成的公众号从下一页开始，
+    所有未完成（且未确认删除）的文章各一个详情单元
+    """
+    units = []
+    for biz, nick_name in accounts:
+        account_info = db.get_account_info(biz)
+        if not account_info:
+            db.save_account(biz, nick_name, None)
+            units.append(('list', f"{biz}_1", biz))
+        elif not account_info['stop_flag']:
+            units.append(('list', f"{biz}_{account_info['last_page'] + 1}", biz))
+    for article in db.get_detail_candidates():
+        units.append(('detail', article['url'], None))
+    return db.enqueue_work_units(units)
+
+
+class _Heartbeat(threading.Thread):
+    """处理单元期间定时续租"""
+
+    def __init__(self, db: DatabaseManager, unit_id: int, owner: str,
+                 lease_seconds: float, interval: float):
+        super().__init__(name=f"lease-heartbeat-{unit_id}", daemon=True)
+        self.db = db
+        self.unit_id = unit_id
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.lost = False
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            if not self.db.renew_work_lease(self.unit_id, self.owner, self.lease_seconds):
+                self.lost = True
+                print(f"  ⚠️ 工作单元 {self.unit_id} 的租约已被其他进程接管")
+                return
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+
+class Worker:
+    """领取并处理工作单元"""
+
+    def __init__(self, collector: WechatArticleCollector, owner: str = None,
+                 lease_seconds: float = LEASE_SECONDS,
+                 heartbeat_interval: float = HEARTBEAT_INTERVAL):
+        self.collector = collector
+        self.db = collector.db
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.lease_seconds = lease_seconds
+        self.heartbeat_interval = heartbeat_interval
+        self.processed = {'done': 0, 'failed': 0, 'pending': 0}
+
+    def run(self, max_units: int = None) -> Dict[str, int]:
+        """
+        循环领取单元直到没有待处理工作（或余额不足）
+        其他进程仍持有租约时继续等待，因为它们可能产生新的单元
+        """
+        print(f"👷 工作进程 {self.owner} 启动")
+        handled = 0
+        while max_units is None or handled < max_units:
+            unit = self.db.claim_work_unit(self.owner, self.lease_seconds)
+            if unit is None:
+                summary = self.db.get_work_summary()
+                busy = sum(states.get('leased', 0) + states.get('expired', 0)
+                           for states in summary.values())
+                if not busy:
+                    break
+                time.sleep(IDLE_POLL_INTERVAL)
+                continue
+
+            handled += 1
+            if not self._process(unit):
+                print(f"\n⚠️ 余额不足，工作进程 {self.owner} 停止")
+                break
+
+        print(f"👷 工作进程 {self.owner} 结束: 完成 {self.processed['done']}，"
+              f"放弃 {self.processed['failed']}，释放 {self.processed['pending']}")
+        return self.processed
+
+    def _process(self, unit: Dict) -> bool:
+        """处理一个单元，返回 False 表示余额不足需要停止"""
+        heartbeat = _Heartbeat(self.db, unit['id'], self.owner,
+                               self.lease_seconds, self.heartbeat_interval)
+        heartbeat.start()
+        try:
+            if unit['unit_type'] == 'list':
+                status, error = self._process_list(unit)
+            else:
+                status, error = self._process_detail(unit)
+        except Exception as e:
+            status, error = 'pending', f"{type(e).__name__}: {e}"
+        finally:
+            heartbeat.stop()
+
+        if status == 'pending' and unit['attempts'] >= MAX_ATTEMPTS:
+            status = 'failed'
+        if self.db.finish_work_unit(unit['id'], self.owner, status, error):
+            self.processed[status] += 1
+        return self.collector.check_balance()
+
+    def _process_list(self, unit: Dict) -> Tuple[str, Optional[str]]:
+        biz = unit['account_biz']
+        page = int(unit['unit_key'].rpartition('_')[2])
+        result = self.collector.collect_list_page(biz, page)
+        if result is None:
+            return 'pending', "获取文章列表失败"
+
+        units = [('detail', url, biz) for url in result['urls']]
+        if not result['reached_end']:
+            units.append(('list', f"{biz}_{page + 1}", biz))
+        self.db.enqueue_work_units(units)
+        self.collector._sleep(self.collector.PAGE_INTERVAL)
+        return 'done', None
+
+    def _process_detail(self, unit: Dict) -> Tuple[str, Optional[str]]:
+        url = unit['unit_key']
+        exists, status = self.db.check_article_exists(url)
+        if not exists:
+            return 'failed', "文章不在数据库中"
+        if status != 'content_fetched':
+            if not self.collector.fetch_article_detail({'url': url, 'fetch_status': status}):
+                return 'pending', "余额不足"
+            exists, status = self.db.check_article_exists(url)
+        if status == 'content_fetched':
+            return 'done', None
+
+        for api_type in ('read_zan_pro', 'article_detail'):
+            entry = self.db.get_retry_entry(api_type, url)
+            if entry and entry['status'] == 'dead':
+                # 文章已删除等永久失败
+                return 'failed', entry['last_error']
+        return 'pending', "获取文章详情失败"
+
+
+def _run_worker_process(db_path: str, base_url: Optional[str], max_units: Optional[int]):
+    database.set_database_path(db_path)
+    collector = WechatArticleCollector(base_url=base_url)
+    Worker(collector).run(max_units)
+
+
+def run_workers(processes: int, base_url: str = None, max_units: int = None):
+    """在本机启动多个工作进程并等待全部结束"""
+    workers = [Process(target=_run_worker_process,
+                       args=(database.DATABASE_PATH, base_url, max_units))
+               for _ in range(processes)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join()
+
+
+def print_summary(db: DatabaseManager):
+    summary = db.get_work_summary()
+    if not summary:
+        print("工作队列为空")
+        return
+    labels = {'pending': '待处理', 'leased': '处理中', 'expired': '租约过期',
+              'done': '已完成', 'failed': '已放弃'}
+    for unit_type, states in summary.items():
+        name = '列表页' if unit_type == 'list' else '文章详情'
+        print(f"  {name}: " + ', '.join(f"{labels.get(k, k)} {v}" for k, v in states.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程共享数据库的采集工作进程")
+    parser.add_argument('--database', help="数据库文件路径（默认 wechat_articles.db）")
+    parser.add_argument('--seed', action='store_true',
+                        help="先根据配置的公众号和当前进度生成工作单元")
+    parser.add_argument('--processes', type=int, default=1, help="本机启动的工作进程数")
+    parser.add_argument('--max-units', type=int, default=None,
+                        help="每个进程最多处理的单元数")
+    parser.add_argument('--status', action='store_true', help="只查看工作队列状态")
+    args = parser.parse_args()
+
+    if args.database:
+        database.set_database_path(args.database)
+    db = DatabaseManager()
+
+    if args.seed:
+        added = seed_work(db, registry.target_accounts(db))
+        print(f"✅ 新增 {added} 个工作单元")
+
+    if not args.status:
+        if args.processes > 1:
+            run_workers(args.processes, max_units=args.max_units)
+        else:
+            Worker(WechatArticleCollector()).run(args.max_units)
+
+    print("\n📊 工作队列状态:")
+    print_summary(db)
+
+
+if __name__ == "__main__":
+    main()